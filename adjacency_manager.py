@@ -1,17 +1,35 @@
 from z3 import *
 from unionfind import UnionFind
+from z3utils import check_model
 
 # TODO: this whole thing should be redone.
 # Separate out "finding connected components" from "ban components and
 # regenerate solutions".
 
 class AdjacencyManager(object):
-    def __init__(self):
+    '''
+    Tracks connected components of solver variables.
+
+    Components are built up incrementally as adjacencies are added; the list
+    of components (and their boundaries, if a neighbors function was given)
+    is cached until the next add.
+
+    Args:
+        neighbors: optional function mapping a variable to the variables
+            adjacent to it, used to compute component boundaries.
+    '''
+    def __init__(self, neighbors=None):
         self.uf = UnionFind()
+        self.neighbors = neighbors
+        self._classes = None
+        self._boundaries = {}
 
     def add(self, adjacencies):
         if not adjacencies:
             return
+        self._classes = None
+        self._boundaries = {}
+        self.uf.add(adjacencies[0])
         for item in adjacencies[1:]:
             self.uf.union(adjacencies[0], item)
 
@@ -20,32 +38,98 @@ class AdjacencyManager(object):
             self.add(adj)
 
     def classes(self):
-        return self.uf.classes()
-
-    def constraints(self, model):
+        if self._classes is None:
+            self._classes = self.uf.classes()
+        return self._classes
+
+    def count(self):
+        return self.uf.count()
+
+    def largest(self):
+        '''
+        Returns the largest component (a list of variables), or [] if there
+        are none.
+        '''
+        return self.uf.largest()
+
+    def boundary(self, cls):
+        '''
+        Returns the set of variables adjacent to, but not part of, the given
+        component. Needs the neighbors function.
+        '''
+        if self.neighbors is None:
+            raise ValueError('boundary needs an AdjacencyManager built with '
+                             'a neighbors function')
+        root = self.uf.find(cls[0])
+        if root not in self._boundaries:
+            members = set(cls)
+            boundary = set()
+            for v in cls:
+                boundary.update(n for n in self.neighbors(v)
+                                if n not in members)
+            self._boundaries[root] = boundary
+        return self._boundaries[root]
+
+    def constraints(self, model, count):
+        '''
+        Returns a clause for each component banning it as it is in model:
+        its variables and its boundary (if a neighbors function was given)
+        keeping their values while anything else is set. count is the
+        number of variables set (an expression); a component that is all
+        there is may be a whole solution, so it's only banned while count
+        is more than its size. Each clause is only as big as its component
+        and boundary.
+        '''
         res = []
-        for c in self.classes():
-            res.append(Or([v != model[v].as_long() for v in c]))
-
+        for cls in self.classes():
+            walls = self.boundary(cls) if self.neighbors is not None else ()
+            res.append(Or([v != model[v].as_long() for v in cls] +
+                          [v != model[v].as_long() for v in walls] +
+                          [count <= len(cls)]))
         return res
 
-def solve(s, grid, adjacency_fn):
-    while True:
-        s.check()
-        m = s.model()
+def solve(s, grid, adjacency_fn, on_model=None):
+    '''
+    Solve, banning disconnected solutions until a connected one is found.
+    Returns the model, or None if there is no connected solution.
+
+    The grid's edges are what's connected: adjacency_fn yields lists of
+    edge variables (set to 1) that are joined, and edges meeting at a
+    point are neighbors.
+
+    on_model, if given, is called with every model found along the way (for
+    instance to show each refinement round in a viewer.Viewer).
+    '''
+    edge_neighbors = {}
+    for point in grid.points:
+        edges = [e.var for e in point.edges()]
+        for v in edges:
+            edge_neighbors.setdefault(v, set()).update(
+                u for u in edges if not u.eq(v))
+    count = Sum([e.var for e in grid.edges])
 
-        adjacencies = list(adjacency_fn(grid, m))
-        am = AdjacencyManager()
-        am.add_all(adjacencies)
-        if len(am.classes()) == 1:
+    while True:
+        m = check_model(s)
+        if m is None:
+            return None
+        if on_model:
+            on_model(m)
+
+        am = AdjacencyManager(edge_neighbors.__getitem__)
+        am.add_all(adjacency_fn(grid, m))
+        if am.count() == 1:
             return m
 
         print("Found disconnected solution; attempting again...")
 
-        for constraint in am.constraints(m):
+        for constraint in am.constraints(m, count):
             s.add(constraint)
 
-def solve_grid(s, grid):
+def solve_grid(s, grid, on_model=None):
+    '''
+    Like solve, but for puzzles where filled cells (with value 1) have to
+    form one connected region.
+    '''
     def grid_adj_fn(model):
         for edge in grid.edges:
             yield [cell.var for cell in edge.cells()
@@ -54,31 +138,30 @@ def solve_grid(s, grid):
         c.var: c for c in grid.cells
     }
 
-    def boundary(model, cc):
-        boundary = set()
-        for cell_var in cc:
-            cell = cell_map[cell_var]
-            boundary.update([
-                c.var for c in cell.neighbors()
-                if model[c.var].as_long() == 0
-            ])
-        return boundary
+    def neighbors(cell_var):
+        return [c.var for c in cell_map[cell_var].neighbors()]
+
+    count = Sum([c.var for c in grid.cells])
 
     # TODO: combine some of this code with solve.
     while True:
-        s.check()
-        m = s.model()
-
-        adjacencies = list(grid_adj_fn(m))
-        am = AdjacencyManager()
-        am.add_all(adjacencies)
-        am.add_all([c.var, c.var] for c in grid.cells if m[c.var].as_long() == 1)
+        m = check_model(s)
+        if m is None:
+            return None
+        if on_model:
+            on_model(m)
+
+        am = AdjacencyManager(neighbors)
+        am.add_all(grid_adj_fn(m))
+        am.add_all([c.var] for c in grid.cells if m[c.var].as_long() == 1)
         print(am.classes())
-        if len(am.classes()) == 1:
+        if am.count() == 1:
             return m
 
         print("Found disconnected solution; attempting again...")
 
-        for cls in am.classes():
-            s.add(Or([v != m[v].as_long() for v in cls] +
-                     [v != m[v].as_long() for v in boundary(m, cls)]))
+        # Any cell next to a component is unfilled (a filled one would have
+        # been joined to it), so the boundary is exactly the cells that wall
+        # the component off.
+        for constraint in am.constraints(m, count):
+            s.add(constraint)
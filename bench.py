@@ -0,0 +1,864 @@
+"""
+Benchmarks for the solvers and renderers.
+
+Usage:
+    python bench.py              # run every benchmark
+    python bench.py importtime   # run just the named benchmarks
+
+    python bench.py solvers --jobs 4 --output results.json
+    python bench.py solvers --baseline results.json
+
+The solvers benchmark solves every puzzle in a fixed corpus
+(puzzles/bench_corpus.jsonl, made by `python bench.py solvers --make-corpus`)
+and reports each one's build and solve times, refinement rounds and peak
+memory. With --baseline, it compares them against an earlier --output file,
+and exits with status 1 if anything got worse.
+"""
+from __future__ import print_function
+
+import argparse
+import ast
+import collections
+import contextlib
+import functools
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_FILE = os.path.join(HERE, 'puzzles', 'bench_corpus.jsonl')
+
+# Scripts that solve (and draw) a puzzle.
+PUZZLES = [
+    'binario', 'cave', 'galaxies', 'hexalgemy', 'liar_slitherlink', 'maysu',
+    'quebecats', 'shikaku', 'skyscrapers', 'slitherlink', 'starbattle',
+    'sudoku', 'tapa',
+]
+
+
+def best_of(fn, repeat=3):
+    """Returns the fastest of several timed calls of fn, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def top_level_imports(module):
+    """
+    Returns the source of the module-level import statements of a puzzle
+    script, so that its startup cost can be measured without running the
+    solve that importing it would trigger.
+    """
+    with open(os.path.join(HERE, module + '.py')) as f:
+        source = f.read()
+    lines = source.splitlines()
+    return '\n'.join(
+        '\n'.join(lines[node.lineno - 1:node.end_lineno])
+        for node in ast.parse(source).body
+        if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def importtime(source):
+    """
+    Runs source under `python -X importtime` and returns a dict mapping each
+    top-level imported module to its cumulative import time in microseconds,
+    or None if the imports failed.
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', source],
+                          cwd=HERE, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        return None
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        cumulative = cumulative.strip()
+        if not cumulative.isdigit() or name.startswith('  '):
+            # header line, or a module imported by another one
+            continue
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def bench_importtime(args):
+    """Startup cost of each puzzle entry point."""
+    print('{:<20} {:>10} {:>10}  {}'.format(
+        'puzzle', 'total ms', 'display ms', 'loaded'))
+    for puzzle in PUZZLES:
+        times = importtime(top_level_imports(puzzle))
+        if times is None:
+            print('{:<20} {:>10}'.format(puzzle, 'failed'))
+            continue
+        loaded = [m for m in ('cairo', 'pygame') if m in times]
+        display_us = sum(times.get(m, 0) for m in
+                         ('display', 'hex_display', 'sprite_display'))
+        print('{:<20} {:>10.1f} {:>10.1f}  {}'.format(
+            puzzle, sum(times.values()) / 1000., display_us / 1000.,
+            ' '.join(loaded) or '-'))
+
+
+def loop_grid(size):
+    """
+    Returns a size x size Grid and a stand-in for a model of it (a dict from
+    variables to values) with a clue in every cell and every other edge set,
+    so that rendering it draws about as much as a dense solved slitherlink.
+    """
+    from z3 import IntVal
+    from grid import Grid
+
+    grid = Grid(size, size)
+    model = {}
+    for c in grid.cells:
+        model[c.var] = IntVal((c.x + c.y) % 4)
+    for e in grid.edges:
+        model[e.var] = IntVal((e.x + e.y) % 2)
+    for p in grid.points:
+        model[p.var] = IntVal(0)
+    return grid, model
+
+
+def hex_loop_grid(size):
+    """
+    Returns a hex board with size hexes along each side and a stand-in model
+    for it, like loop_grid.
+    """
+    from z3 import IntVal
+    from hexgrid import HexGrid
+
+    grid = HexGrid(2 * size - 1, 2 * size - 1, size - 1, size - 1)
+    model = {}
+    for i, part in enumerate(grid.cells + grid.edges + grid.points):
+        model[part.var] = IntVal(i % 2)
+    return grid, model
+
+
+def hex_cell_draw(ctx):
+    ctx.fill(0.9, 0.9, 1, 1)
+
+
+def hex_edge_draw(ctx):
+    ctx.draw(width=3 if ctx.val == '1' else 1)
+
+
+def loop_cell_draw(ctx):
+    ctx.fill(0.9, 0.9, 1, 1)
+    ctx.text(ctx.val, fontsize=12)
+
+
+def loop_background_draw(ctx):
+    ctx.fill(0.9, 0.9, 1, 1)
+
+
+def loop_value_draw(ctx):
+    ctx.text(ctx.val, fontsize=12)
+
+
+def loop_edge_draw(ctx):
+    ctx.draw(width=2 if ctx.val == '1' else 1)
+
+
+def loop_point_draw(ctx):
+    ctx.draw_square(size=3)
+
+
+def bench_render(args):
+    """Render time for large grids and the quebecats sheet."""
+    import display
+    import quebecats
+    from sprite_display import render_grid_frames_and_sprites_png
+
+    print('{:<20} {:>10}'.format('board', 'render ms'))
+    for size in (25, 50, 100):
+        grid, model = loop_grid(size)
+        elapsed = best_of(lambda: display.render_grid_png(
+            grid, model, 16, loop_cell_draw, loop_edge_draw, loop_edge_draw,
+            loop_point_draw))
+        print('{:<20} {:>10.1f}'.format(
+            'grid {0}x{0}'.format(size), elapsed * 1000))
+
+    import hex_display
+    for size in (10, 25, 50):
+        grid, model = hex_loop_grid(size)
+        elapsed = best_of(lambda: hex_display.render_grid_png(
+            grid, model, 16, hex_cell_draw, hex_edge_draw))
+        print('{:<20} {:>10.1f}'.format('hex {}'.format(size),
+                                        elapsed * 1000))
+
+    # Repeated renders of one board, with the cell backgrounds and points
+    # drawn through a cached static layer so only the values and edges are
+    # redrawn each time.
+    grid, model = loop_grid(50)
+    static = display.StaticLayer('loop_grid', loop_background_draw, None,
+                                 None, loop_point_draw)
+    elapsed = best_of(lambda: display.render_grid_png(
+        grid, model, 16, loop_value_draw, loop_edge_draw, loop_edge_draw,
+        static=static))
+    print('{:<20} {:>10.1f}'.format('grid 50x50 static', elapsed * 1000))
+
+    timings = []
+
+    def timed_render(*args):
+        timings.append(best_of(
+            lambda: render_grid_frames_and_sprites_png(*args)))
+
+    quebecats.solve_board(quebecats.boards[4], display=timed_render)
+    print('{:<20} {:>10.1f}'.format('quebecats sheet', timings[0] * 1000))
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, but bytes on macOS.
+    return rss / (1024. * 1024 if sys.platform == 'darwin' else 1024.)
+
+
+def bench_tiles(args):
+    """Streamed rendering of a board too big to render in one surface."""
+    import display
+
+    grid, model = loop_grid(200)
+    print('peak RSS before rendering: {:.0f} MB'.format(peak_rss_mb()))
+    with open(os.devnull, 'wb') as f:
+        start = time.perf_counter()
+        display.render_grid_png_streamed(
+            grid, model, 64, loop_cell_draw, loop_edge_draw, loop_edge_draw,
+            loop_point_draw, target=f)
+        elapsed = time.perf_counter() - start
+    w, h = display.canvas_size(grid.width, grid.height, 64)
+    print('{}x{} px in {:.1f} s, peak RSS {:.0f} MB'.format(
+        w, h, elapsed, peak_rss_mb()))
+
+
+# The puzzle types and sizes in the solver benchmark corpus, with any extra
+# arguments for their generators (see generate.py). The quebecats boards are
+# added as they are.
+CORPUS = [
+    ('binario', (6, 10, 14, 20), {}),
+    ('cave', (6, 8, 10), {}),
+    ('galaxies', (5, 7, 10), {}),
+    ('hexalgemy', (3, 4, 6), {}),
+    ('liar_slitherlink', (6, 8, 11), {}),
+    ('maysu', (6, 9, 12, 16), {}),
+    ('shikaku', (10, 15, 20, 30), {}),
+    ('skyscrapers', (4, 5, 6, 7), {}),
+    ('slitherlink', (6, 10, 15, 20, 30, 40), {}),
+    ('starbattle', (6, 8), {'stars': 1}),
+    ('starbattle', (10, 12), {'stars': 2}),
+    ('sudoku', (9, 16, 25), {}),
+    ('tapa', (6, 8, 10, 15), {}),
+]
+CORPUS_SEEDS = 2
+
+
+def make_corpus(path):
+    """Generates the solver benchmark corpus and writes it to path."""
+    import generate
+    import quebecats
+    from puzzlefile import Puzzle, open_puzzle_file, write_puzzles
+
+    puzzles = []
+    for type, sizes, kwargs in CORPUS:
+        for size in sizes:
+            for seed in range(CORPUS_SEEDS):
+                print('generating {} {} {}'.format(type, size, seed),
+                      file=sys.stderr)
+                puzzles.append(generate.generate(type, size, seed, **kwargs))
+    for i, board in enumerate(quebecats.boards):
+        puzzles.append(Puzzle(
+            'quebecats', [5, 5],
+            [[dt, str(wall), coord] for dt, wall, coord in board],
+            id='quebecats-board-{}'.format(i)))
+    with open_puzzle_file(path, 'w') as f:
+        write_puzzles(f, puzzles)
+    print('wrote {} puzzles to {}'.format(len(puzzles), path),
+          file=sys.stderr)
+
+
+def measure_solve(puzzle, timeout):
+    """
+    Builds and solves one puzzle, returning a dict with its status, its build
+    and solve times in seconds, the number of times the solver was checked
+    (refinement rounds, for the solvers that add constraints as they go) and
+    the process's peak RSS. Meant to run in a fresh worker process, so that
+    the peak belongs to this puzzle alone.
+    """
+    from runner import find_model_fn, solver_module
+    from z3utils import SolverTimeout, set_deadline
+
+    result = collections.OrderedDict(
+        id=puzzle.params.get('id'), type=puzzle.type, size=puzzle.size)
+    s = None
+    phase = 'build_time'
+    start = time.perf_counter()
+    try:
+        module = solver_module(puzzle.type)
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            s, grid = module.build(puzzle)
+            result['build_time'] = time.perf_counter() - start
+            phase = 'solve_time'
+            start = time.perf_counter()
+            set_deadline(s, timeout)
+            model = find_model_fn(module)(s, grid)
+        result['status'] = 'unsat' if model is None else 'sat'
+    except SolverTimeout:
+        result['status'] = 'timeout'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '{}: {}'.format(e.__class__.__name__, e)
+    result[phase] = time.perf_counter() - start
+    result['rounds'] = getattr(s, 'rounds', 0)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+# What counts as a regression against a baseline: a measurement has to get
+# worse by more than the threshold fraction and by more than this much.
+NOISE = {
+    'build_time': 0.25,
+    'solve_time': 0.25,
+    'rounds': 0,
+    'peak_rss_mb': 5,
+}
+
+
+def regressions(baseline, results, threshold):
+    """
+    Compares results with the baseline results for the same puzzles (matched
+    by id), and returns a list of messages describing what got worse.
+    """
+    before = dict((r['id'], r) for r in baseline)
+    found = []
+    for result in results:
+        old = before.get(result['id'])
+        if old is None:
+            continue
+        if result['status'] != old['status']:
+            if old['status'] in ('sat', 'unsat'):
+                found.append('{}: {} -> {}'.format(
+                    result['id'], old['status'], result['status']))
+            continue
+        for key, noise in sorted(NOISE.items()):
+            if key not in old or key not in result:
+                continue
+            if (result[key] > old[key] * (1 + threshold) and
+                    result[key] - old[key] > noise):
+                found.append('{}: {} {:.3g} -> {:.3g}'.format(
+                    result['id'], key, old[key], result[key]))
+    return found
+
+
+def print_scaling(results):
+    """
+    Prints how each puzzle type's solve time grows with its size: the median
+    over the puzzles of each size, or the fraction that didn't solve.
+    """
+    times = collections.defaultdict(list)
+    for result in results:
+        times[result['type'], tuple(result['size'])].append(
+            result.get('solve_time') if result['status'] in ('sat', 'unsat')
+            else None)
+    print('{:<20} {:>8} {:>9} {:>9}'.format(
+        'type', 'size', 'median s', 'unsolved'))
+    for (type, size), solves in sorted(times.items()):
+        solved = sorted(t for t in solves if t is not None)
+        print('{:<20} {:>8} {:>9} {:>9}'.format(
+            type, 'x'.join(str(n) for n in size),
+            '{:.3f}'.format(solved[len(solved) // 2]) if solved else '-',
+            '{}/{}'.format(len(solves) - len(solved), len(solves))))
+
+
+def measure_in_child(conn, puzzle, timeout, memory_mb):
+    if memory_mb:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    conn.send(measure_solve(puzzle, timeout))
+    conn.close()
+
+
+def measure_isolated(puzzle, timeout, memory_mb=None):
+    """
+    Runs measure_solve in a new process, so each peak RSS is measured alone,
+    and so a solve that ignores its timeout or runs out of memory can be
+    killed without taking the benchmark with it.
+    """
+    recv, send = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(
+        target=measure_in_child, args=(send, puzzle, timeout, memory_mb))
+    process.start()
+    send.close()
+    result = None
+    try:
+        # Leave time for the build, which the timeout doesn't cover.
+        if recv.poll(2 * timeout + 10):
+            result = recv.recv()
+    except EOFError:
+        pass
+    process.terminate()
+    process.join()
+    if result is None:
+        result = collections.OrderedDict(
+            id=puzzle.params.get('id'), type=puzzle.type, size=puzzle.size,
+            status='killed' if process.exitcode == -15 else 'crashed',
+            rounds=0, peak_rss_mb=memory_mb or 0)
+    return result
+
+
+def bench_solvers(args):
+    """Build and solve times, rounds and peak memory over a puzzle corpus."""
+    import z3
+    from multiprocessing.pool import ThreadPool
+    from puzzlefile import read_puzzle_file
+
+    if args.make_corpus:
+        make_corpus(args.corpus)
+        return
+
+    puzzles = [p for p in read_puzzle_file(args.corpus)
+               if not args.type or p.type in args.type]
+
+    print('{:<28} {:>8} {:>9} {:>9} {:>6} {:>7}'.format(
+        'puzzle', 'status', 'build s', 'solve s', 'rounds', 'RSS MB'))
+    # Each puzzle gets its own process; the threads just wait on them.
+    pool = ThreadPool(args.jobs)
+    results = []
+    try:
+        for result in pool.imap(functools.partial(
+                measure_isolated, timeout=args.timeout,
+                memory_mb=args.memory_limit), puzzles):
+            print('{:<28} {:>8} {:>9.3f} {:>9.3f} {:>6} {:>7.0f}'.format(
+                result['id'], result['status'],
+                result.get('build_time', 0), result.get('solve_time', 0),
+                result['rounds'], result['peak_rss_mb']))
+            sys.stdout.flush()
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+    print()
+    print_scaling(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(collections.OrderedDict([
+                ('python', sys.version.split()[0]),
+                ('z3', z3.get_version_string()),
+                ('timeout', args.timeout),
+                ('results', results),
+            ]), f, indent=1)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        found = regressions(baseline, results, args.threshold)
+        print('{} regressions against {}'.format(len(found), args.baseline))
+        for message in found:
+            print('  ' + message)
+        if found:
+            sys.exit(1)
+
+
+def timed_solve(s, timeout):
+    """Checks s, returning the seconds taken, or None if it timed out."""
+    from z3 import unknown
+
+    s.set('timeout', int(timeout * 1000))
+    start = time.perf_counter()
+    result = s.check()
+    elapsed = time.perf_counter() - start
+    return None if result == unknown else elapsed
+
+
+def format_seconds(seconds):
+    return 'timeout' if seconds is None else '{:.3f}'.format(seconds)
+
+
+def bench_tapa(args):
+    """Tapa clue encodings: build and solve time on large generated grids."""
+    import generate
+    import tapa
+
+    elapsed = best_of(lambda: tapa.clue_mask_table(8))
+    print('clue mask table: {} clues in {:.1f} ms'.format(
+        len(tapa.CLUE_MASKS), elapsed * 1000))
+
+    print('{:<16} {:<10} {:>9} {:>9}'.format(
+        'puzzle', 'encoding', 'build s', 'solve s'))
+    for size in (10, 15, 20, 25):
+        for seed in range(2):
+            puzzle = generate.generate('tapa', size, seed)
+            for encoding in tapa.ENCODINGS:
+                start = time.perf_counter()
+                s, _ = tapa.build(puzzle, encoding)
+                build_time = time.perf_counter() - start
+                print('{:<16} {:<10} {:>9.3f} {:>9}'.format(
+                    puzzle.params['id'], encoding, build_time,
+                    format_seconds(timed_solve(s, args.timeout))))
+                sys.stdout.flush()
+
+
+def bench_binario(args):
+    """Binario encodings: build and solve time from 10x10 to 60x60."""
+    import binario
+    import generate
+    from puzzlefile import Puzzle
+
+    # The pairwise encoding runs out of memory well before 30x30.
+    largest = {'pairwise': 20}
+
+    puzzles = []
+    for size in (10, 20, 30, 40, 50, 60):
+        puzzles.append(Puzzle('binario', [size, size], [' ' * size] * size,
+                              id='binario-{}-empty'.format(size)))
+    for size in (10, 14, 20):
+        puzzles.append(generate.generate('binario', size, 0))
+
+    print('{:<20} {:<10} {:>9} {:>9}'.format(
+        'puzzle', 'encoding', 'build s', 'solve s'))
+    for puzzle in puzzles:
+        for encoding in sorted(binario.ENCODINGS):
+            if puzzle.width > largest.get(encoding, puzzle.width):
+                continue
+            start = time.perf_counter()
+            s, _ = binario.build(puzzle, encoding=encoding)
+            build_time = time.perf_counter() - start
+            print('{:<20} {:<10} {:>9.3f} {:>9}'.format(
+                puzzle.params['id'], encoding, build_time,
+                format_seconds(timed_solve(s, args.timeout))))
+            sys.stdout.flush()
+
+
+def bench_shikaku(args):
+    """Shikaku encodings: build and solve time from 20x20 to 40x40."""
+    import generate
+    import shikaku
+    from grid import Grid
+
+    print('{:<16} {:>11} {:<11} {:>9} {:>9}'.format(
+        'puzzle', 'rectangles', 'encoding', 'build s', 'solve s'))
+    for size in (20, 30, 40):
+        for seed in range(2):
+            puzzle = generate.generate('shikaku', size, seed)
+            candidates = shikaku.candidate_rectangles(
+                Grid(size, size), puzzle.givens)
+            total = sum(len(rects) for rects in candidates.values())
+            left = total - shikaku.prune(candidates)
+            for encoding in sorted(shikaku.ENCODINGS):
+                start = time.perf_counter()
+                s, _ = shikaku.build(puzzle, encoding)
+                build_time = time.perf_counter() - start
+                print('{:<16} {:>11} {:<11} {:>9.3f} {:>9}'.format(
+                    puzzle.params['id'], '{}/{}'.format(left, total),
+                    encoding, build_time,
+                    format_seconds(timed_solve(s, args.timeout))))
+                sys.stdout.flush()
+
+
+# The dlx benchmark's puzzles: (type, size, how many)
+DLX_CORPUS = [
+    ('sudoku', 9, 200),
+    ('sudoku', 16, 10),
+    ('shikaku', 20, 20),
+    ('starbattle', 10, 20),
+]
+
+
+def bench_dlx(args):
+    """Throughput of z3 and dancing links on exact cover puzzles."""
+    import generate
+    from runner import find_model_fn, solver_module
+    from z3utils import SolverTimeout, set_deadline
+
+    def z3_solve(module, puzzle):
+        s, grid = module.build(puzzle)
+        set_deadline(s, args.timeout)
+        return find_model_fn(module)(s, grid)
+
+    def dlx_solve(module, puzzle):
+        problem, _ = module.exact_cover(puzzle)
+        problem.set_deadline(args.timeout)
+        return next(problem.models(), None)
+
+    print('{:<12} {:>5} {:>9} {:<8} {:>9} {:>12}'.format(
+        'type', 'size', 'puzzles', 'backend', 'total s', 'puzzles/s'))
+    for type, size, count in DLX_CORPUS:
+        module = solver_module(type)
+        puzzles = [generate.generate(type, size, seed)
+                   for seed in range(count)]
+        for backend, solve in (('z3', z3_solve), ('dlx', dlx_solve)):
+            start = time.perf_counter()
+            solved = 0
+            with contextlib.redirect_stdout(sys.stderr):
+                for puzzle in puzzles:
+                    try:
+                        solved += solve(module, puzzle) is not None
+                    except SolverTimeout:
+                        pass
+            elapsed = time.perf_counter() - start
+            print('{:<12} {:>5} {:>9} {:<8} {:>9.3f} {:>12.2f}'.format(
+                type, size, '{}/{}'.format(solved, count), backend, elapsed,
+                solved / elapsed))
+            sys.stdout.flush()
+
+
+# How many generated 9x9 sudokus the sudoku benchmark solves, by default
+SUDOKU_COUNT = 500
+
+
+def bench_sudoku(args):
+    """Sudoku throughput with and without the propagation pre-solver."""
+    import generate
+    import sudoku
+    from puzzlefile import read_puzzle_file
+    from z3utils import SolverTimeout, check_model, set_deadline
+
+    def puzzles():
+        if args.sudoku_file:
+            return read_puzzle_file(args.sudoku_file, 'sudoku')
+        return (generate.generate('sudoku', 9, seed)
+                for seed in range(SUDOKU_COUNT))
+
+    print('{:<10} {:>9} {:>10} {:>9} {:>12}'.format(
+        'presolve', 'puzzles', 'presolved', 'total s', 'puzzles/s'))
+    for presolve in (True, False):
+        count = presolved = 0
+        elapsed = 0.0
+        for puzzle in puzzles():
+            start = time.perf_counter()
+            s, g = sudoku.build(puzzle, presolve=presolve)
+            presolved += getattr(s, 'presolved', False)
+            set_deadline(s, args.timeout)
+            try:
+                check_model(s)
+            except SolverTimeout:
+                pass
+            elapsed += time.perf_counter() - start
+            count += 1
+        print('{:<10} {:>9} {:>10} {:>9.3f} {:>12.1f}'.format(
+            str(presolve), count, presolved, elapsed, count / elapsed))
+        sys.stdout.flush()
+
+
+def bench_sudoku_nxn(args):
+    """Sudoku encodings: build and solve time from 9x9 to 36x36."""
+    import generate
+    import sudoku
+    from z3utils import SolverTimeout, check_model, set_deadline
+
+    print('{:<14} {:<8} {:<9} {:>9} {:>9}'.format(
+        'puzzle', 'encoding', 'presolve', 'build s', 'solve s'))
+    for size in (9, 16, 25, 36):
+        for seed in range(2):
+            puzzle = generate.generate('sudoku', size, seed)
+            for encoding in sorted(sudoku.ENCODINGS):
+                for presolve in (True, False):
+                    start = time.perf_counter()
+                    s, g = sudoku.build(puzzle, presolve=presolve,
+                                        encoding=encoding)
+                    build_time = time.perf_counter() - start
+                    set_deadline(s, args.timeout)
+                    start = time.perf_counter()
+                    try:
+                        check_model(s)
+                        solve_time = time.perf_counter() - start
+                    except SolverTimeout:
+                        solve_time = None
+                    print('{:<14} {:<8} {:<9} {:>9.3f} {:>9}'.format(
+                        puzzle.params['id'], encoding, str(presolve),
+                        build_time, format_seconds(solve_time)))
+                    sys.stdout.flush()
+
+
+def bench_latin(args):
+    """Latin square encodings: time to fill an empty n x n square."""
+    from z3 import Solver
+    import latin
+    from grid import Grid
+
+    print('{:>5} {:<12} {:<9} {:>9} {:>9}'.format(
+        'size', 'encoding', 'symmetry', 'build s', 'solve s'))
+    for size in (10, 20, 30, 40):
+        for encoding in latin.ENCODINGS:
+            for symmetry in (None, 'reduced'):
+                start = time.perf_counter()
+                s = Solver()
+                latin.LatinSquare(s, Grid(size, size), encoding,
+                                  symmetry=symmetry)
+                build_time = time.perf_counter() - start
+                print('{:>5} {:<12} {:<9} {:>9.3f} {:>9}'.format(
+                    size, encoding, str(symmetry), build_time,
+                    format_seconds(timed_solve(s, args.timeout))))
+                sys.stdout.flush()
+
+
+def bench_skyscrapers(args):
+    """Skyscrapers encodings: build and solve time from 5x5 to 12x12."""
+    import generate
+    import latin
+    import skyscrapers
+
+    print('{:<18} {:<12} {:>9} {:>9}'.format(
+        'puzzle', 'encoding', 'build s', 'solve s'))
+    for size in (5, 7, 9, 12):
+        for seed in range(2):
+            puzzle = generate.generate('skyscrapers', size, seed)
+            for encoding in latin.ENCODINGS:
+                start = time.perf_counter()
+                s, _ = skyscrapers.build(puzzle, encoding=encoding)
+                build_time = time.perf_counter() - start
+                print('{:<18} {:<12} {:>9.3f} {:>9}'.format(
+                    puzzle.params['id'], encoding, build_time,
+                    format_seconds(timed_solve(s, args.timeout))))
+                sys.stdout.flush()
+
+
+def bench_liar_slitherlink(args):
+    """Liar slitherlink encodings: build and solve time at 10x10 to 20x20."""
+    import generate
+    import liar_slitherlink
+    from z3utils import SolverTimeout, set_deadline
+
+    print('{:<24} {:<12} {:>9} {:>9} {:>7}'.format(
+        'puzzle', 'encoding', 'build s', 'solve s', 'rounds'))
+    for size in (10, 15, 20):
+        for seed in range(2):
+            puzzle = generate.generate('liar_slitherlink', size, seed)
+            for encoding in sorted(liar_slitherlink.ENCODINGS):
+                start = time.perf_counter()
+                s, g = liar_slitherlink.build(puzzle, encoding)
+                build_time = time.perf_counter() - start
+                set_deadline(s, args.timeout)
+                start = time.perf_counter()
+                try:
+                    with contextlib.redirect_stdout(sys.stderr):
+                        liar_slitherlink.find_model(s, g)
+                    solve_time = time.perf_counter() - start
+                except SolverTimeout:
+                    solve_time = None
+                print('{:<24} {:<12} {:>9.3f} {:>9} {:>7}'.format(
+                    puzzle.params['id'], encoding, build_time,
+                    format_seconds(solve_time), s.rounds))
+                sys.stdout.flush()
+
+
+def bench_galaxies(args):
+    """Galaxies encodings: build and solve time from 10x10 to 30x30."""
+    import galaxies
+    import generate
+
+    print('{:<16} {:<10} {:>9} {:>9}'.format(
+        'puzzle', 'encoding', 'build s', 'solve s'))
+    for size in (10, 15, 20, 30):
+        for seed in range(2):
+            puzzle = generate.generate('galaxies', size, seed)
+            for encoding in sorted(galaxies.ENCODINGS):
+                start = time.perf_counter()
+                s, _ = galaxies.build(puzzle, encoding)
+                build_time = time.perf_counter() - start
+                print('{:<16} {:<10} {:>9.3f} {:>9}'.format(
+                    puzzle.params['id'], encoding, build_time,
+                    format_seconds(timed_solve(s, args.timeout))))
+                sys.stdout.flush()
+
+
+def bench_quebecats(args):
+    """Quebecats lift modes: build and solve time for each board."""
+    from z3 import is_quantifier
+    import quebecats
+
+    print('{:<6} {:<11} {:>11} {:>9} {:>9}'.format(
+        'board', 'lift mode', 'quantified', 'build s', 'solve s'))
+    totals = collections.OrderedDict()
+    for i, board in enumerate(quebecats.boards):
+        for mode in quebecats.ENCODINGS:
+            start = time.perf_counter()
+            s, _, _, _ = quebecats.build_board(board, mode)
+            build_time = time.perf_counter() - start
+            solve_time = timed_solve(s, args.timeout)
+            quantified = any(is_quantifier(a) for a in s.assertions())
+            print('{:<6} {:<11} {:>11} {:>9.3f} {:>9}'.format(
+                i, mode, 'yes' if quantified else 'no', build_time,
+                format_seconds(solve_time)))
+            sys.stdout.flush()
+            if solve_time is not None:
+                totals[mode] = (totals.get(mode, 0) + build_time +
+                                solve_time)
+    for mode, total in totals.items():
+        print('{:<11} total {:.3f}s'.format(mode, total))
+
+
+BENCHMARKS = {
+    'binario': bench_binario,
+    'dlx': bench_dlx,
+    'galaxies': bench_galaxies,
+    'importtime': bench_importtime,
+    'latin': bench_latin,
+    'liar_slitherlink': bench_liar_slitherlink,
+    'quebecats': bench_quebecats,
+    'render': bench_render,
+    'shikaku': bench_shikaku,
+    'skyscrapers': bench_skyscrapers,
+    'solvers': bench_solvers,
+    'sudoku': bench_sudoku,
+    'sudoku_nxn': bench_sudoku_nxn,
+    'tapa': bench_tapa,
+    'tiles': bench_tiles,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run benchmarks.')
+    parser.add_argument('benchmarks', nargs='*', choices=sorted(BENCHMARKS),
+                        metavar='benchmark',
+                        help='which benchmarks to run: {}; default all'.format(
+                            ', '.join(sorted(BENCHMARKS))))
+    group = parser.add_argument_group('solvers benchmark')
+    group.add_argument('--corpus', default=CORPUS_FILE,
+                       help='puzzle file to solve; default the corpus')
+    group.add_argument('--make-corpus', action='store_true',
+                       help='regenerate the corpus instead of solving it')
+    group.add_argument('--type', action='append',
+                       help='only solve puzzles of this type (repeatable)')
+    group.add_argument('--jobs', '-j', type=int, default=1,
+                       help='number of puzzles to solve at once')
+    group.add_argument('--timeout', type=float, default=60,
+                       help='seconds allowed to solve each puzzle (also '
+                            'used by the encoding benchmarks)')
+    group.add_argument('--memory-limit', type=int, default=4096,
+                       help='MB of memory allowed to solve each puzzle')
+    group.add_argument('--output', '-o',
+                       help='write the results to this file as JSON')
+    group.add_argument('--baseline',
+                       help='compare with the results in this file')
+    group.add_argument('--threshold', type=float, default=0.2,
+                       help='fraction by which a measurement may get worse '
+                            'before it counts as a regression')
+    group = parser.add_argument_group('sudoku benchmark')
+    group.add_argument('--sudoku-file',
+                       help='sudoku puzzle file to solve; default {} '
+                            'generated 9x9 puzzles'.format(SUDOKU_COUNT))
+    args = parser.parse_args(argv)
+
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        print('== {}: {}'.format(name, BENCHMARKS[name].__doc__))
+        try:
+            BENCHMARKS[name](args)
+        except ImportError as e:
+            print('skipped: {}'.format(e))
+
+
+if __name__ == '__main__':
+    main()
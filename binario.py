@@ -1,24 +1,19 @@
 from z3 import *
 
 from grid import Grid
-from display import draw_grid
-from adjacency_manager import solve
-from invalidobj import EAnd, IOr, Invalid
+from display import renderer
+from puzzlefile import Puzzle
 
-s = Solver()
-#g = Grid(6, 6)
-g = Grid(20, 20)
-
-# givens = [
+# example = Puzzle('binario', [6, 6], [
 #     "    1 ",
 #     "1 0 1 ",
 #     "1     ",
 #     "   1  ",
 #     "  0   ",
 #     " 1  00",
-# ]
+# ])
 
-givens = [
+example = Puzzle('binario', [20, 20], [
     "      00     0 1 00 ",
     " 11                1",
     "    1  1     0 0    ",
@@ -39,64 +34,137 @@ givens = [
     "0    0 1      1   1 ",
     " 1  0 0  0          ",
     "   1       1 1   1  ",
-]
+])
 
-for c in g.cells:
-    s.add(c.var >= 0)
-    s.add(c.var <= 1)
 
-for x in range(g.width-2):
+def clue_constraints(puzzle, g):
+    """
+    Yields the constraint each given digit adds, with its (x, y) position.
+    """
+    givens = puzzle.givens
     for y in range(g.height):
-        c = g.cell(x, y)
-        sm = Sum([c.var, c.cell_right.var, c.cell_right.cell_right.var])
-        s.add(sm != 0)
-        s.add(sm != 3)
-
-for x in range(g.width):
-    for y in range(g.height-2):
-        c = g.cell(x, y)
-        sm = Sum([c.var, c.cell_below.var, c.cell_below.cell_below.var])
-        s.add(sm != 0)
-        s.add(sm != 3)
-
-for x0 in range(g.width):
-    for x1 in range(x0+1, g.width):
-        s.add(Or([
-            g.cell(x0, y).var != g.cell(x1, y).var
-            for y in range(g.height)
-        ]))
-
-for y0 in range(g.height):
-    for y1 in range(y0+1, g.height):
-        s.add(Or([
-            g.cell(x, y0).var != g.cell(x, y1).var
-            for x in range(g.width)
-        ]))
-
-for x in range(g.width):
+        for x in range(g.width):
+            if givens[y][x] in '01':
+                yield (x, y), g.cell(x, y).var == int(givens[y][x])
+
+
+def one_bit(name):
+    return BitVec(name, 1)
+
+
+def lines(g):
+    """The rows and then the columns of g, as lists of cells."""
+    return ([[g.cell(x, y) for x in range(g.width)]
+             for y in range(g.height)] +
+            [[g.cell(x, y) for y in range(g.height)]
+             for x in range(g.width)])
+
+
+def build_pairwise(puzzle, clues=True):
+    """
+    The original encoding: Int cells, with every pair of rows and every pair
+    of columns made to differ somewhere. Kept for comparison (see
+    bench.py binario); it grows as n^3.
+    """
+    s = Solver()
+    g = Grid(puzzle.width, puzzle.height)
+
+    for c in g.cells:
+        s.add(c.var >= 0)
+        s.add(c.var <= 1)
+
+    for x in range(g.width-2):
+        for y in range(g.height):
+            c = g.cell(x, y)
+            sm = Sum([c.var, c.cell_right.var, c.cell_right.cell_right.var])
+            s.add(sm != 0)
+            s.add(sm != 3)
+
+    for x in range(g.width):
+        for y in range(g.height-2):
+            c = g.cell(x, y)
+            sm = Sum([c.var, c.cell_below.var, c.cell_below.cell_below.var])
+            s.add(sm != 0)
+            s.add(sm != 3)
+
+    for x0 in range(g.width):
+        for x1 in range(x0+1, g.width):
+            s.add(Or([
+                g.cell(x0, y).var != g.cell(x1, y).var
+                for y in range(g.height)
+            ]))
+
+    for y0 in range(g.height):
+        for y1 in range(y0+1, g.height):
+            s.add(Or([
+                g.cell(x, y0).var != g.cell(x, y1).var
+                for x in range(g.width)
+            ]))
+
+    if clues:
+        for _, constraint in clue_constraints(puzzle, g):
+            s.add(constraint)
+
+    for x in range(g.width):
+        s.add(Sum([g.cell(x, y).var for y in range(g.height)]) == (g.height // 2))
+
     for y in range(g.height):
-        a = givens[y][x]
-        if a == '0':
-            s.add(g.cell(x, y).var == 0)
-        elif a == '1':
-            s.add(g.cell(x, y).var == 1)
+        s.add(Sum([g.cell(x, y).var for x in range(g.width)]) == (g.width // 2))
+
+    return s, g
+
+
+def build_bitvec(puzzle, clues=True):
+    """
+    Each cell is a 1-bit BitVec. Each row and column is those bits packed
+    into one n-bit BitVec, and the rows (and the columns) are Distinct.
+    Balance is a pseudo-boolean constraint on each line, and no three in a
+    row is a clause on each window of three.
+    """
+    s = Solver()
+    g = Grid(puzzle.width, puzzle.height, cellgen=one_bit)
+
+    rows = lines(g)[:g.height]
+    columns = lines(g)[g.height:]
+    for group in (rows, columns):
+        s.add(Distinct([Concat([c.var for c in line]) for line in group]))
+
+    for line in rows + columns:
+        s.add(PbEq([(c.var == 1, 1) for c in line], len(line) // 2))
+        for a, b, c in zip(line, line[1:], line[2:]):
+            s.add(Or(a.var != b.var, b.var != c.var))
+
+    if clues:
+        for _, constraint in clue_constraints(puzzle, g):
+            s.add(constraint)
+
+    return s, g
+
+
+# Ways to encode the rules, by name (see bench.py binario)
+ENCODINGS = {
+    'bitvec': build_bitvec,
+    'pairwise': build_pairwise,
+}
 
-for x in range(g.width):
-    s.add(Sum([g.cell(x, y).var for y in range(g.height)]) == (g.height/2))
 
-for y in range(g.height):
-    s.add(Sum([g.cell(x, y).var for x in range(g.width)]) == (g.width/2))
+def build(puzzle, clues=True, encoding='bitvec'):
+    return ENCODINGS[encoding](puzzle, clues)
 
-s.check()
-m = s.model()
+def draw(puzzle, g, m, render='window', **kwargs):
+    givens = puzzle.givens
 
+    def cell_draw(ctx):
+        if givens[ctx.gy][ctx.gx] != ' ':
+            ctx.fill(1, 0.7, 0.7, 1)
+        else:
+            ctx.fill(1, 1, 1, 1)
 
-def cell_draw(ctx):
-    if givens[ctx.gy][ctx.gx] != ' ':
-        ctx.fill(1, 0.7, 0.7, 1)
-    else:
-        ctx.fill(1, 1, 1, 1)
+        ctx.circle(fill=(ctx.val == '0'))
 
-    ctx.circle(fill=(ctx.val == '0'))
+    return renderer(render)(g, m, 30, cell_draw, **kwargs)
 
-draw_grid(g, m, 30, cell_draw)
+if __name__ == '__main__':
+    s, g = build(example)
+    s.check()
+    draw(example, g, s.model())
@@ -3,17 +3,9 @@ from z3 import *
 # Note: doesn't yet work. We need something to find and ban "islands".
 
 from grid import Grid
-from display import draw_grid
+from display import renderer
 from adjacency_manager import solve_grid
-from invalidobj import EAnd, IOr, Invalid
-
-s = Solver()
-
-g = Grid(10, 10)
-
-for c in g.cells:
-    s.add(c.var >= 0)
-    s.add(c.var <= 1)
+from puzzlefile import Puzzle, char_number
 
 def opts(pos, ln, tot):
     for i in range(ln):
@@ -22,37 +14,7 @@ def opts(pos, ln, tot):
         if l >= 0 and r <= tot:
             yield (l, r)
 
-def horiz_opts(x, w):
-    for r in opts(x, w, g.width):
-        yield r
-
-def vert_opts(y, h):
-    for r in opts(y, h, g.height):
-        yield r
-
-def constrain_horiz(l, r, y):
-    constraints = [
-        g.cell(i, y).var == 1
-        for i in range(l, r)
-    ]
-    if l - 1 >= 0:
-        constraints.append(g.cell(l-1, y).var == 0)
-    if r < g.width:
-        constraints.append(g.cell(r, y).var == 0)
-    return And(constraints)
-
-def constrain_vert(t, b, x):
-    constraints = [
-        g.cell(x, i).var == 1
-        for i in range(t, b)
-    ]
-    if t - 1 >= 0:
-        constraints.append(g.cell(x, t-1).var == 0)
-    if b < g.height:
-        constraints.append(g.cell(x, b).var == 0)
-    return And(constraints)
-
-givens = [
+example = Puzzle('cave', [10, 10], [
     "6   6    4",
     "     6    ",
     "  3    5  ",
@@ -63,40 +25,104 @@ givens = [
     "  7    4  ",
     "    2     ",
     "5    6   6",
-]
-
-for j in range(g.height):
-    for i in range(g.width):
-        given = givens[j][i]
-        if given == ' ':
-            continue
-        n = ord(given) - ord('0')
-
-        s.add(Or([
-            And([
-                Or([constrain_horiz(l, r, j)
-                    for l, r in horiz_opts(i, x_amt)
-                ]),
-                Or([constrain_vert(t, b, i)
-                    for t, b in vert_opts(j, n - x_amt + 1)
-                ]),
+])
+
+
+def clue_constraints(puzzle, g):
+    """
+    Yields the constraint each clue adds, with its (x, y) position: the
+    clue's cell sees exactly that many cave cells (counting itself) along its
+    row and column.
+    """
+    givens = puzzle.givens
+
+    def horiz_opts(x, w):
+        for r in opts(x, w, g.width):
+            yield r
+
+    def vert_opts(y, h):
+        for r in opts(y, h, g.height):
+            yield r
+
+    def constrain_horiz(l, r, y):
+        constraints = [
+            g.cell(i, y).var == 1
+            for i in range(l, r)
+        ]
+        if l - 1 >= 0:
+            constraints.append(g.cell(l-1, y).var == 0)
+        if r < g.width:
+            constraints.append(g.cell(r, y).var == 0)
+        return And(constraints)
+
+    def constrain_vert(t, b, x):
+        constraints = [
+            g.cell(x, i).var == 1
+            for i in range(t, b)
+        ]
+        if t - 1 >= 0:
+            constraints.append(g.cell(x, t-1).var == 0)
+        if b < g.height:
+            constraints.append(g.cell(x, b).var == 0)
+        return And(constraints)
+
+    for j in range(g.height):
+        for i in range(g.width):
+            given = givens[j][i]
+            if given in ' ?':
+                continue
+            n = char_number(given)
+
+            yield (i, j), Or([
+                And([
+                    Or([constrain_horiz(l, r, j)
+                        for l, r in horiz_opts(i, x_amt)
+                    ]),
+                    Or([constrain_vert(t, b, i)
+                        for t, b in vert_opts(j, n - x_amt + 1)
+                    ]),
+                ])
+
+                for x_amt in range(1, n+1)
             ])
 
-            for x_amt in range(1, n+1)
-        ]))
 
-#s.check()
-#m = s.model()
-m = solve_grid(s, g)
+def build(puzzle, clues=True):
+    s = Solver()
+
+    g = Grid(puzzle.width, puzzle.height)
+
+    for c in g.cells:
+        s.add(c.var >= 0)
+        s.add(c.var <= 1)
+
+    if clues:
+        for _, constraint in clue_constraints(puzzle, g):
+            s.add(constraint)
+
+    return s, g
+
+def find_model(s, g):
+    return solve_grid(s, g)
+
+def draw(puzzle, g, m, render='window', **kwargs):
+    givens = puzzle.givens
+
+    def cell_draw(ctx):
+        if ctx.val == '0':
+            ctx.fill(0.5, 0.5, 0.5, 1)
+        else:
+            ctx.fill(1, 1, 1, 1)
+        ctx.text(givens[ctx.gy][ctx.gx], fontsize=24)
 
-def cell_draw(ctx):
-    if ctx.val == '0':
-        ctx.fill(0.5, 0.5, 0.5, 1)
-    else:
-        ctx.fill(1, 1, 1, 1)
-    ctx.text(givens[ctx.gy][ctx.gx], fontsize=24)
+    def edge_draw(ctx):
+        ctx.draw(width=1)
 
-def edge_draw(ctx):
-    ctx.draw(width=1)
+    return renderer(render)(g, m, 64, cell_draw, edge_draw, edge_draw,
+                            **kwargs)
 
-draw_grid(g, m, 64, cell_draw, edge_draw, edge_draw)
+if __name__ == '__main__':
+    s, g = build(example)
+    #s.check()
+    #m = s.model()
+    draw(example, g, find_model(s, g))
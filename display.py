@@ -1,25 +1,52 @@
+import io
 import math
 import sys
 import os
+from collections import OrderedDict
 
-import cairo
+# Note: cairo and pygame are imported inside the functions that need them,
+# so that puzzle scripts which import this module but never draw anything
+# don't pay for loading them.
 
-def font(family='', bold=False, italic=False):
-    return cairo.ToyFontFace(
-        family,
-        cairo.FontSlant.ITALIC if italic else cairo.FontSlant.NORMAL,
-        cairo.FontWeight.BOLD if bold else cairo.FontWeight.NORMAL,
-    )
-
-with open(os.devnull, 'w') as f:
-    # disable stdout
-    oldstdout = sys.stdout
-    sys.stdout = f
-
-    import pygame
+_fonts = {}
 
-    # enable stdout
-    sys.stdout = oldstdout
+def font(family='', bold=False, italic=False):
+    # Font faces are cached, since batch renders ask for the same handful of
+    # faces over and over.
+    key = family, bold, italic
+    if key not in _fonts:
+        import cairo
+        _fonts[key] = cairo.ToyFontFace(
+            family,
+            cairo.FontSlant.ITALIC if italic else cairo.FontSlant.NORMAL,
+            cairo.FontWeight.BOLD if bold else cairo.FontWeight.NORMAL,
+        )
+    return _fonts[key]
+
+_pygame = None
+
+def import_pygame():
+    '''
+    Import pygame, hiding its startup banner. This is only done when a surface
+    is actually shown, so headless rendering never needs pygame installed.
+    The module is kept after the first call, so event handlers can call this
+    freely.
+    '''
+    global _pygame
+    if _pygame is None:
+        with open(os.devnull, 'w') as f:
+            # disable stdout
+            oldstdout = sys.stdout
+            sys.stdout = f
+
+            try:
+                import pygame
+            finally:
+                # enable stdout
+                sys.stdout = oldstdout
+        _pygame = pygame
+
+    return _pygame
 
 # TODO use cairo context transforms properly instead of passing scale around everywhere
 def transform_x(x, scale):
@@ -31,13 +58,71 @@ def transform_y(y, scale):
 def canvas_size(w, h, scale):
     return (w+1) * scale, (h+1) * scale
 
+class BatchedContext(object):
+    '''
+    Wraps a cairo context so that consecutive strokes or fills in the same
+    style (color, line width, cap and join, or fill) are collected into one
+    path and drawn with a single stroke() or fill(), which is much cheaper
+    than one per part.
+
+    Parts add to the path returned by path(). Using the wrapped context for
+    anything else (text, say) draws the pending path first, as does starting
+    a path in a different style, so the result looks the same as drawing each
+    part on its own. Translucent parts are never merged, since overlaps would
+    then only be painted once.
+    '''
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self._style = None
+
+    def __getattr__(self, attr):
+        self.flush()
+        return getattr(self._ctx, attr)
+
+    def path(self, color, width=2, fill=False, cap=None, join=None):
+        '''
+        Returns the cairo context to add a path to that will be drawn in the
+        given style. The defaults match a fresh cairo context.
+        '''
+        import cairo
+        if cap is None:
+            cap = cairo.LINE_CAP_BUTT
+        if join is None:
+            join = cairo.LINE_JOIN_MITER
+        style = tuple(color), width, fill, cap, join
+        if style != self._style or color[3] < 1:
+            self.flush()
+            self._style = style
+        return self._ctx
+
+    def flush(self):
+        if self._style is None:
+            return
+        (r, g, b, a), width, fill, cap, join = self._style
+        self._style = None
+
+        ctx = self._ctx
+        ctx.save()
+        ctx.set_source_rgba(r, g, b, a)
+        if fill:
+            ctx.fill()
+        else:
+            ctx.set_line_width(width)
+            ctx.set_line_cap(cap)
+            ctx.set_line_join(join)
+            ctx.stroke()
+        ctx.restore()
+
+# The contexts below all draw through one BatchedContext shared by the whole
+# surface; render_grid saves and restores the cairo context's state around
+# each part, so nothing one part sets up leaks into the next.
+
 class PointContext(object):
-    def __init__(self, surface, point, model, scale):
-        self.surface = surface
+    def __init__(self, ctx, point, model, scale):
+        self.ctx = ctx
         self.point = point
         self.model = model
         self.scale = scale
-        self.ctx = cairo.Context(surface)
 
     @property
     def val(self):
@@ -60,22 +145,18 @@ class PointContext(object):
         return self.point.y
 
     def draw_square(self, size=1, color=(0, 0, 0, 1)):
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.rectangle(self.x0 - size/2, self.y0 - size/2,
-                           size, size)
-        self.ctx.fill()
+        self.ctx.path(color, fill=True).rectangle(
+            self.x0 - size/2, self.y0 - size/2, size, size)
 
     def draw_circle(self, size=10, *a, **kw):
         _draw_circle(self.ctx, self.x0, self.y0, size, *a, **kw)
 
 class EdgeContext(object):
-    def __init__(self, surface, edge, model, scale):
-        self.surface = surface
+    def __init__(self, ctx, edge, model, scale):
+        self.ctx = ctx
         self.edge = edge
         self.model = model
         self.scale = scale
-        self.ctx = cairo.Context(surface)
 
     @property
     def val(self):
@@ -98,13 +179,10 @@ class EdgeContext(object):
         return self.edge.y
 
     def draw(self, width=1, color=(0, 0, 0, 1)):
-        self.ctx.set_line_width(width)
-        self.ctx.set_line_cap(cairo.LINE_CAP_SQUARE)
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.move_to(self.x0, self.y0)
-        self.ctx.line_to(self.x1, self.y1)
-        self.ctx.stroke()
+        import cairo
+        ctx = self.ctx.path(color, width=width, cap=cairo.LINE_CAP_SQUARE)
+        ctx.move_to(self.x0, self.y0)
+        ctx.line_to(self.x1, self.y1)
 
     def draw_circle(self, size=None, *a, **kw):
         # TODO: consistent name (circle vs. draw_circle)
@@ -138,9 +216,8 @@ class VertEdgeContext(EdgeContext):
         return transform_y(self.gy + 1, self.scale)
 
 class CellContext(object):
-    def __init__(self, surface, cell, model, scale):
-        self.surface = surface
-        self.ctx = cairo.Context(surface)
+    def __init__(self, ctx, cell, model, scale):
+        self.ctx = ctx
         self.cell = cell
         self.model = model
         self.scale = scale
@@ -182,9 +259,8 @@ class CellContext(object):
         return self.cell.y
 
     def fill(self, r, g, b, a):
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.rectangle(self.x0, self.y0, self.scale, self.scale)
-        self.ctx.fill()
+        self.ctx.path((r, g, b, a), fill=True).rectangle(
+            self.x0, self.y0, self.scale, self.scale)
 
     def text(self, text, fontsize=12, family='', bold=False, italic=False):
         self.ctx.set_font_size(fontsize)
@@ -200,46 +276,316 @@ class CellContext(object):
         _draw_circle(self.ctx, self.mx, self.my, size, *a, **kw)
 
     def line(self, x0, y0, x1, y1, size=1, color=(0, 0, 0, 1)):
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.set_line_width(size)
-        self.ctx.move_to(self.x0 + self.scale*x0, self.y0 + self.scale*y0)
-        self.ctx.line_to(self.x0 + self.scale*x1, self.y0 + self.scale*y1)
-        self.ctx.stroke()
+        ctx = self.ctx.path(color, width=size)
+        ctx.move_to(self.x0 + self.scale*x0, self.y0 + self.scale*y0)
+        ctx.line_to(self.x0 + self.scale*x1, self.y0 + self.scale*y1)
 
 def _draw_circle(ctx, x, y, size, color=(0, 0, 0, 1), fill=False):
-    r, g, b, a = color
-    ctx.set_source_rgba(b, g, r, a)
-    ctx.arc(x, y, size, 0, 6.3)
-    if fill:
-        ctx.fill()
+    path = ctx.path(color, fill=fill)
+    path.new_sub_path()
+    path.arc(x, y, size, 0, 6.3)
+
+
+class StaticLayer(object):
+    '''
+    The model-independent part of a board's drawing: background, grid lines,
+    givens and so on. fns are drawing callbacks, in the order the render
+    function they're passed to takes them; they are called with a context
+    whose model is None.
+
+    When rendering to an image surface the layer is drawn once per key (and
+    board size and scale) and then reused from a cache, so the key should
+    identify the puzzle, for instance its givens.
+    '''
+    def __init__(self, key, *fns):
+        self.key = key
+        self.fns = fns
+
+# Most recently used static layer surfaces, bounded by
+# STATIC_LAYER_CACHE_SIZE.
+STATIC_LAYER_CACHE_SIZE = 16
+_static_layers = OrderedDict()
+
+# The static part of the last tile drawn by render_tile. Tiles have a cache
+# of their own, holding just one, so that streaming a board in many strips
+# keeps at most one extra strip in memory and doesn't push whole boards out
+# of _static_layers.
+_static_tiles = OrderedDict()
+
+def cached_layer(key, render_fn, cache=_static_layers,
+                 size=STATIC_LAYER_CACHE_SIZE):
+    '''
+    Return the surface render_fn() produces for key, only calling render_fn if
+    it isn't already in the cache (by default the static layer cache), which
+    holds at most size surfaces.
+    '''
+    if key in cache:
+        layer = cache.pop(key)
     else:
-        ctx.stroke()
-
+        while cache and len(cache) >= size:
+            cache.popitem(last=False)
+        layer = render_fn()
+    cache[key] = layer
+    return layer
+
+def paint_layer(ctx, layer):
+    ctx.save()
+    ctx.identity_matrix()
+    ctx.set_source_surface(layer, 0, 0)
+    ctx.paint()
+    ctx.restore()
+
+def render_grid(grid, model, scale,
+                cell_fn=None, horiz_fn=None, vert_fn=None,
+                point_fn=None, surface=None, static=None):
+    '''
+    Draw the grid and return the surface it was drawn on. A new image surface
+    is created unless one is passed in.
+
+    If static is a StaticLayer, it is drawn (or taken from the cache) first,
+    and the callbacks passed directly only draw what depends on the model.
+    '''
+    import cairo
+    if surface is None:
+        canvas_w, canvas_h = canvas_size(grid.width, grid.height, scale)
+        surface = get_surface(canvas_w, canvas_h)
+    ctx = cairo.Context(surface)
 
-def draw_grid(grid, model, scale,
-              cell_fn=None, horiz_fn=None, vert_fn=None,
-              point_fn=None):
-    canvas_w, canvas_h = canvas_size(grid.width, grid.height, scale)
-    surface = get_surface(canvas_w, canvas_h)
+    if static is not None:
+        if isinstance(surface, cairo.ImageSurface):
+            layer = cached_layer(
+                ('grid', static.key, grid.width, grid.height, scale),
+                lambda: render_grid(grid, None, scale, *static.fns))
+            paint_layer(ctx, layer)
+        else:
+            draw_parts(ctx, grid, None, scale, *static.fns)
+    draw_parts(ctx, grid, model, scale, cell_fn, horiz_fn, vert_fn, point_fn)
+    return surface
 
+def draw_parts(ctx, grid, model, scale,
+               cell_fn=None, horiz_fn=None, vert_fn=None, point_fn=None):
+    batch = BatchedContext(ctx)
     if cell_fn:
         for cell in grid.cells:
-            cell_ctx = CellContext(surface, cell, model, scale)
-            cell_fn(cell_ctx)
+            cell_ctx = CellContext(batch, cell, model, scale)
+            draw_part(ctx, cell_fn, cell_ctx)
     if horiz_fn:
         for horiz in grid.horizs:
-            horiz_ctx = HorizEdgeContext(surface, horiz, model, scale)
-            horiz_fn(horiz_ctx)
+            horiz_ctx = HorizEdgeContext(batch, horiz, model, scale)
+            draw_part(ctx, horiz_fn, horiz_ctx)
     if vert_fn:
         for vert in grid.verts:
-            vert_ctx = VertEdgeContext(surface, vert, model, scale)
-            vert_fn(vert_ctx)
+            vert_ctx = VertEdgeContext(batch, vert, model, scale)
+            draw_part(ctx, vert_fn, vert_ctx)
     if point_fn:
         for point in grid.points:
-            point_ctx = PointContext(surface, point, model, scale)
-            point_fn(point_ctx)
-    show_surface(surface)
+            point_ctx = PointContext(batch, point, model, scale)
+            draw_part(ctx, point_fn, point_ctx)
+    batch.flush()
+
+def draw_part(ctx, fn, *args):
+    '''
+    Call a drawing callback with the shared cairo context's state saved, and
+    restore it afterwards. (The path isn't part of that state, so parts can
+    keep adding to a BatchedContext's pending path.)
+    '''
+    ctx.save()
+    try:
+        fn(*args)
+    finally:
+        ctx.restore()
+
+def draw_grid(grid, model, scale,
+              cell_fn=None, horiz_fn=None, vert_fn=None,
+              point_fn=None, static=None):
+    show_surface(render_grid(grid, model, scale,
+                             cell_fn, horiz_fn, vert_fn, point_fn,
+                             static=static))
+
+def render_grid_png(grid, model, scale,
+                    cell_fn=None, horiz_fn=None, vert_fn=None,
+                    point_fn=None, target=None, static=None):
+    '''
+    Like draw_grid, but write the result as PNG to target (a filename or file
+    object) instead of showing it. Returns the PNG bytes if target is None.
+    '''
+    return write_png(render_grid(grid, model, scale,
+                                 cell_fn, horiz_fn, vert_fn, point_fn,
+                                 static=static),
+                     target)
+
+def render_grid_svg(grid, model, scale,
+                    cell_fn=None, horiz_fn=None, vert_fn=None,
+                    point_fn=None, target=None, static=None):
+    '''
+    Like draw_grid, but write the result as SVG to target (a filename or file
+    object) instead of showing it. Returns the SVG bytes if target is None.
+    '''
+    canvas_w, canvas_h = canvas_size(grid.width, grid.height, scale)
+    return write_svg(canvas_w, canvas_h,
+                     lambda surface: render_grid(grid, model, scale,
+                                                 cell_fn, horiz_fn, vert_fn,
+                                                 point_fn, surface, static),
+                     target)
+
+def renderer(render):
+    '''
+    Returns draw_grid, render_grid_png or render_grid_svg, by name ('window',
+    'png' or 'svg').
+    '''
+    return {'window': draw_grid,
+            'png': render_grid_png,
+            'svg': render_grid_svg}[render]
+
+class GridRegion(object):
+    '''
+    The parts of a Grid with coordinates in [gx0, gx1] x [gy0, gy1], with the
+    same cells/horizs/verts/points lists a Grid has, so that a tile of a large
+    board can be drawn without visiting every part of it.
+    '''
+    def __init__(self, grid, gx0, gy0, gx1, gy1):
+        xs = range(max(gx0, 0), min(gx1, grid.width) + 1)
+        ys = range(max(gy0, 0), min(gy1, grid.height) + 1)
+
+        def parts(array):
+            return [array[x, y] for x in xs for y in ys if (x, y) in array]
+
+        self.cells = parts(grid.cell_array)
+        self.horizs = parts(grid.horiz_array)
+        self.verts = parts(grid.vert_array)
+        self.points = parts(grid.point_array)
+
+def render_tile(grid, model, scale, x0, y0, width, height,
+                cell_fn=None, horiz_fn=None, vert_fn=None,
+                point_fn=None, static=None):
+    '''
+    Draw the width x height pixel rectangle of the board's canvas whose top
+    left corner is at (x0, y0), and return it as a new image surface. Only
+    the parts of the grid near the rectangle are drawn.
+
+    If static is a StaticLayer, its part of the tile is kept in a cache of
+    one tile, so drawing the same tile again (for another model, say) only
+    redraws what depends on the model, while streaming a board tile by tile
+    holds at most one extra tile.
+    '''
+    import cairo
+    surface = get_surface(width, height)
+    ctx = cairo.Context(surface)
+    ctx.translate(-x0, -y0)
+
+    # Parts can draw a little outside their own square (thick lines, text),
+    # so take in one more row and column on each side.
+    region = GridRegion(
+        grid,
+        int(math.floor((x0 - scale / 2.) / scale)) - 1,
+        int(math.floor((y0 - scale / 2.) / scale)) - 1,
+        int(math.ceil((x0 + width - scale / 2.) / scale)) + 1,
+        int(math.ceil((y0 + height - scale / 2.) / scale)) + 1)
+
+    if static is not None:
+        layer = cached_layer(
+            ('tile', static.key, grid.width, grid.height, scale,
+             x0, y0, width, height),
+            lambda: render_tile(grid, None, scale, x0, y0, width, height,
+                                *static.fns),
+            _static_tiles, 1)
+        paint_layer(ctx, layer)
+    draw_parts(ctx, region, model, scale, cell_fn, horiz_fn, vert_fn, point_fn)
+    return surface
+
+def tiles(width, height, tile_width, tile_height):
+    '''
+    Yields (x0, y0, width, height) for the tiles covering a canvas, row by
+    row. Tiles on the right and bottom edges may be smaller.
+    '''
+    for y0 in range(0, height, tile_height):
+        for x0 in range(0, width, tile_width):
+            yield (x0, y0,
+                   min(tile_width, width - x0), min(tile_height, height - y0))
+
+def rgb_rows(surface):
+    '''
+    Yields each row of an opaque image surface as RGB bytes.
+    '''
+    surface.flush()
+    width = surface.get_width()
+    stride = surface.get_stride()
+    data = surface.get_data()
+    # Pixels are native-endian 32-bit ARGB.
+    if sys.byteorder == 'little':
+        r, g, b = 2, 1, 0
+    else:
+        r, g, b = 1, 2, 3
+    for y in range(surface.get_height()):
+        pixels = bytes(data[y * stride:y * stride + width * 4])
+        row = bytearray(width * 3)
+        row[0::3] = pixels[r::4]
+        row[1::3] = pixels[g::4]
+        row[2::3] = pixels[b::4]
+        yield row
+
+def render_grid_png_streamed(grid, model, scale,
+                             cell_fn=None, horiz_fn=None, vert_fn=None,
+                             point_fn=None, target=None, strip_height=256,
+                             static=None):
+    '''
+    Like render_grid_png, but draw the board in horizontal strips and stream
+    each one into the PNG as it's finished, so only one strip (the canvas
+    width by strip_height pixels) is ever in memory rather than the whole
+    canvas. Produces the same image.
+    '''
+    from pngwriter import PNGWriter
+
+    canvas_w, canvas_h = canvas_size(grid.width, grid.height, scale)
+    if target is None:
+        f = io.BytesIO()
+    elif isinstance(target, str):
+        f = open(target, 'wb')
+    else:
+        f = target
+
+    try:
+        writer = PNGWriter(f, canvas_w, canvas_h)
+        for x0, y0, w, h in tiles(canvas_w, canvas_h, canvas_w, strip_height):
+            strip = render_tile(grid, model, scale, x0, y0, w, h,
+                                cell_fn, horiz_fn, vert_fn, point_fn, static)
+            for row in rgb_rows(strip):
+                writer.write_row(row)
+            strip.finish()
+        writer.close()
+        if target is None:
+            return f.getvalue()
+    finally:
+        if isinstance(target, str):
+            f.close()
+
+def render_grid_tiles(grid, model, scale, directory,
+                      cell_fn=None, horiz_fn=None, vert_fn=None,
+                      point_fn=None, tile_size=1024, static=None):
+    '''
+    Draw the board as separate tile_size x tile_size PNGs in directory, plus
+    an index.json giving the canvas size and each tile's file name and
+    position. Only one tile is in memory at a time.
+    '''
+    import json
+
+    canvas_w, canvas_h = canvas_size(grid.width, grid.height, scale)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    index = []
+    for x0, y0, w, h in tiles(canvas_w, canvas_h, tile_size, tile_size):
+        name = 'tile_{}_{}.png'.format(y0 // tile_size, x0 // tile_size)
+        tile = render_tile(grid, model, scale, x0, y0, w, h,
+                           cell_fn, horiz_fn, vert_fn, point_fn, static)
+        tile.write_to_png(os.path.join(directory, name))
+        tile.finish()
+        index.append({'file': name, 'x': x0, 'y': y0,
+                      'width': w, 'height': h})
+
+    with open(os.path.join(directory, 'index.json'), 'w') as f:
+        json.dump({'width': canvas_w, 'height': canvas_h,
+                   'tile_size': tile_size, 'tiles': index}, f, indent=1)
 
 def draw_text(ctx, x, y, t):
     _, _, w, h, dx, dy = ctx.text_extents(t)
@@ -247,6 +593,7 @@ def draw_text(ctx, x, y, t):
     ctx.show_text(t)
 
 def input(event):
+    pygame = import_pygame()
     if event.type == pygame.QUIT:
         return False
     elif event.type == pygame.KEYDOWN:
@@ -254,8 +601,8 @@ def input(event):
             return False
     return True
 
-def get_surface(width, height):
-    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+def clear_surface(surface, width, height):
+    import cairo
     ctx = cairo.Context(surface)
     ctx.set_source_rgba(1, 1, 1, 1)
     ctx.rectangle(0, 0, width, height)
@@ -263,7 +610,53 @@ def get_surface(width, height):
 
     return surface
 
+def get_surface(width, height):
+    import cairo
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    return clear_surface(surface, width, height)
+
+def write_png(surface, target=None):
+    '''
+    Write an image surface as PNG to target (a filename or file object), or
+    return the PNG bytes if target is None.
+    '''
+    if target is None:
+        buf = io.BytesIO()
+        surface.write_to_png(buf)
+        return buf.getvalue()
+    surface.write_to_png(target)
+
+def write_svg(width, height, render_fn, target=None):
+    '''
+    Create an SVG surface of the given size, pass it to render_fn to draw on,
+    and write the result to target (a filename or file object). Returns the
+    SVG bytes if target is None.
+    '''
+    import cairo
+    buf = io.BytesIO() if target is None else target
+    surface = clear_surface(cairo.SVGSurface(buf, width, height),
+                            width, height)
+    render_fn(surface)
+    surface.finish()
+    if target is None:
+        return buf.getvalue()
+
+def pygame_image(pygame, buf, size):
+    '''
+    Convert the pixel data of a cairo image surface to a pygame image. cairo
+    stores pixels as native-endian 32-bit ARGB, so on little-endian machines
+    the bytes are in BGRA order, which pygame can't read directly; swap them
+    to RGBA.
+    '''
+    if sys.byteorder == 'big':
+        return pygame.image.frombuffer(buf, size, "ARGB")
+    buf = bytearray(buf)
+    buf[0::4], buf[2::4] = buf[2::4], buf[0::4]
+    return pygame.image.frombuffer(buf, size, "RGBA")
+
 def show_surface(surface):
+    pygame = import_pygame()
+
     width = surface.get_width()
     height = surface.get_height()
 
@@ -271,12 +664,7 @@ def show_surface(surface):
     pygame.display.set_mode((width, height))
 
     screen = pygame.display.get_surface()
-    buf = surface.get_data()
-
-    # TODO: color management is a little funny, probably due to pixel
-    # formats here. In a bunch of places we need to call rgb functions
-    # but pass things in in g, b, r order.
-    image = pygame.image.frombuffer(buf, (width, height), "RGBA")
+    image = pygame_image(pygame, surface.get_data(), (width, height))
     # Tranfer to Screen
     screen.blit(image, (0, 0))
     pygame.display.flip()
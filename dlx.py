@@ -0,0 +1,234 @@
+"""
+An exact cover solver (Knuth's Algorithm X, with the dancing-links cover and
+uncover steps done on dicts of sets), for puzzles that are exact cover
+problems and don't need z3: sudoku, shikaku and starbattle.
+
+A puzzle module builds an ExactCover from its Grid and givens. Each row is
+one choice (a digit in a cell, a rectangle, a star), and carries the values
+it gives the grid's variables, so each solution comes back as a Model that
+the renderers and runner use just like a z3 model.
+"""
+import time
+
+from z3 import IntVal, simplify, substitute
+
+from z3utils import SolverTimeout
+
+# How many search steps to take between deadline checks
+DEADLINE_INTERVAL = 1000
+
+
+class Model(dict):
+    """
+    A solution of an ExactCover, as a dict from grid variables to z3 values.
+    Supports the parts of z3.ModelRef that the renderers and runner use.
+    """
+    def eval(self, expr, model_completion=False):
+        return simplify(substitute(expr, *self.items()))
+
+
+class ExactCover(object):
+    """
+    Rows are chosen so that each primary column is covered exactly as many
+    times as it needs (once, by default), and each secondary column at most
+    once.
+
+    Example:
+        >>> problem = ExactCover()
+        >>> problem.add_row('a', [1, 2], {x: 1})
+        >>> problem.add_row('b', [2], {x: 2})
+        >>> problem.add_row('c', [1], {})
+        >>> [sorted(m.values()) for m in problem.models()]
+        [[2]]
+    """
+    def __init__(self, defaults=None):
+        # Every model starts with these values, for the variables the chosen
+        # rows leave alone.
+        self.defaults = dict((var, IntVal(value))
+                             for var, value in (defaults or {}).items())
+        self.need = {}
+        self.secondary = set()
+        self.rows = []
+        self.columns = {}
+        self.assignments = []
+        self.names = []
+        self.deadline = None
+
+    def add_column(self, column, need=1, secondary=False):
+        """
+        Declares a column that must be covered need times, or, if it's
+        secondary, at most once. Columns used by rows without being declared
+        are primary, needing one row.
+        """
+        self.need[column] = need
+        if secondary:
+            self.secondary.add(column)
+        self.columns.setdefault(column, set())
+
+    def add_row(self, name, columns, assignment):
+        """
+        Adds a choice that covers columns and gives the grid's variables the
+        values in assignment (a dict from variables to ints).
+        """
+        index = len(self.rows)
+        self.rows.append(list(columns))
+        self.names.append(name)
+        self.assignments.append(dict(
+            (var, IntVal(value)) for var, value in assignment.items()))
+        for column in columns:
+            self.need.setdefault(column, 1)
+            self.columns.setdefault(column, set()).add(index)
+
+    def set_deadline(self, seconds):
+        """Like z3utils.set_deadline, for the searches this problem runs."""
+        self.deadline = time.time() + seconds
+
+    def solutions(self, limit=None):
+        """
+        Yields the solutions, each as a list of the names of the rows chosen,
+        up to limit of them. Raises SolverTimeout past the deadline.
+        """
+        search = _Search(self)
+        count = 0
+        for solution in search.run():
+            yield [self.names[i] for i in solution]
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def models(self, limit=None):
+        """Yields the solutions as Models, up to limit of them."""
+        search = _Search(self)
+        count = 0
+        for solution in search.run():
+            model = Model(self.defaults)
+            for i in solution:
+                model.update(self.assignments[i])
+            yield model
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def count(self, limit=None):
+        """
+        Counts the solutions, stopping at limit or the deadline. Returns
+        (count, complete), like runner.count_solutions.
+        """
+        count = 0
+        try:
+            for _ in _Search(self).run():
+                count += 1
+                if limit is not None and count >= limit:
+                    return count, False
+        except SolverTimeout:
+            return count, False
+        return count, True
+
+
+class _Search(object):
+    """The state of one search over an ExactCover."""
+    def __init__(self, problem):
+        self.problem = problem
+        self.rows = problem.rows
+        self.columns = dict((column, set(rows))
+                            for column, rows in problem.columns.items())
+        self.need = dict(problem.need)
+        self.primary = set(column for column in self.columns
+                           if column not in problem.secondary)
+        self.steps = 0
+
+    def remove_row(self, row):
+        for column in self.rows[row]:
+            if column in self.columns:
+                self.columns[column].discard(row)
+
+    def restore_row(self, row):
+        for column in self.rows[row]:
+            if column in self.columns:
+                self.columns[column].add(row)
+
+    def select(self, row):
+        """
+        Chooses row, covering the columns it fills up. Returns what to pass
+        to deselect to undo it.
+        """
+        self.remove_row(row)
+        covered = []
+        for column in self.rows[row]:
+            self.need[column] -= 1
+            if self.need[column] == 0:
+                rows = self.columns.pop(column)
+                for other in rows:
+                    self.remove_row(other)
+                covered.append((column, rows))
+        return covered
+
+    def deselect(self, row, covered):
+        for column, rows in reversed(covered):
+            for other in rows:
+                self.restore_row(other)
+            self.columns[column] = rows
+        for column in self.rows[row]:
+            self.need[column] += 1
+        self.restore_row(row)
+
+    def choose_column(self):
+        """
+        Returns the primary column with the fewest rows to spare, or None if
+        they're all covered.
+        """
+        best = None
+        best_slack = None
+        for column in self.primary:
+            rows = self.columns.get(column)
+            if rows is None:
+                continue
+            slack = len(rows) - self.need[column]
+            if best is None or slack < best_slack:
+                best, best_slack = column, slack
+                if slack <= 0:
+                    break
+        return best
+
+    def check_deadline(self):
+        self.steps += 1
+        deadline = self.problem.deadline
+        if (deadline is not None and self.steps % DEADLINE_INTERVAL == 0
+                and time.time() > deadline):
+            raise SolverTimeout('timeout')
+
+    def run(self, solution=None):
+        solution = [] if solution is None else solution
+        self.check_deadline()
+        column = self.choose_column()
+        if column is None:
+            yield list(solution)
+            return
+        rows = self.columns[column]
+        if len(rows) < self.need[column]:
+            return
+
+        if self.need[column] == 1:
+            for row in sorted(rows):
+                covered = self.select(row)
+                solution.append(row)
+                for found in self.run(solution):
+                    yield found
+                solution.pop()
+                self.deselect(row, covered)
+        else:
+            # A column needing several rows: either its first row is one of
+            # them, or that row isn't used at all. Branching this way finds
+            # each set of rows once, in whatever order they're chosen.
+            row = min(rows)
+            covered = self.select(row)
+            solution.append(row)
+            for found in self.run(solution):
+                yield found
+            solution.pop()
+            self.deselect(row, covered)
+
+            self.remove_row(row)
+            for found in self.run(solution):
+                yield found
+            self.restore_row(row)
@@ -1,10 +1,12 @@
 import z3
 
 from grid import Grid
+from puzzlefile import Puzzle
+from z3utils import Exactly
 import display
 
 # I can't really think of a good way to specify the givens in one of these but this will have to do
-givens = [
+example = Puzzle('galaxies', [7, 7], [
     "+-+-+-+-+-+-+-+",
     "| | | | | | | |",
     "+*+-+-+-*-+-*-+",
@@ -20,163 +22,306 @@ givens = [
     "+-+-+-+-*-+-+-+",
     "|*| | | | | * |",
     "+-+-+-+-+-+-+-+",
-]
-# givens = [
+])
+# example = Puzzle('galaxies', [4, 2], [
 #     "+-+-+-+-+",
 #     "|*| | | |",
 #     "+-+-*-+-+",
 #     "| | | |*|",
 #     "+-+-+-+-+",
-# ]
+# ])
 
 
-height = (len(givens)-1) // 2
-width = (len(givens[0])-1) // 2
-
 # some helpers
-def cell_given(cell):
+def cell_given(givens, cell):
     return givens[2*cell.y+1][2*cell.x+1] == "*"
 
-def horiz_given(horiz):
+def horiz_given(givens, horiz):
     return givens[2*horiz.y][2*horiz.x+1] == "*"
 
-def vert_given(vert):
+def vert_given(givens, vert):
     return givens[2*vert.y+1][2*vert.x] == "*"
 
-def point_given(point):
+def point_given(givens, point):
     return givens[2*point.y][2*point.x] == "*"
 
-def cell_near_given(cell):
+def cell_near_given(givens, cell):
     return any([
-        cell_given(cell),
-        horiz_given(cell.edge_above),
-        horiz_given(cell.edge_below),
-        vert_given(cell.edge_left),
-        vert_given(cell.edge_right),
-        point_given(cell.edge_left.point_above),
-        point_given(cell.edge_left.point_below),
-        point_given(cell.edge_right.point_above),
-        point_given(cell.edge_right.point_below),
+        cell_given(givens, cell),
+        horiz_given(givens, cell.edge_above),
+        horiz_given(givens, cell.edge_below),
+        vert_given(givens, cell.edge_left),
+        vert_given(givens, cell.edge_right),
+        point_given(givens, cell.edge_left.point_above),
+        point_given(givens, cell.edge_left.point_below),
+        point_given(givens, cell.edge_right.point_above),
+        point_given(givens, cell.edge_right.point_below),
     ])
 
 RelPosSort, RelPosVal, (DX, DY, DIST) = z3.TupleSort('RelPos', [z3.IntSort(), z3.IntSort(), z3.IntSort()])
 def RelPos(name):
     return z3.Const(name, RelPosSort)
 
-s = z3.Solver()
-board = Grid(width, height, cellgen=RelPos, edgegen=z3.Bool)
-# can't do cells with individual vars because i need to calculate coordinates based on z3 vars to enforce symmetry
-cell_galaxy_fn = z3.Function("cell_galaxies", z3.IntSort(), z3.IntSort(), z3.IntSort())
-
-def cell_galaxy(cell):
-    return cell_galaxy_fn(*cell.coords)
-
-# enforce borders split galaxies and non-borders don't
-for e in board.edges:
-    if e.is_outside:
-        s.add(e.var)
-    else:
-        edge_cells = e.cells()
-        s.add(e.var == (cell_galaxy(edge_cells[0]) != cell_galaxy(edge_cells[1])))
-
-# enforce non-borders propagate relative positions
-for e in board.verts:
-    if e.is_outside: continue
-    left, right = e.cell_left.var, e.cell_right.var
-    relpos_rule = z3.And(DY(left) == DY(right), DX(left) + 2 == DX(right))
-    s.add(z3.Or(e.var, relpos_rule))
-for e in board.horizs:
-    if e.is_outside: continue
-    above, below = e.cell_above.var, e.cell_below.var
-    relpos_rule = z3.And(DX(above) == DX(below), DY(above) + 2 == DY(below))
-    s.add(z3.Or(e.var, relpos_rule))
-
-# enforce galaxies are symmetric and connected
-for c in board.cells:
-    s.add(c.x - DX(c.var) >= 0)
-    s.add(c.x - DX(c.var) < width)
-    s.add(c.y - DY(c.var) >= 0)
-    s.add(c.y - DY(c.var) < height)
-    # this line is why we couldn't just use vars in each cell for cell_galaxy_fn
-    s.add(cell_galaxy(c) == cell_galaxy_fn(c.x - DX(c.var), c.y - DY(c.var)))
-    if not cell_near_given(c):
-        # this cell has to have a positive distance to its star
-        s.add(DIST(c.var) > 0)
-        # and some neighboring cell has to be part of the same galaxy and have exactly 1 shorter distance
-        s.add(z3.Or([z3.And(cell_galaxy(c2) == cell_galaxy(c), DIST(c2.var) == DIST(c.var) - 1) for c2 in c.neighbors()]))
-
-# enforce star at center of each galaxy
-starnum = 0
-for c in board.cells:
-    if cell_given(c):
-        # cell-centered galaxy
-        s.add(c.var == RelPosVal(0, 0, 0))
-        s.add(cell_galaxy(c) == starnum)
-        starnum += 1
-    elif vert_given(c.edge_right):
-        # vert-centered galaxy
-        s.add(c.var == RelPosVal(-1, 0, 0))
-        s.add(c.cell_right.var == RelPosVal(1, 0, 0))
-        s.add(cell_galaxy(c) == starnum)
-        s.add(cell_galaxy(c.cell_right) == starnum)
-        s.add(z3.Not(c.edge_right.var))
-        starnum += 1
-    elif horiz_given(c.edge_below):
-        # horiz-centered galaxy
-        s.add(c.var == RelPosVal(0, -1, 0))
-        s.add(c.cell_below.var == RelPosVal(0, 1, 0))
-        s.add(cell_galaxy(c) == starnum)
-        s.add(cell_galaxy(c.cell_below) == starnum)
-        s.add(z3.Not(c.edge_below.var))
-        starnum += 1
-    elif point_given(c.edge_right.point_below):
-        # point-centered galaxy
-        s.add(c.var == RelPosVal(-1, -1, 0))
-        s.add(c.cell_right.var == RelPosVal(1, -1, 0))
-        s.add(c.cell_below.var == RelPosVal(-1, 1, 0))
-        s.add(c.cell_right.cell_below.var == RelPosVal(1, 1, 0))
-        s.add(cell_galaxy(c) == starnum)
-        s.add(cell_galaxy(c.cell_below) == starnum)
-        s.add(cell_galaxy(c.cell_right) == starnum)
-        s.add(cell_galaxy(c.cell_right.cell_below) == starnum)
-        s.add(z3.Not(c.edge_right.var))
-        s.add(z3.Not(c.edge_below.var))
-        s.add(z3.Not(c.cell_right.edge_below.var))
-        s.add(z3.Not(c.cell_below.edge_right.var))
-        starnum += 1
-
-# enforce no stray galaxy numbers
-for c in board.cells:
-    s.add(cell_galaxy(c) >= 0)
-    s.add(cell_galaxy(c) < starnum)
-
-print(s.check())
-
-def draw_edge(ctx:display.EdgeContext):
-    ctx.draw(width=5 if ctx.val == "True" else 1)
-
-def draw_vert(ctx:display.VertEdgeContext):
-    draw_edge(ctx)
-    if vert_given(ctx.edge):
-        ctx.draw_circle(size=15, fill=True, color=(0, 1, 0, 1))
-
-def draw_horiz(ctx:display.HorizEdgeContext):
-    draw_edge(ctx)
-    if horiz_given(ctx.edge):
-        ctx.draw_circle(size=15, fill=True, color=(0, 1, 0, 1))
-
-def draw_point(ctx:display.PointContext):
-    if point_given(ctx.point):
-        ctx.draw_circle(size=15, fill=True, color=(0, 1, 0, 1))
-
-def draw_cell(ctx:display.CellContext):
-    if cell_given(ctx.cell):
-        ctx.circle(size=15, fill=True, color=(0, 1, 0, 1))
-    # galaxy = ctx.model.eval(cell_galaxy(ctx.cell))
-    # dx = ctx.model.eval(DX(ctx.cell.var))
-    # dy = ctx.model.eval(DY(ctx.cell.var))
-    # dist = ctx.model.eval(DIST(ctx.cell.var))
-    # ctx.text(f"{galaxy},{dx},{dy},{dist}", fontsize=18)
-
-
-display.draw_grid(board, s.model(), 64, cell_fn=draw_cell, horiz_fn=draw_horiz, vert_fn=draw_vert, point_fn=draw_point)
+
+def build_function(puzzle):
+    """
+    The original encoding: each cell's galaxy is an uninterpreted function
+    of its coordinates, applied to the symbolic coordinates of its mirror
+    image, and each cell has its offset from the star and a distance to it.
+    """
+    givens = puzzle.givens
+    height = (len(givens)-1) // 2
+    width = (len(givens[0])-1) // 2
+
+    s = z3.Solver()
+    board = Grid(width, height, cellgen=RelPos, edgegen=z3.Bool)
+    # can't do cells with individual vars because i need to calculate coordinates based on z3 vars to enforce symmetry
+    cell_galaxy_fn = z3.Function("cell_galaxies", z3.IntSort(), z3.IntSort(), z3.IntSort())
+
+    def cell_galaxy(cell):
+        return cell_galaxy_fn(*cell.coords)
+
+    # enforce borders split galaxies and non-borders don't
+    for e in board.edges:
+        if e.is_outside:
+            s.add(e.var)
+        else:
+            edge_cells = e.cells()
+            s.add(e.var == (cell_galaxy(edge_cells[0]) != cell_galaxy(edge_cells[1])))
+
+    # enforce non-borders propagate relative positions
+    for e in board.verts:
+        if e.is_outside: continue
+        left, right = e.cell_left.var, e.cell_right.var
+        relpos_rule = z3.And(DY(left) == DY(right), DX(left) + 2 == DX(right))
+        s.add(z3.Or(e.var, relpos_rule))
+    for e in board.horizs:
+        if e.is_outside: continue
+        above, below = e.cell_above.var, e.cell_below.var
+        relpos_rule = z3.And(DX(above) == DX(below), DY(above) + 2 == DY(below))
+        s.add(z3.Or(e.var, relpos_rule))
+
+    # enforce galaxies are symmetric and connected
+    for c in board.cells:
+        s.add(c.x - DX(c.var) >= 0)
+        s.add(c.x - DX(c.var) < width)
+        s.add(c.y - DY(c.var) >= 0)
+        s.add(c.y - DY(c.var) < height)
+        # this line is why we couldn't just use vars in each cell for cell_galaxy_fn
+        s.add(cell_galaxy(c) == cell_galaxy_fn(c.x - DX(c.var), c.y - DY(c.var)))
+        if not cell_near_given(givens, c):
+            # this cell has to have a positive distance to its star
+            s.add(DIST(c.var) > 0)
+            # and some neighboring cell has to be part of the same galaxy and have exactly 1 shorter distance
+            s.add(z3.Or([z3.And(cell_galaxy(c2) == cell_galaxy(c), DIST(c2.var) == DIST(c.var) - 1) for c2 in c.neighbors()]))
+
+    # enforce star at center of each galaxy
+    starnum = 0
+    for c in board.cells:
+        if cell_given(givens, c):
+            # cell-centered galaxy
+            s.add(c.var == RelPosVal(0, 0, 0))
+            s.add(cell_galaxy(c) == starnum)
+            starnum += 1
+        elif vert_given(givens, c.edge_right):
+            # vert-centered galaxy
+            s.add(c.var == RelPosVal(-1, 0, 0))
+            s.add(c.cell_right.var == RelPosVal(1, 0, 0))
+            s.add(cell_galaxy(c) == starnum)
+            s.add(cell_galaxy(c.cell_right) == starnum)
+            s.add(z3.Not(c.edge_right.var))
+            starnum += 1
+        elif horiz_given(givens, c.edge_below):
+            # horiz-centered galaxy
+            s.add(c.var == RelPosVal(0, -1, 0))
+            s.add(c.cell_below.var == RelPosVal(0, 1, 0))
+            s.add(cell_galaxy(c) == starnum)
+            s.add(cell_galaxy(c.cell_below) == starnum)
+            s.add(z3.Not(c.edge_below.var))
+            starnum += 1
+        elif point_given(givens, c.edge_right.point_below):
+            # point-centered galaxy
+            s.add(c.var == RelPosVal(-1, -1, 0))
+            s.add(c.cell_right.var == RelPosVal(1, -1, 0))
+            s.add(c.cell_below.var == RelPosVal(-1, 1, 0))
+            s.add(c.cell_right.cell_below.var == RelPosVal(1, 1, 0))
+            s.add(cell_galaxy(c) == starnum)
+            s.add(cell_galaxy(c.cell_below) == starnum)
+            s.add(cell_galaxy(c.cell_right) == starnum)
+            s.add(cell_galaxy(c.cell_right.cell_below) == starnum)
+            s.add(z3.Not(c.edge_right.var))
+            s.add(z3.Not(c.edge_below.var))
+            s.add(z3.Not(c.cell_right.edge_below.var))
+            s.add(z3.Not(c.cell_below.edge_right.var))
+            starnum += 1
+
+    # enforce no stray galaxy numbers
+    for c in board.cells:
+        s.add(cell_galaxy(c) >= 0)
+        s.add(cell_galaxy(c) < starnum)
+
+    return s, board
+
+def star_centers(givens):
+    """
+    The stars, as (x, y) in half cells: the center of cell (x, y) is at
+    (2x + 1, 2y + 1), and the star's position in the givens is the same.
+    """
+    return [(col, row) for row, line in enumerate(givens)
+            for col, char in enumerate(line) if char == '*']
+
+
+def galaxy_candidates(board, stars):
+    """
+    Works out which cells could be in each star's galaxy. Returns (core,
+    candidates): core maps each cell touching a star (so certainly in its
+    galaxy) to the set of those stars' indexes, and candidates maps each
+    star's index to the set of (x, y) cells that could be in its galaxy.
+    A cell touching two stars is in both of their cores, which makes the
+    puzzle unsolvable, as it would be for the other encoding.
+
+    A cell can only be in a galaxy if its mirror image through the star is
+    on the board, neither of them is in another star's core, and it can be
+    reached from the star's core through such cells. These cells are
+    symmetric about the star, as the galaxy must be.
+    """
+    core = {}
+    for k, (sx, sy) in enumerate(stars):
+        for c in board.cells:
+            if abs(2*c.x + 1 - sx) <= 1 and abs(2*c.y + 1 - sy) <= 1:
+                core.setdefault((c.x, c.y), set()).add(k)
+
+    candidates = {}
+    for k, (sx, sy) in enumerate(stars):
+        def allowed(c):
+            mirror = (sx - c.x - 1, sy - c.y - 1)
+            return (0 <= mirror[0] < board.width and
+                    0 <= mirror[1] < board.height and
+                    core.get((c.x, c.y), {k}) == {k} and
+                    core.get(mirror, {k}) == {k})
+
+        reached = set(xy for xy, ks in core.items() if k in ks)
+        frontier = list(reached)
+        while frontier:
+            x, y = frontier.pop()
+            for n in board.cell(x, y).neighbors():
+                if (n.x, n.y) not in reached and allowed(n):
+                    reached.add((n.x, n.y))
+                    frontier.append((n.x, n.y))
+        candidates[k] = reached
+    return core, candidates
+
+
+def build_bool(puzzle):
+    """
+    A Bool for each galaxy each cell could be in (see galaxy_candidates).
+    Each cell is in exactly one, and a cell and its mirror image (worked out
+    here, not by z3) are in or out together. Each cell's variable is its
+    distance from the cells around its star, bounded by the number of
+    cells, and a cell further out needs a neighbor in its galaxy nearer in.
+    """
+    givens = puzzle.givens
+    height = (len(givens)-1) // 2
+    width = (len(givens[0])-1) // 2
+
+    s = z3.Solver()
+    board = Grid(width, height, edgegen=z3.Bool)
+    stars = star_centers(givens)
+    core, candidates = galaxy_candidates(board, stars)
+
+    member = {}
+    for k, cells in candidates.items():
+        for x, y in cells:
+            member[x, y, k] = z3.Bool('galaxy_{},{}={}'.format(x, y, k))
+    for (x, y, k), b in member.items():
+        sx, sy = stars[k]
+        partner = (sx - x - 1, sy - y - 1)
+        if (x, y) < partner:
+            s.add(b == member[partner + (k,)])
+
+    galaxies_of = dict(((c.x, c.y), []) for c in board.cells)
+    for x, y, k in member:
+        galaxies_of[x, y].append(k)
+    for c in board.cells:
+        s.add(Exactly(1, [member[c.x, c.y, k]
+                          for k in galaxies_of[c.x, c.y]]))
+        s.add(z3.And(c.var >= 0, c.var < len(board.cells)))
+
+    for e in board.edges:
+        if e.is_outside:
+            s.add(e.var)
+            continue
+        a, b = e.cells()
+        shared = set(galaxies_of[a.x, a.y]) & set(galaxies_of[b.x, b.y])
+        s.add(e.var == z3.Not(z3.Or([
+            z3.And(member[a.x, a.y, k], member[b.x, b.y, k])
+            for k in sorted(shared)])))
+
+    # The cells touching a star are in its galaxy, at distance 0.
+    for (x, y), ks in core.items():
+        for k in ks:
+            s.add(member[x, y, k])
+        s.add(board.cell(x, y).var == 0)
+
+    for (x, y, k), b in member.items():
+        if k in core.get((x, y), ()):
+            continue
+        c = board.cell(x, y)
+        s.add(z3.Implies(b, z3.Or([
+            z3.And(member[n.x, n.y, k], n.var < c.var)
+            for n in c.neighbors() if (n.x, n.y, k) in member])))
+
+    return s, board
+
+
+# Ways to encode the rules, by name (see bench.py galaxies)
+ENCODINGS = {
+    'bool': build_bool,
+    'function': build_function,
+}
+
+
+def build(puzzle, encoding='bool'):
+    return ENCODINGS[encoding](puzzle)
+
+
+def solution_vars(board):
+    return [e.var for e in board.edges]
+
+def draw(puzzle, board, m, render='window', **kwargs):
+    givens = puzzle.givens
+
+    def draw_edge(ctx:display.EdgeContext):
+        ctx.draw(width=5 if ctx.val == "True" else 1)
+
+    def draw_vert(ctx:display.VertEdgeContext):
+        draw_edge(ctx)
+        if vert_given(givens, ctx.edge):
+            ctx.draw_circle(size=15, fill=True, color=(0, 1, 0, 1))
+
+    def draw_horiz(ctx:display.HorizEdgeContext):
+        draw_edge(ctx)
+        if horiz_given(givens, ctx.edge):
+            ctx.draw_circle(size=15, fill=True, color=(0, 1, 0, 1))
+
+    def draw_point(ctx:display.PointContext):
+        if point_given(givens, ctx.point):
+            ctx.draw_circle(size=15, fill=True, color=(0, 1, 0, 1))
+
+    def draw_cell(ctx:display.CellContext):
+        if cell_given(givens, ctx.cell):
+            ctx.circle(size=15, fill=True, color=(0, 1, 0, 1))
+        # galaxy = ctx.model.eval(cell_galaxy(ctx.cell))
+        # dx = ctx.model.eval(DX(ctx.cell.var))
+        # dy = ctx.model.eval(DY(ctx.cell.var))
+        # dist = ctx.model.eval(DIST(ctx.cell.var))
+        # ctx.text(f"{galaxy},{dx},{dy},{dist}", fontsize=18)
+
+    return display.renderer(render)(board, m, 64, cell_fn=draw_cell,
+                                    horiz_fn=draw_horiz, vert_fn=draw_vert,
+                                    point_fn=draw_point, **kwargs)
+
+if __name__ == '__main__':
+    s, board = build(example)
+    print(s.check())
+    draw(example, board, s.model())
@@ -0,0 +1,782 @@
+"""
+Random puzzles, for benchmark corpora.
+
+Each generator builds a random solution directly (a loop, a partition into
+rectangles, a latin square, ...) and derives givens from it, so a puzzle
+always has at least the solution it was made from. On their own, puzzles
+aren't checked for uniqueness.
+
+With --unique, each puzzle is checked with its solver and only kept if its
+solution is unique. For the puzzle types whose solvers can tell their clues
+apart (see minimize), it starts from every clue and then has as many clues
+removed as can be while the solution stays unique. Each puzzle is graded
+by how hard it is for the solver.
+
+The same type, size and seed always give the same puzzle, unless a
+--timeout cuts some of the solver's checks short.
+
+Usage:
+    python generate.py slitherlink 20 --count 10 --seed 1 > puzzles.jsonl
+    python generate.py sudoku 25 --count 1000 --unique --jobs 8 > sudoku.jsonl
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import contextlib
+import functools
+import itertools
+import multiprocessing
+import random
+import sys
+
+from puzzlefile import Puzzle, number_char, write_puzzles
+
+NEIGHBORS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+def neighbors(x, y, width, height):
+    for dx, dy in NEIGHBORS:
+        if 0 <= x + dx < width and 0 <= y + dy < height:
+            yield x + dx, y + dy
+
+
+def reaches_border(region, width, height):
+    """
+    Whether every cell outside region is connected to the edge of the board
+    through cells outside region; that is, whether region has no holes.
+    """
+    outside = set((x, y) for x in range(width) for y in range(height)
+                  if (x, y) not in region)
+    stack = [c for c in outside
+             if c[0] in (0, width - 1) or c[1] in (0, height - 1)]
+    seen = set(stack)
+    while stack:
+        x, y = stack.pop()
+        for n in neighbors(x, y, width, height):
+            if n in outside and n not in seen:
+                seen.add(n)
+                stack.append(n)
+    return len(seen) == len(outside)
+
+
+def touches_diagonally(region, x, y):
+    """
+    Whether region, with (x, y) in it, has a 2x2 block around (x, y) where
+    two cells meet only at a corner.
+    """
+    for dx, dy in itertools.product((-1, 1), repeat=2):
+        if ((x + dx, y + dy) in region and
+                (x + dx, y) not in region and (x, y + dy) not in region):
+            return True
+    return False
+
+
+def grow_region(rng, width, height, fraction, simple=True, ok=None):
+    """
+    Grows a random 4-connected region covering about fraction of the board.
+    If simple is true, the region has no holes and no cells that meet only at
+    a corner, so its outline is a single loop. ok, if given, is an extra
+    check ok(region, cell) for each cell added.
+    """
+    start = (rng.randrange(width), rng.randrange(height))
+    region = set([start])
+    target = int(fraction * width * height)
+    frontier = set(neighbors(start[0], start[1], width, height))
+    while len(region) < target and frontier:
+        cell = rng.choice(sorted(frontier))
+        frontier.discard(cell)
+        region.add(cell)
+        if ((simple and (touches_diagonally(region, *cell) or
+                         not reaches_border(region, width, height))) or
+                (ok is not None and not ok(region, cell))):
+            region.discard(cell)
+            continue
+        frontier.update(n for n in neighbors(cell[0], cell[1], width, height)
+                        if n not in region)
+    return region
+
+
+def loop_edges(region, width, height):
+    """
+    The outline of a region, as sets of horizontal and vertical edges keyed
+    by their coordinates in a Grid.
+    """
+    horizs = set((x, y) for x in range(width) for y in range(height + 1)
+                 if ((x, y - 1) in region) != ((x, y) in region))
+    verts = set((x, y) for x in range(width + 1) for y in range(height)
+                if ((x - 1, y) in region) != ((x, y) in region))
+    return horizs, verts
+
+
+def loop_clues(region, width, height):
+    horizs, verts = loop_edges(region, width, height)
+    return [[((x, y) in horizs) + ((x, y + 1) in horizs) +
+             ((x, y) in verts) + ((x + 1, y) in verts)
+             for x in range(width)] for y in range(height)]
+
+
+def grid_rows(values):
+    return [''.join(row) for row in values]
+
+
+def slitherlink(rng, size, keep=0.7):
+    region = grow_region(rng, size, size, 0.5)
+    clues = loop_clues(region, size, size)
+    return Puzzle('slitherlink', [size, size], grid_rows(
+        [[number_char(c) if rng.random() < keep else ' ' for c in row]
+         for row in clues]))
+
+
+def liar_slitherlink(rng, size):
+    # Every cell gets a clue, and one clue in each row and column is wrong.
+    region = grow_region(rng, size, size, 0.5)
+    clues = loop_clues(region, size, size)
+    liars = list(range(size))
+    rng.shuffle(liars)
+    for y, x in enumerate(liars):
+        clues[y][x] = rng.choice([n for n in range(4) if n != clues[y][x]])
+    return Puzzle('liar_slitherlink', [size, size], grid_rows(
+        [[number_char(c) for c in row] for row in clues]))
+
+
+def maysu(rng, size, keep=0.6):
+    # Grown from 2x2 blocks, so that the loop has runs long enough for
+    # pearls: every turn gets a black one, and the middle of every run of
+    # two a white one.
+    region = set((2 * x + dx, 2 * y + dy)
+                 for x, y in grow_region(rng, size // 2, size // 2, 0.5)
+                 for dx in (0, 1) for dy in (0, 1))
+    horizs, verts = loop_edges(region, size, size)
+
+    def straight(x, y):
+        """'h' or 'v' if the loop goes straight through point (x, y)."""
+        if (x - 1, y) in horizs and (x, y) in horizs:
+            return 'h'
+        if (x, y - 1) in verts and (x, y) in verts:
+            return 'v'
+        return None
+
+    def on_loop(x, y):
+        return (x, y) in horizs or (x - 1, y) in horizs or \
+            (x, y) in verts or (x, y - 1) in verts
+
+    givens = [[' '] * (size + 1) for _ in range(size + 1)]
+    for y in range(size + 1):
+        for x in range(size + 1):
+            if not on_loop(x, y) or rng.random() >= keep:
+                continue
+            through = straight(x, y)
+            if through == 'h':
+                ends = [(x - 1, y), (x + 1, y)]
+            elif through == 'v':
+                ends = [(x, y - 1), (x, y + 1)]
+            else:
+                ends = None
+            if ends and any(straight(*p) is None for p in ends):
+                givens[y][x] = 'o'
+            elif ends is None:
+                # A turn; black if the loop goes straight on from it in both
+                # directions.
+                dx = 1 if (x, y) in horizs else -1
+                dy = 1 if (x, y) in verts else -1
+                if straight(x + dx, y) == 'h' and straight(x, y + dy) == 'v':
+                    givens[y][x] = '.'
+    return Puzzle('maysu', [size, size], grid_rows(givens))
+
+
+def cave(rng, size, keep=0.3):
+    region = grow_region(rng, size, size, 0.6, simple=False,
+                         ok=lambda region, cell: reaches_border(
+                             region, size, size))
+    givens = [[' '] * size for _ in range(size)]
+    for x, y in region:
+        if rng.random() >= keep:
+            continue
+        seen = 1
+        for dx, dy in NEIGHBORS:
+            cx, cy = x + dx, y + dy
+            while (cx, cy) in region:
+                seen += 1
+                cx, cy = cx + dx, cy + dy
+        givens[y][x] = number_char(seen)
+    return Puzzle('cave', [size, size], grid_rows(givens))
+
+
+def shikaku(rng, size, max_area=12):
+    covered = [[False] * size for _ in range(size)]
+    givens = [[' '] * size for _ in range(size)]
+    for y in range(size):
+        for x in range(size):
+            if covered[y][x]:
+                continue
+            # The widest free run to the right, then random dimensions that
+            # fit in it.
+            run = 0
+            while x + run < size and not covered[y][x + run]:
+                run += 1
+            w = rng.randint(1, min(run, max_area))
+            h = rng.randint(1, min(size - y, max(1, max_area // w)))
+            for cy in range(y, y + h):
+                for cx in range(x, x + w):
+                    covered[cy][cx] = True
+            givens[y + rng.randrange(h)][x + rng.randrange(w)] = \
+                number_char(w * h)
+    return Puzzle('shikaku', [size, size], grid_rows(givens))
+
+
+def latin_square(rng, n, box=None):
+    """
+    A random latin square of the numbers 1 to n, made by shuffling a
+    pattern. If box is given, it's a sudoku solution with box x box boxes.
+    """
+    if box:
+        rows = [b * box + r for b in rng.sample(range(box), box)
+                for r in rng.sample(range(box), box)]
+        cols = [b * box + c for b in rng.sample(range(box), box)
+                for c in rng.sample(range(box), box)]
+        pattern = lambda r, c: (box * (r % box) + r // box + c) % n
+    else:
+        rows = rng.sample(range(n), n)
+        cols = rng.sample(range(n), n)
+        pattern = lambda r, c: (r + c) % n
+    symbols = rng.sample(range(1, n + 1), n)
+    return [[symbols[pattern(r, c)] for c in cols] for r in rows]
+
+
+def sudoku(rng, size, keep=0.45):
+    box = int(round(size ** 0.5))
+    square = latin_square(rng, size, box)
+    return Puzzle('sudoku', [size, size], grid_rows(
+        [[number_char(v) if rng.random() < keep else ' ' for v in row]
+         for row in square]))
+
+
+def visible(heights):
+    seen = 0
+    tallest = 0
+    for h in heights:
+        if h > tallest:
+            seen += 1
+            tallest = h
+    return seen
+
+
+def skyscrapers(rng, size, keep=0.7):
+    square = latin_square(rng, size)
+    columns = [list(col) for col in zip(*square)]
+
+    def clue(heights):
+        return visible(heights) if rng.random() < keep else 0
+
+    return Puzzle('skyscrapers', [size, size], {
+        'left': [clue(row) for row in square],
+        'right': [clue(row[::-1]) for row in square],
+        'top': [clue(col) for col in columns],
+        'bottom': [clue(col[::-1]) for col in columns],
+    })
+
+
+def star_rows(rng, size, stars):
+    """Random star positions, as a list of sets of columns per row."""
+    counts = [0] * size
+    rows = []
+
+    def place(y):
+        if y == size:
+            return True
+        options = [c for c in itertools.combinations(range(size), stars)
+                   if all(b - a > 1 for a, b in zip(c, c[1:]))]
+        rng.shuffle(options)
+        prev = rows[-1] if rows else ()
+        for cols in options:
+            if any(counts[c] >= stars for c in cols):
+                continue
+            if any(abs(c - p) <= 1 for c in cols for p in prev):
+                continue
+            for c in cols:
+                counts[c] += 1
+            rows.append(cols)
+            if place(y + 1):
+                return True
+            rows.pop()
+            for c in cols:
+                counts[c] -= 1
+        return False
+
+    if not place(0):
+        raise ValueError('no star placement for {}x{} with {} stars'.format(
+            size, size, stars))
+    return rows
+
+
+def grow_regions(rng, width, height, seeds):
+    """
+    Randomly grows a region from each seed cell until the board is covered.
+    Returns a dict from cells to the index of their seed.
+    """
+    owner = dict((seed, i) for i, seed in enumerate(seeds))
+    frontier = [(n, i) for i, seed in enumerate(seeds)
+                for n in neighbors(seed[0], seed[1], width, height)]
+    while frontier:
+        cell, i = frontier.pop(rng.randrange(len(frontier)))
+        if cell in owner:
+            continue
+        owner[cell] = i
+        frontier.extend((n, i) for n in neighbors(cell[0], cell[1],
+                                                   width, height)
+                        if n not in owner)
+    return owner
+
+
+def starbattle(rng, size, stars=2, attempts=100):
+    rows = star_rows(rng, size, stars)
+    seeds = [(x, y) for y, cols in enumerate(rows) for x in cols]
+    for _ in range(attempts):
+        owner = grow_regions(rng, size, size, seeds)
+        # Merge the one-star regions into groups of `stars` adjacent ones.
+        adjacent = dict((i, set()) for i in range(len(seeds)))
+        for (x, y), i in owner.items():
+            for n in neighbors(x, y, size, size):
+                if owner[n] != i:
+                    adjacent[i].add(owner[n])
+        group = {}
+        for i in rng.sample(range(len(seeds)), len(seeds)):
+            if i in group:
+                continue
+            members = [i]
+            while len(members) < stars:
+                options = sorted(set().union(*(adjacent[m] for m in members))
+                                 - set(group) - set(members))
+                if not options:
+                    break
+                members.append(rng.choice(options))
+            if len(members) < stars:
+                break
+            for m in members:
+                group[m] = i
+        else:
+            letters = {}
+            for i in sorted(set(group.values())):
+                letters[i] = chr(ord('a') + len(letters))
+            return Puzzle('starbattle', [size, size], grid_rows(
+                [[letters[group[owner[x, y]]] for x in range(size)]
+                 for y in range(size)]), stars=stars)
+    raise ValueError('could not make starbattle regions')
+
+
+def binario_rows(size):
+    """Every row of a size x size binario that satisfies the row rules."""
+    half = size // 2
+    rows = []
+
+    def extend(row, ones):
+        if len(row) == size:
+            rows.append(tuple(row))
+            return
+        for v in (0, 1):
+            count = ones if v else len(row) - ones
+            if count >= half or (len(row) >= 2 and row[-1] == row[-2] == v):
+                continue
+            row.append(v)
+            extend(row, ones + v)
+            row.pop()
+
+    extend([], 0)
+    return rows
+
+
+def binario_column_ok(column, size):
+    """
+    Whether a partial binario column could still be finished: neither digit
+    is used up, and what is left can be laid out with no three in a row.
+    """
+    half = size // 2
+    need = [half - column.count(0), half - column.count(1)]
+    return min(need) >= 0 and max(need) <= 2 * (min(need) + 1)
+
+
+def binario(rng, size, keep=0.35):
+    options = binario_rows(size)
+    while True:
+        rows = []
+        budget = [50 * size]
+
+        def fits(row):
+            if row in rows:
+                return False
+            for x, v in enumerate(row):
+                column = [r[x] for r in rows]
+                if len(column) >= 2 and column[-1] == column[-2] == v:
+                    return False
+                if not binario_column_ok(column + [v], size):
+                    return False
+            return True
+
+        def place():
+            if len(rows) == size:
+                return len(set(zip(*rows))) == size
+            budget[0] -= 1
+            if budget[0] < 0:
+                return False
+            candidates = [row for row in options if fits(row)]
+            for row in rng.sample(candidates, min(3, len(candidates))):
+                rows.append(row)
+                if place():
+                    return True
+                rows.pop()
+            return False
+
+        # A bounded search from a fresh start beats backtracking far.
+        if place():
+            break
+    return Puzzle('binario', [size, size], grid_rows(
+        [[str(v) if rng.random() < keep else ' ' for v in row]
+         for row in rows]))
+
+
+def tapa(rng, size, keep=0.4):
+    def no_block(region, cell):
+        x, y = cell
+        return not any(all((x + dx + i, y + dy + j) in region
+                           for i in (0, 1) for j in (0, 1))
+                       for dx in (-1, 0) for dy in (-1, 0))
+
+    region = grow_region(rng, size, size, 0.55, simple=False, ok=no_block)
+    ring = [(1, 0), (1, -1), (0, -1), (-1, -1),
+            (-1, 0), (-1, 1), (0, 1), (1, 1)]
+    givens = [[' '] * size for _ in range(size)]
+    for y in range(size):
+        for x in range(size):
+            if (x, y) in region or rng.random() >= keep:
+                continue
+            filled = [(x + dx, y + dy) in region for dx, dy in ring]
+            if not any(filled):
+                continue
+            if all(filled):
+                groups = [8]
+            else:
+                # Start just after an empty neighbor so no group wraps.
+                start = filled.index(False)
+                filled = filled[start:] + filled[:start]
+                groups = [len(list(g)) for v, g in itertools.groupby(filled)
+                          if v]
+            givens[y][x] = ''.join(str(g) for g in sorted(groups))
+    return Puzzle('tapa', [size, size],
+                  ['|'.join(cell.ljust(2) for cell in row) for row in givens])
+
+
+def galaxies(rng, size, max_area=10):
+    owner = {}
+    centers = []
+    cells = [(x, y) for y in range(size) for x in range(size)]
+    rng.shuffle(cells)
+    for x, y in cells:
+        if (x, y) in owner:
+            continue
+        # Centers are in the coordinates of the ASCII art, where cell (x, y)
+        # is at (2x + 1, 2y + 1).
+        options = [((2 * x + 1, 2 * y + 1), [(x, y)])]
+        for shape, center in (([(x, y), (x + 1, y)], (2 * x + 2, 2 * y + 1)),
+                              ([(x, y), (x, y + 1)], (2 * x + 1, 2 * y + 2)),
+                              ([(x, y), (x + 1, y), (x, y + 1),
+                                (x + 1, y + 1)], (2 * x + 2, 2 * y + 2))):
+            if all(0 <= cx < size and 0 <= cy < size and
+                   (cx, cy) not in owner for cx, cy in shape):
+                options.append((center, shape))
+        center, galaxy = rng.choice(options)
+        i = len(centers)
+        centers.append(center)
+        for c in galaxy:
+            owner[c] = i
+
+        target = rng.randint(len(galaxy), max_area)
+        for _ in range(4 * max_area):
+            if len(galaxy) >= target:
+                break
+            gx, gy = rng.choice(galaxy)
+            n = rng.choice(list(neighbors(gx, gy, size, size)))
+            mirror = (center[0] - n[0] - 1, center[1] - n[1] - 1)
+            if (n in owner or mirror in owner or
+                    not (0 <= mirror[0] < size and 0 <= mirror[1] < size)):
+                continue
+            for c in set([n, mirror]):
+                owner[c] = i
+                galaxy.append(c)
+
+    art = [['+' if x % 2 == 0 else '-' for x in range(2 * size + 1)]
+           if y % 2 == 0 else
+           ['|' if x % 2 == 0 else ' ' for x in range(2 * size + 1)]
+           for y in range(2 * size + 1)]
+    for cx, cy in centers:
+        art[cy][cx] = '*'
+    return Puzzle('galaxies', [size, size], grid_rows(art))
+
+
+def hexalgemy(rng, size, walls=0.15):
+    from hexgrid import HexGrid, coord_add
+    from invalidobj import Invalid
+    import hexalgemy as model
+
+    n = 2 * size - 1
+    g = HexGrid(n, n, size - 1, size - 1)
+    rows = list(g.rows)
+    for row in rows:
+        for cell in row:
+            cell.wall = rng.random() < walls
+
+    def seen_from(cell):
+        for d in model.dirs:
+            here = g.cell(*coord_add(cell.coords, d))
+            while not isinstance(here, Invalid) and not here.wall:
+                yield here
+                here = g.cell(*coord_add(here.coords, d))
+
+    # Place lights until every open cell has one or sees one.
+    lights = {}
+    open_cells = [c for row in rows for c in row if not c.wall]
+    rng.shuffle(open_cells)
+    for cell in open_cells:
+        if cell not in lights and not any(o in lights
+                                          for o in seen_from(cell)):
+            lights[cell] = rng.choice('RYB')
+
+    names = dict((v, k) for k, v in model.given_values.items())
+    givens = []
+    for row in rows:
+        line = ''
+        for cell in row:
+            if not cell.wall:
+                line += ' '
+                continue
+            seen = set(lights[o] for o in seen_from(cell) if o in lights)
+            line += names[tuple(c in seen for c in 'RYB')]
+        givens.append(line)
+    return Puzzle('hexalgemy', [n, n, size - 1, size - 1], givens,
+                  composite=False)
+
+
+GENERATORS = {
+    'binario': binario,
+    'cave': cave,
+    'galaxies': galaxies,
+    'hexalgemy': hexalgemy,
+    'liar_slitherlink': liar_slitherlink,
+    'maysu': maysu,
+    'shikaku': shikaku,
+    'skyscrapers': skyscrapers,
+    'slitherlink': slitherlink,
+    'starbattle': starbattle,
+    'sudoku': sudoku,
+    'tapa': tapa,
+}
+
+
+def puzzle_rng(type, size, seed):
+    return random.Random('{}/{}/{}'.format(type, size, seed))
+
+
+def generate(type, size, seed, **kwargs):
+    """
+    Makes a random puzzle of the given type and size. The same seed always
+    gives the same puzzle.
+    """
+    puzzle = GENERATORS[type](puzzle_rng(type, size, seed), size, **kwargs)
+    puzzle.params['id'] = '{}-{}-{}'.format(type, size, seed)
+    return puzzle
+
+
+def without_clues(puzzle, keys):
+    """
+    Returns a copy of puzzle without the clues at keys, which are positions
+    as given by a solver module's clue_constraints.
+    """
+    keys = set(keys)
+    if isinstance(puzzle.givens, dict):
+        givens = dict(
+            (side, [0 if (side, i) in keys else v
+                    for i, v in enumerate(values)])
+            for side, values in puzzle.givens.items())
+    else:
+        givens = [''.join(' ' if (x, y) in keys else c
+                          for x, c in enumerate(row))
+                  for y, row in enumerate(puzzle.givens)]
+    return Puzzle(puzzle.type, puzzle.size, givens, **puzzle.params)
+
+
+# How many clues minimize tries to remove at once.
+MINIMIZE_CHUNK = 8
+
+
+def minimize(puzzle, rng, timeout=None):
+    """
+    Removes clues from puzzle, in a random order, for as long as its solution
+    stays unique. Returns the smaller puzzle, or None if the solution wasn't
+    unique to begin with. Puzzles whose solver modules have no
+    clue_constraints are only checked.
+
+    Every check is made on the same solver, so what z3 learns carries over:
+    it has the puzzle's rules and, each guarded by a literal, its clues, and
+    each check assumes the literals of the clues still in play. The solution
+    is banned once found, so a clue can go if nothing is found without it.
+    A check that times out keeps its clue.
+
+    Raises SolverTimeout if the first checks, of the puzzle as it is, time
+    out.
+    """
+    from z3 import Bool, Implies, Or
+    from runner import find_model_fn, solution_vars, solver_module
+    from z3utils import SolverTimeout, set_deadline
+
+    module = solver_module(puzzle.type)
+    find_model = find_model_fn(module)
+    guards = collections.OrderedDict()
+    if hasattr(module, 'clue_constraints'):
+        s, grid = module.build(puzzle, clues=False)
+        for key, constraint in module.clue_constraints(puzzle, grid):
+            guards[key] = Bool('clue {}'.format(key))
+            s.add(Implies(guards[key], constraint))
+    else:
+        s, grid = module.build(puzzle)
+
+    def solve_with(keys):
+        s.assumptions = [guards[key] for key in keys]
+        if timeout:
+            set_deadline(s, timeout)
+        return find_model(s, grid)
+
+    kept = list(guards)
+    model = solve_with(kept)
+    if model is None:
+        return None
+    s.add(Or([v != model.eval(v, model_completion=True)
+              for v in solution_vars(module, grid)]))
+    if solve_with(kept) is not None:
+        return None
+
+    def remove(keys):
+        # Try removing keys all at once, then each half of them, and so on
+        # down to single clues. Most clues can usually go, so this takes far
+        # fewer checks than trying them one by one.
+        rest = [k for k in kept if k not in keys]
+        try:
+            if solve_with(rest) is None:
+                kept[:] = rest
+                return
+        except SolverTimeout:
+            pass
+        if len(keys) > 1:
+            remove(keys[:len(keys) // 2])
+            remove(keys[len(keys) // 2:])
+
+    order = list(kept)
+    rng.shuffle(order)
+    for i in range(0, len(order), MINIMIZE_CHUNK):
+        remove(order[i:i + MINIMIZE_CHUNK])
+    return without_clues(puzzle, set(guards) - set(kept))
+
+
+def grade(puzzle, timeout=None):
+    """
+    How hard puzzle is for its solver, solved from scratch: returns the
+    number of conflicts z3 ran into and the number of refinement rounds.
+    """
+    from runner import find_model_fn, solver_module
+    from z3utils import set_deadline
+
+    module = solver_module(puzzle.type)
+    s, grid = module.build(puzzle)
+    if timeout:
+        set_deadline(s, timeout)
+    find_model_fn(module)(s, grid)
+    stats = s.statistics()
+    conflicts = sum(stats.get_key_value(key) for key in stats.keys()
+                    if key.endswith('conflicts'))
+    return conflicts, s.rounds
+
+
+def count_clues(puzzle):
+    if isinstance(puzzle.givens, dict):
+        return sum(1 for values in puzzle.givens.values()
+                   for v in values if v != 0)
+    return sum(1 for row in puzzle.givens for c in row if c not in ' ?|')
+
+
+def generate_unique(type, size, seed, timeout=None, attempts=20, **kwargs):
+    """
+    Makes a random puzzle of the given type and size with a unique solution,
+    minimized and graded, or returns None if attempts random puzzles in a row
+    fail to be unique (or time out). The grade is kept in the puzzle's
+    clues, conflicts and rounds params.
+    """
+    from runner import solver_module
+    from z3utils import SolverTimeout
+
+    rng = puzzle_rng(type, size, seed)
+    if hasattr(solver_module(type), 'clue_constraints'):
+        kwargs.setdefault('keep', 1)
+    for _ in range(attempts):
+        puzzle = GENERATORS[type](rng, size, **kwargs)
+        try:
+            puzzle = minimize(puzzle, rng, timeout)
+            if puzzle is None:
+                continue
+            conflicts, rounds = grade(puzzle, timeout)
+        except SolverTimeout:
+            continue
+        puzzle.params['id'] = '{}-{}-{}'.format(type, size, seed)
+        puzzle.params['clues'] = count_clues(puzzle)
+        puzzle.params['conflicts'] = conflicts
+        puzzle.params['rounds'] = rounds
+        return puzzle
+    return None
+
+
+def generate_quietly(fn, seed):
+    # The solvers print their progress; keep stdout for the puzzles.
+    with contextlib.redirect_stdout(sys.stderr):
+        return fn(seed=seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Make random puzzles.')
+    parser.add_argument('type', choices=sorted(GENERATORS))
+    parser.add_argument('size', type=int)
+    parser.add_argument('--count', '-n', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first puzzle; later ones count up')
+    parser.add_argument('--unique', action='store_true',
+                        help='only make puzzles with unique solutions, with '
+                             'as few clues as possible')
+    parser.add_argument('--timeout', type=float,
+                        help='seconds allowed for each solver check')
+    parser.add_argument('--attempts', type=int, default=20,
+                        help='random puzzles to try for each unique one')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='number of worker processes')
+    args = parser.parse_args(argv)
+
+    if args.unique:
+        fn = functools.partial(generate_unique, args.type, args.size,
+                               timeout=args.timeout, attempts=args.attempts)
+    else:
+        fn = functools.partial(generate, args.type, args.size)
+    fn = functools.partial(generate_quietly, fn)
+    seeds = range(args.seed, args.seed + args.count)
+
+    pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+    puzzles = pool.imap(fn, seeds) if pool else (fn(seed) for seed in seeds)
+    for seed, puzzle in zip(seeds, puzzles):
+        if puzzle is None:
+            print('no unique puzzle for seed {}'.format(seed),
+                  file=sys.stderr)
+            continue
+        write_puzzles(sys.stdout, [puzzle])
+        sys.stdout.flush()
+    if pool:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    main()
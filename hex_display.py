@@ -1,26 +1,7 @@
-import sys
-import os
-
-import cairo
+from display import (BatchedContext, cached_layer, draw_part, font,
+                     paint_layer, show_surface, write_png, write_svg)
 from hexgrid import coord_add
 
-def font(family='', bold=False, italic=False):
-    return cairo.ToyFontFace(
-        family,
-        cairo.FontSlant.ITALIC if italic else cairo.FontSlant.NORMAL,
-        cairo.FontWeight.BOLD if bold else cairo.FontWeight.NORMAL,
-    )
-
-with open(os.devnull, 'w') as f:
-    # disable stdout
-    oldstdout = sys.stdout
-    sys.stdout = f
-
-    import pygame
-
-    # enable stdout
-    sys.stdout = oldstdout
-
 # TODO: use cairo context transforms properly instead of passing scale everywhere
 def transform_coords(coords, scale):
     n, se, sw = coords
@@ -40,21 +21,14 @@ class PointContext(object):
         return transform_coords(self.point.coords, self.scale)
 
     def draw_square(self, size=1, color=(0, 0, 0, 1)):
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
         x, y = self.c0
-        self.ctx.rectangle(x - size/2, y - size/2,
-                           size, size)
-        self.ctx.fill()
+        self.ctx.path(color, fill=True).rectangle(x - size/2, y - size/2,
+                                                  size, size)
 
     def draw_circle(self, size=10, color=(0, 0, 0, 1), fill=False):
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.arc(*self.c0, size, 0, 6.3)
-        if fill:
-            self.ctx.fill()
-        else:
-            self.ctx.stroke()
+        ctx = self.ctx.path(color, fill=fill)
+        ctx.new_sub_path()
+        ctx.arc(*self.c0, size, 0, 6.3)
 
 class EdgeContext(object):
     def __init__(self, ctx, edge, model, scale):
@@ -72,12 +46,9 @@ class EdgeContext(object):
         return transform_coords(self.edge.coords, self.scale)
 
     def draw(self, width=1, color=(0, 0, 0, 1)):
-        self.ctx.set_line_width(width)
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.move_to(*self.p0)
-        self.ctx.line_to(*self.p1)
-        self.ctx.stroke()
+        ctx = self.ctx.path(color, width=width)
+        ctx.move_to(*self.p0)
+        ctx.line_to(*self.p1)
 
 class VertContext(EdgeContext):
     def __init__(self, *a, **kw):
@@ -119,21 +90,18 @@ class CellContext(object):
         return transform_coords(self.cell.coords, self.scale)
 
     def fill(self, r, g, b, a):
-        self.ctx.set_source_rgba(b, g, r, a)
+        ctx = self.ctx.path((r, g, b, a), fill=True)
         # start at n corner
-        self.ctx.move_to(*self.c0)
-        self.ctx.rel_move_to(*transform_coords((1, 0, 0), self.scale))
-
-        # walk around hex
-        self.ctx.rel_line_to(*transform_coords((0, 1, 0), self.scale))
-        self.ctx.rel_line_to(*transform_coords((-1, 0, 0), self.scale))
-        self.ctx.rel_line_to(*transform_coords((0, 0, 1), self.scale))
-        self.ctx.rel_line_to(*transform_coords((0, -1, 0), self.scale))
-        self.ctx.rel_line_to(*transform_coords((1, 0, 0), self.scale))
-        self.ctx.rel_line_to(*transform_coords((0, 0, -1), self.scale))
+        ctx.move_to(*self.c0)
+        ctx.rel_move_to(*transform_coords((1, 0, 0), self.scale))
 
-        # fill it
-        self.ctx.fill()
+        # walk around hex (the fill closes it)
+        ctx.rel_line_to(*transform_coords((0, 1, 0), self.scale))
+        ctx.rel_line_to(*transform_coords((-1, 0, 0), self.scale))
+        ctx.rel_line_to(*transform_coords((0, 0, 1), self.scale))
+        ctx.rel_line_to(*transform_coords((0, -1, 0), self.scale))
+        ctx.rel_line_to(*transform_coords((1, 0, 0), self.scale))
+        ctx.rel_line_to(*transform_coords((0, 0, -1), self.scale))
 
     def text(self, text, fontsize=12, family='', bold=False, italic=False):
         self.ctx.set_font_size(fontsize)
@@ -146,60 +114,120 @@ class CellContext(object):
         # TODO: consistent name (circle vs. draw_circle)
         if not size:
             size = self.scale/1.5
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.arc(*self.c0, size, 0, 6.3)
-        if fill:
-            self.ctx.fill()
+        ctx = self.ctx.path(color, fill=fill)
+        ctx.new_sub_path()
+        ctx.arc(*self.c0, size, 0, 6.3)
+
+def render_grid(grid, model, scale,
+                cell_fn=None, edge_fn=None,
+                point_fn=None, surface=None, static=None):
+    '''
+    Draw the grid and return the surface it was drawn on. A new image surface
+    is created unless one is passed in.
+
+    If static is a display.StaticLayer, it is drawn (or taken from the cache)
+    first, and the callbacks passed directly only draw what depends on the
+    model.
+    '''
+    import cairo
+    if surface is None:
+        surface, ctx = get_surface(grid, scale)
+    else:
+        ctx = get_context(surface, grid, scale)
+
+    if static is not None:
+        if isinstance(surface, cairo.ImageSurface):
+            layer = cached_layer(
+                ('hex', static.key, grid.height, grid.width, grid.west_row,
+                 grid.east_row, scale),
+                lambda: render_grid(grid, None, scale, *static.fns))
+            paint_layer(ctx, layer)
         else:
-            self.ctx.stroke()
-
-def draw_grid(grid, model, scale,
-              cell_fn=None, edge_fn=None,
-              point_fn=None):
-    surface, ctx = get_surface(grid, scale)
-
+            draw_parts(ctx, grid, None, scale, *static.fns)
+    draw_parts(ctx, grid, model, scale, cell_fn, edge_fn, point_fn)
+    return surface
+
+def draw_parts(ctx, grid, model, scale,
+               cell_fn=None, edge_fn=None, point_fn=None):
+    # Every part draws through the same cairo context, so each one is
+    # wrapped in save/restore (see display.draw_part) to keep the state it
+    # sets up from leaking into the next.
+    batch = BatchedContext(ctx)
     if cell_fn:
         for cell in grid.cells:
-            cell_ctx = CellContext(ctx, cell, model, scale)
-            cell_fn(cell_ctx)
+            cell_ctx = CellContext(batch, cell, model, scale)
+            draw_part(ctx, cell_fn, cell_ctx)
     if edge_fn:
         for vert in grid.verts:
-            vert_ctx = VertContext(ctx, vert, model, scale)
-            edge_fn(vert_ctx)
+            vert_ctx = VertContext(batch, vert, model, scale)
+            draw_part(ctx, edge_fn, vert_ctx)
         for ne_sw in grid.ne_sws:
-            ne_sw_ctx = NE_SW_Context(ctx, ne_sw, model, scale)
-            edge_fn(ne_sw_ctx)
+            ne_sw_ctx = NE_SW_Context(batch, ne_sw, model, scale)
+            draw_part(ctx, edge_fn, ne_sw_ctx)
         for nw_se in grid.nw_ses:
-            nw_se_ctx = NW_SE_Context(ctx, nw_se, model, scale)
-            edge_fn(nw_se_ctx)
+            nw_se_ctx = NW_SE_Context(batch, nw_se, model, scale)
+            draw_part(ctx, edge_fn, nw_se_ctx)
     if point_fn:
         for point in grid.points:
-            point_ctx = PointContext(ctx, point, model, scale)
-            point_fn(point_ctx)
-    show_surface(surface)
+            point_ctx = PointContext(batch, point, model, scale)
+            draw_part(ctx, point_fn, point_ctx)
+    batch.flush()
+
+def draw_grid(grid, model, scale,
+              cell_fn=None, edge_fn=None,
+              point_fn=None, static=None):
+    show_surface(render_grid(grid, model, scale, cell_fn, edge_fn, point_fn,
+                             static=static))
+
+def render_grid_png(grid, model, scale,
+                    cell_fn=None, edge_fn=None,
+                    point_fn=None, target=None, static=None):
+    '''
+    Like draw_grid, but write the result as PNG to target (a filename or file
+    object) instead of showing it. Returns the PNG bytes if target is None.
+    '''
+    return write_png(render_grid(grid, model, scale,
+                                 cell_fn, edge_fn, point_fn, static=static),
+                     target)
+
+def render_grid_svg(grid, model, scale,
+                    cell_fn=None, edge_fn=None,
+                    point_fn=None, target=None, static=None):
+    '''
+    Like draw_grid, but write the result as SVG to target (a filename or file
+    object) instead of showing it. Returns the SVG bytes if target is None.
+    '''
+    width, height = surface_size(grid, scale)
+    return write_svg(width, height,
+                     lambda surface: render_grid(grid, model, scale,
+                                                 cell_fn, edge_fn, point_fn,
+                                                 surface, static),
+                     target)
+
+def renderer(render):
+    '''
+    Returns draw_grid, render_grid_png or render_grid_svg, by name ('window',
+    'png' or 'svg').
+    '''
+    return {'window': draw_grid,
+            'png': render_grid_png,
+            'svg': render_grid_svg}[render]
 
 def draw_text(ctx, x, y, t):
     _, _, w, h, dx, dy = ctx.text_extents(t)
     ctx.move_to(x - w/2, y + h/2)
     ctx.show_text(t)
 
-def input(events):
-    for event in events:
-        if event.type == pygame.QUIT:
-            sys.exit(0)
-        elif event.type == pygame.KEYDOWN:
-            if event.key == 27:
-                sys.exit(0)
-
-def get_surface(grid, scale):
+def surface_size(grid, scale):
     # in half-hexes
     w = grid.width * 2 + abs(grid.west_row - grid.east_row)
     h = grid.height * 3 / 2 + 1 / 2
 
-    width = (w+1) * scale
-    height = (h+1) * scale
-    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, int(height))
+    return (w+1) * scale, int((h+1) * scale)
+
+def get_context(surface, grid, scale):
+    import cairo
+    width, height = surface_size(grid, scale)
     ctx = cairo.Context(surface)
     ctx.set_source_rgba(1, 1, 1, 1)
     ctx.rectangle(0, 0, width, height)
@@ -208,25 +236,10 @@ def get_surface(grid, scale):
     # translate context so user origin and hex origin coincide
     ctx.translate((grid.west_row + 1.5) * scale, 1.5 * scale)
 
-    return surface, ctx
+    return ctx
 
-def show_surface(surface):
-    width = surface.get_width()
-    height = surface.get_height()
-
-    pygame.init()
-    pygame.display.set_mode((width, height))
-
-    screen = pygame.display.get_surface()
-    buf = surface.get_data()
-
-    # TODO: color management is a little funny, probably due to pixel
-    # formats here. In a bunch of places we need to call rgb functions
-    # but pass things in in g, b, r order.
-    image = pygame.image.frombuffer(buf, (width, height), "RGBA")
-    # Tranfer to Screen
-    screen.blit(image, (0, 0))
-    pygame.display.flip()
-
-    while True:
-        input(pygame.event.get())
+def get_surface(grid, scale):
+    import cairo
+    width, height = surface_size(grid, scale)
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    return surface, get_context(surface, grid, scale)
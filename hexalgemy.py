@@ -1,10 +1,12 @@
 from z3 import *
 from hexgrid import HexGrid, coord_add
-from hex_display import draw_grid
+from hex_display import renderer
 from invalidobj import Invalid, IAnd, IOr
+from puzzlefile import Puzzle
 from functools import reduce
 
-givens = [
+# The size of a hex board is [height, width, west_row, east_row]; see HexGrid.
+example = Puzzle('hexalgemy', [7, 7, 3, 3], [
     '    ',
     '     ',
     ' Y  N ',
@@ -12,17 +14,13 @@ givens = [
     '      ',
     '  NO ',
     '    '
-]
-height, width, west_row, east_row = 7, 7, 3, 3
-composite_allowed = False
+], composite=False)
 
-# givens = [
+# example = Puzzle('hexalgemy', [3, 3, 1, 1], [
 #     '0 ',
 #     ' B ',
 #     ' B'
-# ]
-# height, width, west_row, east_row = 3, 3, 1, 1
-# composite_allowed = False
+# ], composite=False)
 
 ColorSort, ColorVal, (R, Y, B) = TupleSort('Color', [BoolSort(), BoolSort(), BoolSort()])
 
@@ -46,10 +44,6 @@ def combine_colors(left, right):
 def combine_all_colors(list):
     return reduce(combine_colors, list, ColorVal(False, False, False))
 
-g = HexGrid(height, width, west_row, east_row, cellgen=Color)
-
-s = Solver()
-
 dirs = [
     (1,-1,0),
     (1,0,-1),
@@ -58,43 +52,47 @@ dirs = [
     (0,1,-1),
     (0,-1,1)
 ]
-def seen_from(cell):
-    yield cell
-    for dir in dirs:
-        here = g.cell(*coord_add(cell.coords, dir))
-        while not isinstance(here, Invalid) and here.given == ' ':
-            yield here
-            here = g.cell(*coord_add(here.coords, dir))
-
-for (givenrow, cellrow) in zip(givens, g.rows):
-    for (given, cell) in zip(givenrow, cellrow):
-        cell.given = given
-
-for cell in g.cells:
-    if cell.given != ' ':
-        # no lights in givens
-        s.add(cell.var == ColorVal(False, False, False))
-        # given must see correct color
-        s.add(combine_all_colors([other.var for other in seen_from(cell)]) == ColorVal(*given_values[cell.given]))
-    else:
-        # only allow proper colors
-        if composite_allowed:
-            s.add(AtMost(R(cell.var), Y(cell.var), B(cell.var), 2))
-        else:
-            s.add(AtMost(R(cell.var), Y(cell.var), B(cell.var), 1))
 
-    # all cells must see a light of some kind
-    if cell.given != '0':
-        s.add(IOr([other.var != ColorVal(False, False, False) for other in seen_from(cell)]))
-    # no two lights can see each other
-    s.add(IOr([cell.var == ColorVal(False, False, False), IAnd([other.var == ColorVal(False, False, False) for other in seen_from(cell) if other != cell])]))
 
-s.check()
+def build(puzzle):
+    givens = puzzle.givens
+    composite_allowed = puzzle.params.get('composite', False)
+    g = HexGrid(*puzzle.size, cellgen=Color)
+
+    s = Solver()
 
-print(s.model())
+    def seen_from(cell):
+        yield cell
+        for dir in dirs:
+            here = g.cell(*coord_add(cell.coords, dir))
+            while not isinstance(here, Invalid) and here.given == ' ':
+                yield here
+                here = g.cell(*coord_add(here.coords, dir))
 
-def draw_edge(ctx):
-    ctx.draw()
+    for (givenrow, cellrow) in zip(givens, g.rows):
+        for (given, cell) in zip(givenrow, cellrow):
+            cell.given = given
+
+    for cell in g.cells:
+        if cell.given != ' ':
+            # no lights in givens
+            s.add(cell.var == ColorVal(False, False, False))
+            # given must see correct color
+            s.add(combine_all_colors([other.var for other in seen_from(cell)]) == ColorVal(*given_values[cell.given]))
+        else:
+            # only allow proper colors
+            if composite_allowed:
+                s.add(AtMost(R(cell.var), Y(cell.var), B(cell.var), 2))
+            else:
+                s.add(AtMost(R(cell.var), Y(cell.var), B(cell.var), 1))
+
+        # all cells must see a light of some kind
+        if cell.given != '0':
+            s.add(IOr([other.var != ColorVal(False, False, False) for other in seen_from(cell)]))
+        # no two lights can see each other
+        s.add(IOr([cell.var == ColorVal(False, False, False), IAnd([other.var == ColorVal(False, False, False) for other in seen_from(cell) if other != cell])]))
+
+    return s, g
 
 colors = {
     (False, False, False): (0.8, 0.8, 0.8, 0.8),
@@ -107,13 +105,24 @@ colors = {
     (True, True, True): (0.5, 0.2, 0, 1)
 }
 
-def draw_cell(ctx):
-    if ctx.cell.given != ' ':
-        color = colors[given_values[ctx.cell.given]]
-        ctx.fill(*color)
-    else:
-        color = ctx.model[ctx.cell.var]
-        realcolor = colors[(bool(ctx.model.eval(R(color))), bool(ctx.model.eval(Y(color))), bool(ctx.model.eval(B(color))))]
-        ctx.circle(color=realcolor, fill=True)
+def draw(puzzle, g, m, render='window', **kwargs):
+    def draw_edge(ctx):
+        ctx.draw()
 
-draw_grid(g, s.model(), 30, cell_fn=draw_cell, edge_fn=draw_edge)
+    def draw_cell(ctx):
+        if ctx.cell.given != ' ':
+            color = colors[given_values[ctx.cell.given]]
+            ctx.fill(*color)
+        else:
+            color = ctx.model[ctx.cell.var]
+            realcolor = colors[(bool(ctx.model.eval(R(color))), bool(ctx.model.eval(Y(color))), bool(ctx.model.eval(B(color))))]
+            ctx.circle(color=realcolor, fill=True)
+
+    return renderer(render)(g, m, 30, cell_fn=draw_cell, edge_fn=draw_edge,
+                            **kwargs)
+
+if __name__ == '__main__':
+    s, g = build(example)
+    s.check()
+    print(s.model())
+    draw(example, g, s.model())
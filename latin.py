@@ -0,0 +1,187 @@
+"""
+The latin square rule (each row and column of an n x n Grid holds 1..n once
+each), for sudoku, skyscrapers and the like, in a choice of encodings.
+"""
+from z3 import (And, Bool, Distinct, Implies, Or, UGE, ULE, BoolVal, is_bv)
+
+from z3utils import Exactly
+
+# Ways to encode the rule:
+#   distinct: Distinct over the cell variables of each unit
+#   channelled: distinct, plus a Bool for each digit each cell could hold,
+#       tied both ways to the cell variable, with exactly one Bool of each
+#       digit in each unit
+#   permutation: just the Bools, exactly one per cell, which for each digit
+#       make a permutation matrix (exactly one per unit)
+ENCODINGS = ('distinct', 'channelled', 'permutation')
+
+# What each side's lines run along, and which way: side -> (axis, reversed)
+SIDES = {
+    'left': ('row', False),
+    'right': ('row', True),
+    'top': ('column', False),
+    'bottom': ('column', True),
+}
+
+
+class LatinSquare(object):
+    '''
+    Adds the latin square rule over the cells of an n x n grid to a solver,
+    and gives views of the square for building other rules on top of it.
+
+    Further units, such as sudoku's boxes, can be added with add_unit.
+
+    Args:
+        s: the solver.
+        g: the grid, whose cell variables (Int or BitVec) hold the digits.
+        encoding: one of ENCODINGS.
+        domains: optional dict from (x, y) to the digits that cell may
+            hold; by default any of 1..n.
+        symmetry: None, or 'digits' to fix the first row to 1..n (sound when
+            nothing else tells the digits apart), or 'reduced' to fix the
+            first column to 1..n as well (sound when nothing else tells the
+            digits, rows or columns apart).
+
+    Example:
+        >>> latin = LatinSquare(s, g, 'permutation')
+        >>> for cells in boxes:
+        ...     latin.add_unit(cells)
+        >>> s.add(latin.holds(g.cell(0, 0), 5))
+    '''
+    def __init__(self, s, g, encoding='distinct', domains=None,
+                 symmetry=None):
+        if encoding not in ENCODINGS:
+            raise ValueError('unknown latin square encoding: {}'.format(
+                encoding))
+        self.s = s
+        self.g = g
+        self.n = g.width
+        self.encoding = encoding
+        self.domains = dict(
+            ((c.x, c.y), list(range(1, self.n + 1))) for c in g.cells)
+        self.domains.update(domains or {})
+        self.digit_vars = {}
+        self.units = []
+
+        for c in g.cells:
+            self._add_cell(c)
+        for i in range(self.n):
+            self.add_unit(self.row(i))
+            self.add_unit(self.column(i))
+
+        if symmetry in ('digits', 'reduced'):
+            for x, c in enumerate(self.row(0)):
+                s.add(c.var == x + 1)
+        if symmetry == 'reduced':
+            for y, c in enumerate(self.column(0)):
+                s.add(c.var == y + 1)
+
+    def _add_cell(self, c):
+        s = self.s
+        digits = self.domains[c.x, c.y]
+        if len(digits) == 1:
+            s.add(c.var == digits[0])
+            return
+        if self.encoding != 'permutation':
+            if digits == list(range(1, self.n + 1)):
+                if is_bv(c.var):
+                    s.add(And(UGE(c.var, 1), ULE(c.var, self.n)))
+                else:
+                    s.add(And(c.var >= 1, c.var <= self.n))
+            else:
+                s.add(Or([c.var == d for d in digits]))
+        if self.encoding == 'distinct':
+            return
+
+        for d in digits:
+            b = self.digit_vars[c.x, c.y, d] = Bool('{}={}'.format(c.var, d))
+            if self.encoding == 'channelled':
+                s.add(b == (c.var == d))
+            else:
+                s.add(Implies(b, c.var == d))
+        if self.encoding == 'permutation':
+            s.add(Exactly(1, [self.digit_vars[c.x, c.y, d] for d in digits]))
+
+    def add_unit(self, cells):
+        '''
+        Adds the rule that cells (n of the grid's cells) hold 1..n once each.
+        '''
+        s = self.s
+        cells = list(cells)
+        self.units.append(cells)
+        fixed = {}
+        open_cells = []
+        for c in cells:
+            digits = self.domains[c.x, c.y]
+            if len(digits) == 1:
+                fixed[digits[0]] = fixed.get(digits[0], 0) + 1
+            else:
+                open_cells.append(c)
+        if any(count > 1 for count in fixed.values()):
+            s.add(BoolVal(False))
+            return
+
+        if self.encoding != 'permutation':
+            # The fixed cells only matter where an open cell could clash.
+            open_digits = set()
+            for c in open_cells:
+                open_digits.update(self.domains[c.x, c.y])
+            unit_vars = [c.var for c in cells
+                         if c in open_cells or
+                         self.domains[c.x, c.y][0] in open_digits]
+            if len(unit_vars) > 1:
+                s.add(Distinct(unit_vars))
+        if self.encoding == 'distinct':
+            return
+
+        for d in range(1, self.n + 1):
+            options = [self.digit_vars[c.x, c.y, d] for c in open_cells
+                       if (c.x, c.y, d) in self.digit_vars]
+            if options or d not in fixed:
+                s.add(Exactly(1 - fixed.get(d, 0), options))
+
+    def holds(self, c, d):
+        '''
+        Returns a Bool expression for cell c holding digit d.
+        '''
+        digits = self.domains[c.x, c.y]
+        if d not in digits:
+            return BoolVal(False)
+        if len(digits) == 1:
+            return BoolVal(True)
+        if (c.x, c.y, d) in self.digit_vars:
+            return self.digit_vars[c.x, c.y, d]
+        return c.var == d
+
+    def row(self, y):
+        '''
+        Returns the cells of row y, left to right.
+        '''
+        return [self.g.cell(x, y) for x in range(self.n)]
+
+    def column(self, x):
+        '''
+        Returns the cells of column x, top to bottom.
+        '''
+        return [self.g.cell(x, y) for y in range(self.n)]
+
+    def line(self, side, i):
+        '''
+        Returns the cells of row or column i in the order they're seen from
+        side ('left', 'right', 'top' or 'bottom'), nearest first.
+        '''
+        return grid_line(self.g, side, i)
+
+
+def grid_line(g, side, i):
+    """
+    Returns the cells of row or column i of a square grid g in the order
+    they're seen from side, nearest first.
+    """
+    axis, backwards = SIDES[side]
+    n = g.width
+    if axis == 'row':
+        cells = [g.cell(x, i) for x in range(n)]
+    else:
+        cells = [g.cell(i, y) for y in range(n)]
+    return cells[::-1] if backwards else cells
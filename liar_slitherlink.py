@@ -1,31 +1,21 @@
 from z3 import *
 
 from grid import Grid
-from display import draw_grid
-from adjacency_manager import solve
+from display import renderer
+from adjacency_manager import solve as solve_connected
+from puzzlefile import Puzzle, char_number
+from z3utils import Exactly, reify
 
-s = Solver()
-#g = Grid(6, 6)
-g = Grid(11, 11)
-
-for e in g.edges:
-    s.add(e.var >= 0)
-    s.add(e.var <= 1)
-
-for p in g.points:
-    count = Sum([e.var for e in p.edges()])
-    s.add(Or([count == 0, count == 2]))
-
-# givens = [
+# example = Puzzle('liar_slitherlink', [6, 6], [
 #     "1  0 3",
 #     " 03222",
 #     "0    1",
 #     "3    3",
 #     "32202 ",
 #     "3 3  3",
-# ]
+# ])
 
-givens = [
+example = Puzzle('liar_slitherlink', [11, 11], [
     "33 3 3 3 33",
     "32   2   13",
     "  33   32  ",
@@ -37,61 +27,127 @@ givens = [
     "  32   23  ",
     "31   3   13",
     "33 2 3 0 33",
-]
-
-given_constraints = []
-for y in range(g.height):
-    row = []
-    for x in range(g.width):
-        if givens[y][x] != ' ':
-            row.append(Sum([
-                e.var for e in g.cell(x, y).edges()
-            ]) == ord(givens[y][x]) - ord('0'))
-        else:
-            row.append(None)
-    given_constraints.append(row)
-
-for x in range(g.width):
-    items = [given_constraints[y][x] for y in range(g.height)]
-    items = [i for i in items if i is not None]
-    s.add(
-        Or([
-            And(items[:i] + [Not(items[i])] + items[i+1:])
-            for i in range(len(items))
-        ])
-    )
-
-for y in range(g.height):
-    items = [given_constraints[y][x] for x in range(g.width)]
-    items = [i for i in items if i is not None]
-    s.add(
-        Or([
-            And(items[:i] + [Not(items[i])] + items[i+1:])
-            for i in range(len(items))
-        ])
-    )
+])
+
+
+def loop_rules(s, g):
+    """Edges are 0 or 1, and each point has 0 or 2 of them."""
+    for e in g.edges:
+        s.add(e.var >= 0)
+        s.add(e.var <= 1)
+
+    for p in g.points:
+        count = Sum([e.var for e in p.edges()])
+        s.add(Or([count == 0, count == 2]))
+
+
+def clue_lines(given_constraints):
+    """The clue constraints of each column and then each row."""
+    width = len(given_constraints[0])
+    height = len(given_constraints)
+    return ([[given_constraints[y][x] for y in range(height)]
+             for x in range(width)] +
+            [[given_constraints[y][x] for x in range(width)]
+             for y in range(height)])
+
+
+def given_constraints(puzzle, g):
+    """
+    The constraint each given adds (that its cell has that many edges), in
+    rows of the grid, with None where there's no given.
+    """
+    givens = puzzle.givens
+    return [[Sum([e.var for e in g.cell(x, y).edges()]) ==
+             char_number(givens[y][x])
+             if givens[y][x] not in ' ?' else None
+             for x in range(g.width)]
+            for y in range(g.height)]
+
+
+def build_disjunction(puzzle):
+    """
+    The original encoding: for each row and column, an Or over which of
+    its clues is the lie, of an And of the others and the lie's negation.
+    """
+    s = Solver()
+    g = Grid(puzzle.width, puzzle.height)
+    loop_rules(s, g)
+
+    for line in clue_lines(given_constraints(puzzle, g)):
+        items = [i for i in line if i is not None]
+        s.add(
+            Or([
+                And(items[:i] + [Not(items[i])] + items[i+1:])
+                for i in range(len(items))
+            ])
+        )
+
+    return s, g
+
+
+def build_pb(puzzle):
+    """
+    Each clue's truth is reified once into a Bool, and each row and column
+    has exactly one false one, as a pseudo-boolean constraint.
+    """
+    s = Solver()
+    g = Grid(puzzle.width, puzzle.height)
+    loop_rules(s, g)
+
+    truths = [[reify(s, clue, 'truth_{},{}'.format(x, y))
+               if clue is not None else None
+               for x, clue in enumerate(row)]
+              for y, row in enumerate(given_constraints(puzzle, g))]
+    for line in clue_lines(truths):
+        lies = [Not(t) for t in line if t is not None]
+        s.add(Exactly(1, lies))
+
+    return s, g
+
+
+# Ways to encode the rules, by name (see bench.py liar_slitherlink)
+ENCODINGS = {
+    'disjunction': build_disjunction,
+    'pb': build_pb,
+}
+
+
+def build(puzzle, encoding='pb'):
+    return ENCODINGS[encoding](puzzle)
 
 def adjacency_fn(grid, model):
     for point in grid.points:
         yield [edge.var for edge in point.edges()
                if model[edge.var].as_long() == 1]
 
-m = solve(s, g, adjacency_fn)
+def find_model(s, g):
+    return solve_connected(s, g, adjacency_fn)
+
+def solution_vars(g):
+    return [e.var for e in g.edges]
+
+def draw(puzzle, g, m, render='window', **kwargs):
+    givens = puzzle.givens
+
+    def cell_draw(ctx):
+        given = givens[ctx.gy][ctx.gx]
+        count = sum([m[edge.var].as_long() for edge in ctx.cell.edges()])
+        if given in ' ?' or char_number(given) == count:
+            ctx.fill(1., 1., 1., 1.)
+        else:
+            ctx.fill(1, 0.5, 0.5, 1)
+        ctx.text(str(given), fontsize=24)
 
-def cell_draw(ctx):
-    given = givens[ctx.gy][ctx.gx]
-    count = sum([m[edge.var].as_long() for edge in ctx.cell.edges()])
-    if given == ' ' or ord(given) - ord('0') == count:
-        ctx.fill(1., 1., 1., 1.)
-    else:
-        ctx.fill(1, 0.5, 0.5, 1)
-    ctx.text(str(given), fontsize=24)
+    def edge_draw(ctx):
+        if ctx.val == '1':
+            ctx.draw(width=4)
 
-def edge_draw(ctx):
-    if ctx.val == '1':
-        ctx.draw(width=4)
+    def point_draw(ctx):
+        ctx.draw_square(size=7)
 
-def point_draw(ctx):
-    ctx.draw_square(size=7)
+    return renderer(render)(g, m, 64, cell_draw, edge_draw, edge_draw,
+                            point_draw, **kwargs)
 
-draw_grid(g, m, 64, cell_draw, edge_draw, edge_draw, point_draw)
+if __name__ == '__main__':
+    s, g = build(example)
+    draw(example, g, find_model(s, g))
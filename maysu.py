@@ -1,22 +1,14 @@
 from z3 import *
 
 from grid import Grid
-from display import draw_grid
-from adjacency_manager import solve
+from display import renderer
+from adjacency_manager import solve as solve_connected
 from invalidobj import IAnd, IOr
+from puzzlefile import Puzzle
 
-s = Solver()
-g = Grid(9, 9)
-
-for e in g.edges:
-    s.add(e.var >= 0)
-    s.add(e.var <= 1)
-
-for p in g.points:
-    count = Sum([e.var for e in p.edges()])
-    s.add(Or([count == 0, count == 2]))
-
-givens = [
+# The givens are on the points of the grid, so there is one more row and
+# column of them than there are cells.
+example = Puzzle('maysu', [9, 9], [
     "  o o     ",
     "    o   . ",
     "  . . o   ",
@@ -27,56 +19,96 @@ givens = [
     "o   .    o",
     "      oo  ",
     "  .      .",
-]
-
-for x in range(g.width+1):
-    for y in range(g.height+1):
-        pt = g.point(x, y)
-        if givens[y][x] == 'o':
-            hor = [pt.edge_left.var == 1, pt.edge_right.var == 1]
-            ver = [pt.edge_above.var == 1, pt.edge_below.var == 1]
-            s.add(IOr([
-                IAnd(hor + [extra_edge.var == 1])
-                for near_point in [pt.point_left, pt.point_right]
-                for extra_edge in [near_point.edge_above, near_point.edge_below]
-            ] + [
-                IAnd(ver + [extra_edge.var == 1])
-                for near_point in [pt.point_above, pt.point_below]
-                for extra_edge in [near_point.edge_left, near_point.edge_right]
-            ]))
-
-        elif givens[y][x] == '.':
-            s.add(IOr([
-                IAnd([pt.horiz_edge(dx).var == 1, pt.horiz_edge(dx*2).var == 1,
-                     pt.vert_edge(dy).var == 1, pt.vert_edge(dy*2).var == 1])
-                for dx, dy in [
-                        ( 1, 1),
-                        ( 1,-1),
-                        (-1, 1),
-                        (-1,-1),
-                ]
-            ]))
+])
+
+
+def clue_constraints(puzzle, g):
+    """
+    Yields the constraint each pearl adds, with its (x, y) position.
+    """
+    givens = puzzle.givens
+    for x in range(g.width+1):
+        for y in range(g.height+1):
+            pt = g.point(x, y)
+            if givens[y][x] == 'o':
+                hor = [pt.edge_left.var == 1, pt.edge_right.var == 1]
+                ver = [pt.edge_above.var == 1, pt.edge_below.var == 1]
+                yield (x, y), IOr([
+                    IAnd(hor + [extra_edge.var == 1])
+                    for near_point in [pt.point_left, pt.point_right]
+                    for extra_edge in [near_point.edge_above,
+                                       near_point.edge_below]
+                ] + [
+                    IAnd(ver + [extra_edge.var == 1])
+                    for near_point in [pt.point_above, pt.point_below]
+                    for extra_edge in [near_point.edge_left,
+                                       near_point.edge_right]
+                ])
+
+            elif givens[y][x] == '.':
+                yield (x, y), IOr([
+                    IAnd([pt.horiz_edge(dx).var == 1,
+                          pt.horiz_edge(dx*2).var == 1,
+                          pt.vert_edge(dy).var == 1,
+                          pt.vert_edge(dy*2).var == 1])
+                    for dx, dy in [
+                            ( 1, 1),
+                            ( 1,-1),
+                            (-1, 1),
+                            (-1,-1),
+                    ]
+                ])
+
 
+def build(puzzle, clues=True):
+    s = Solver()
+    g = Grid(puzzle.width, puzzle.height)
+
+    for e in g.edges:
+        s.add(e.var >= 0)
+        s.add(e.var <= 1)
+
+    for p in g.points:
+        count = Sum([e.var for e in p.edges()])
+        s.add(Or([count == 0, count == 2]))
+
+    if clues:
+        for _, constraint in clue_constraints(puzzle, g):
+            s.add(constraint)
+
+    return s, g
 
 def adjacency_fn(grid, model):
     for point in grid.points:
         yield [edge.var for edge in point.edges()
                if model[edge.var].as_long() == 1]
 
-m = solve(s, g, adjacency_fn)
+def find_model(s, g):
+    return solve_connected(s, g, adjacency_fn)
+
+def solution_vars(g):
+    return [e.var for e in g.edges]
+
+def draw(puzzle, g, m, render='window', **kwargs):
+    givens = puzzle.givens
+
+    def cell_draw(ctx):
+        ctx.fill(1, 0.5, 0.5, 1)
 
-def cell_draw(ctx):
-    ctx.fill(1, 0.5, 0.5, 1)
+    def edge_draw(ctx):
+        if ctx.val == '1':
+            ctx.draw(width=4)
 
-def edge_draw(ctx):
-    if ctx.val == '1':
-        ctx.draw(width=4)
+    def point_draw(ctx):
+        #ctx.draw_square(size=7)
+        if givens[ctx.gy][ctx.gx] == 'o':
+            ctx.draw_circle(fill=False)
+        elif givens[ctx.gy][ctx.gx] == '.':
+            ctx.draw_circle(fill=True)
 
-def point_draw(ctx):
-    #ctx.draw_square(size=7)
-    if givens[ctx.gy][ctx.gx] == 'o':
-        ctx.draw_circle(fill=False)
-    elif givens[ctx.gy][ctx.gx] == '.':
-        ctx.draw_circle(fill=True)
+    return renderer(render)(g, m, 64, cell_draw, edge_draw, edge_draw,
+                            point_draw, **kwargs)
 
-draw_grid(g, m, 64, cell_draw, edge_draw, edge_draw, point_draw)
+if __name__ == '__main__':
+    s, g = build(example)
+    draw(example, g, find_model(s, g))
@@ -0,0 +1,54 @@
+import struct
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class PNGWriter(object):
+    """
+    Writes an 8-bit RGB PNG to a file object one row at a time, so that the
+    whole image never has to be in memory at once.
+
+    Example:
+        >>> with open('out.png', 'wb') as f:
+        ...     writer = PNGWriter(f, width, height)
+        ...     for row in rows:
+        ...         writer.write_row(row)
+        ...     writer.close()
+    """
+    def __init__(self, f, width, height, level=6):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.compressor = zlib.compressobj(level)
+
+        f.write(PNG_SIGNATURE)
+        # bit depth 8, color type 2 (RGB), default compression, filtering
+        # and no interlacing
+        self.chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                        8, 2, 0, 0, 0))
+
+    def chunk(self, kind, data):
+        self.f.write(struct.pack('>I', len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        crc = zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff
+        self.f.write(struct.pack('>I', crc))
+
+    def write_row(self, row):
+        """
+        Write one row of the image, given as width * 3 bytes of RGB.
+        """
+        assert len(row) == self.width * 3
+        assert self.rows < self.height
+        # Each row starts with its filter type; 0 is no filtering.
+        data = self.compressor.compress(b'\x00' + bytes(row))
+        if data:
+            self.chunk(b'IDAT', data)
+        self.rows += 1
+
+    def close(self):
+        assert self.rows == self.height
+        self.chunk(b'IDAT', self.compressor.flush())
+        self.chunk(b'IEND', b'')
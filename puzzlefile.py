@@ -0,0 +1,421 @@
+"""
+A common on-disk format for puzzles, and streaming readers for it.
+
+A puzzle file has one puzzle per line, as a JSON object with the puzzle's
+type, size and givens:
+
+    {"type": "slitherlink", "size": [6, 6], "givens": ["    0 ", ...]}
+
+Any other keys (a puzzle id, starbattle's star count, ...) are kept in
+Puzzle.params. Blank lines and lines starting with '#' are skipped, and a
+line may also be a puzz.link/pzv.jp URL for the types listed in URL_TYPES.
+
+For grid puzzles, size is [width, height] and givens is a list of row
+strings in the same notation the puzzle scripts have always used; numbers
+are stored as chr(ord('0') + n), so 10 is ':' and 36 is 'T' (see
+number_char). The exceptions are:
+    * maysu: the givens are on points, so there are height + 1 rows of
+      width + 1 characters ('o' white, '.' black).
+    * galaxies: the givens are the ASCII art of the board, 2 * height + 1
+      rows of 2 * width + 1 characters, with '*' marking the centers.
+    * tapa: each row is the '|'-separated clue cells.
+    * skyscrapers: givens is an object with "left", "right", "top" and
+      "bottom" lists of clues, 0 meaning no clue.
+    * hexalgemy: size is [height, width, west_row, east_row].
+    * quebecats: givens is the list of [range, wall, coordinate] firings,
+      with the wall given by name.
+
+Everything here reads lazily, so files of millions of puzzles can be
+streamed without loading them:
+
+    >>> for puzzle in read_puzzle_file('corpus.jsonl.gz'):
+    ...     solve(puzzle)
+"""
+import gzip
+import io
+import json
+import sys
+
+from unionfind import UnionFind
+
+
+class PuzzleFormatError(ValueError):
+    pass
+
+
+class Puzzle(object):
+    def __init__(self, type, size, givens, **params):
+        self.type = type
+        self.size = list(size)
+        self.givens = givens
+        self.params = params
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @classmethod
+    def from_json(cls, obj):
+        obj = dict(obj)
+        try:
+            return cls(obj.pop('type'), obj.pop('size'), obj.pop('givens'),
+                       **obj)
+        except KeyError as e:
+            raise PuzzleFormatError('missing key {}'.format(e))
+
+    def to_json(self):
+        obj = {'type': self.type, 'size': self.size, 'givens': self.givens}
+        obj.update(self.params)
+        return obj
+
+    def __repr__(self):
+        return 'Puzzle({!r}, {!r})'.format(self.type, self.size)
+
+    def __eq__(self, other):
+        return (isinstance(other, Puzzle) and
+                self.to_json() == other.to_json())
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def number_char(n):
+    """Encodes a clue number the way the puzzle givens do."""
+    return chr(ord('0') + n)
+
+
+def char_number(c):
+    """Decodes a clue character; the inverse of number_char."""
+    return ord(c) - ord('0')
+
+
+def parse_line(line, type=None):
+    """
+    Parses one line of a puzzle file, returning a Puzzle, or None if the line
+    is blank or a comment. JSON puzzles without a type get the given type.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        try:
+            obj = json.loads(line)
+            if type is not None:
+                obj.setdefault('type', type)
+            return Puzzle.from_json(obj)
+        except ValueError as e:
+            raise PuzzleFormatError(str(e))
+    if '?' in line:
+        return decode_url(line)
+    raise PuzzleFormatError('not a puzzle: {!r}'.format(line[:40]))
+
+
+def read_puzzles(f, type=None):
+    """
+    Yields the puzzles in a file object (or any iterable of lines), one at a
+    time.
+    """
+    for lineno, line in enumerate(f, 1):
+        try:
+            puzzle = parse_line(line, type)
+        except PuzzleFormatError as e:
+            raise PuzzleFormatError('line {}: {}'.format(lineno, e))
+        if puzzle is not None:
+            yield puzzle
+
+
+def open_puzzle_file(path, mode='r'):
+    """
+    Opens a puzzle file as text, transparently (de)compressing .gz files.
+    A path of '-' means stdin or stdout.
+    """
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, mode.replace('t', '') + 'b'))
+    return open(path, mode)
+
+
+def read_puzzle_file(path, type=None):
+    """
+    Yields the puzzles in the file at path, one at a time.
+    """
+    f = open_puzzle_file(path)
+    try:
+        for puzzle in read_puzzles(f, type):
+            yield puzzle
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def write_puzzles(f, puzzles):
+    """Writes puzzles to a file object, one per line."""
+    for puzzle in puzzles:
+        f.write(json.dumps(puzzle.to_json(), separators=(',', ':')))
+        f.write('\n')
+
+
+# puzz.link (pzprjs) URLs look like https://puzz.link/p?slither/10/10/<body>.
+# The body is a run-length encoding of the board specific to each puzzle
+# type; these decoders follow pzprjs's. Bodies index cells row by row.
+
+def _skips(c, offset):
+    """Number of cells a 'g'-'z' run-length character covers."""
+    return int(c, 36) - offset
+
+
+def decode_4cell(body, n):
+    """Numbers 0-4 per cell (slitherlink). Returns a list of n clues."""
+    cells = [None] * n
+    i = 0
+    for ch in body:
+        if i >= n:
+            break
+        if '0' <= ch <= '4':
+            cells[i] = int(ch)
+        elif '5' <= ch <= '9':
+            cells[i] = int(ch) - 5
+            i += 1
+        elif 'a' <= ch <= 'e':
+            cells[i] = int(ch, 16) - 10
+            i += 2
+        elif ch == '.':
+            cells[i] = '?'
+        elif 'g' <= ch <= 'z':
+            i += _skips(ch, 16)
+        i += 1
+    return cells
+
+
+def decode_number16(body, n):
+    """Arbitrary numbers per cell (sudoku, shikaku, ...)."""
+    cells = [None] * n
+    i = 0
+    pos = 0
+    while pos < len(body) and i < n:
+        ch = body[pos]
+        if '0' <= ch <= '9' or 'a' <= ch <= 'f':
+            cells[i] = int(ch, 16)
+        elif ch == '-':
+            cells[i] = int(body[pos + 1:pos + 3], 16)
+            pos += 2
+        elif ch in '+=%':
+            cells[i] = (int(body[pos + 1:pos + 4], 16) +
+                        {'+': 0, '=': 4096, '%': 8192}[ch])
+            pos += 3
+        elif ch == '.':
+            cells[i] = '?'
+        elif 'g' <= ch <= 'z':
+            i += _skips(ch, 16)
+        pos += 1
+        i += 1
+    return cells
+
+
+def decode_circles(body, n):
+    """White (1) and black (2) circles, three cells per base-27 digit."""
+    cells = [None] * n
+    for pos, ch in enumerate(body[:(n + 2) // 3]):
+        value = int(ch, 27)
+        for k, weight in enumerate((9, 3, 1)):
+            i = 3 * pos + k
+            if i < n and value // weight % 3:
+                cells[i] = value // weight % 3
+    return cells
+
+
+def decode_borders(body, width, height):
+    """
+    Region borders, as bits five to a base-32 digit: first the borders
+    between horizontal neighbors, then the ones between vertical neighbors.
+    Returns a list of region letters per cell.
+    """
+    bits = []
+    for ch in body:
+        value = int(ch, 32)
+        bits.extend(value >> (4 - k) & 1 for k in range(5))
+
+    n_verts = (width - 1) * height
+    n_horizs = width * (height - 1)
+    # A short body leaves the remaining borders unset.
+    bits.extend([0] * (5 * ((n_verts + 4) // 5) + n_horizs - len(bits)))
+    vert_bits = bits[:n_verts]
+    horiz_bits = bits[5 * ((n_verts + 4) // 5):][:n_horizs]
+
+    regions = UnionFind()
+    for y in range(height):
+        for x in range(width):
+            regions.add((x, y))
+            if x > 0 and not vert_bits[y * (width - 1) + x - 1]:
+                regions.union((x - 1, y), (x, y))
+            if y > 0 and not horiz_bits[(y - 1) * width + x]:
+                regions.union((x, y - 1), (x, y))
+
+    letters = {}
+    cells = []
+    for y in range(height):
+        for x in range(width):
+            root = regions.find((x, y))
+            if root not in letters:
+                letters[root] = chr(ord('a') + len(letters))
+            cells.append(letters[root])
+    return cells
+
+
+def decode_stars(body, width, height):
+    """
+    Galaxy centers, on the (2 * width - 1) x (2 * height - 1) half-grid of
+    cells, edges and points inside the board.
+    """
+    n = (2 * width - 1) * (2 * height - 1)
+    stars = []
+    i = 0
+    for ch in body:
+        if i >= n:
+            break
+        if '0' <= ch <= '9' or 'a' <= ch <= 'f':
+            value = int(ch, 16)
+            stars.append(i)
+            i += (value >> 1) + 1
+        elif 'g' <= ch <= 'z':
+            i += _skips(ch, 15)
+    return [s for s in stars if s < n]
+
+
+def rows(cells, width, fn):
+    """Splits a flat list of cells into row strings, rendering each with fn."""
+    return [''.join(fn(c) for c in cells[y:y + width])
+            for y in range(0, len(cells), width)]
+
+
+def clue_char(clue):
+    if clue is None:
+        return ' '
+    if clue == '?':
+        return '?'
+    return number_char(clue)
+
+
+def galaxies_art(stars, width, height):
+    art = []
+    for y in range(2 * height + 1):
+        row = []
+        for x in range(2 * width + 1):
+            if y % 2 == 0:
+                row.append('+' if x % 2 == 0 else '-')
+            else:
+                row.append('|' if x % 2 == 0 else ' ')
+        art.append(row)
+    for s in stars:
+        x, y = s % (2 * width - 1), s // (2 * width - 1)
+        art[y + 1][x + 1] = '*'
+    return [''.join(row) for row in art]
+
+
+def _number_puzzle(type, decode):
+    def decoder(args, width, height):
+        cells = decode(args[0] if args else '', width * height)
+        return Puzzle(type, [width, height], rows(cells, width, clue_char))
+    return decoder
+
+
+def _starbattle(args, width, height):
+    stars, body = (args + ['', ''])[:2]
+    cells = decode_borders(body, width, height)
+    return Puzzle('starbattle', [width, height], rows(cells, width, str),
+                  stars=int(stars))
+
+
+def _galaxies(args, width, height):
+    stars = decode_stars(args[0] if args else '', width, height)
+    return Puzzle('galaxies', [width, height],
+                  galaxies_art(stars, width, height))
+
+
+def _maysu(args, width, height):
+    # masyu circles sit on the cells of the pzprjs board, which are the
+    # points of our grid.
+    cells = decode_circles(args[0] if args else '', width * height)
+    return Puzzle('maysu', [width - 1, height - 1],
+                  rows(cells, width, lambda c: ' o.'[c or 0]))
+
+
+# pzprjs puzzle ids (and their aliases) supported in URLs, mapped to
+# functions (args, width, height) -> Puzzle.
+URL_TYPES = {
+    'slither': _number_puzzle('slitherlink', decode_4cell),
+    'slitherlink': _number_puzzle('slitherlink', decode_4cell),
+    'sudoku': _number_puzzle('sudoku', decode_number16),
+    'shikaku': _number_puzzle('shikaku', decode_number16),
+    'cave': _number_puzzle('cave', decode_number16),
+    'starbattle': _starbattle,
+    'tentaisho': _galaxies,
+    'spiral': _galaxies,
+    'mashu': _maysu,
+    'masyu': _maysu,
+}
+
+
+def decode_url(url):
+    """
+    Decodes a puzz.link/pzv.jp URL (or just the part after the '?') into a
+    Puzzle.
+    """
+    query = url.split('?', 1)[-1]
+    parts = [p for p in query.split('/') if p]
+    # Some links carry editor flags before the dimensions, like p?slither/v:/...
+    parts = [p for p in parts if not p.endswith(':')]
+    if len(parts) < 3 or parts[0] not in URL_TYPES:
+        raise PuzzleFormatError('unsupported puzzle URL: {}'.format(url))
+    try:
+        width, height = int(parts[1]), int(parts[2])
+    except ValueError:
+        raise PuzzleFormatError('bad dimensions in URL: {}'.format(url))
+    return URL_TYPES[parts[0]](parts[3:], width, height)
+
+
+# pzprv3 files (what pzprjs saves) have a header of 'pzprv3', the puzzle id,
+# the number of rows and the number of columns, followed by a row of
+# space-separated tokens per cell row. Only the first table (the clues) is
+# read, so this covers the puzzles whose clues are one number per cell.
+PZPRV3_TYPES = {
+    'slither': 'slitherlink',
+    'sudoku': 'sudoku',
+    'shikaku': 'shikaku',
+    'cave': 'cave',
+}
+
+
+def read_pzprv3(f):
+    """Reads a single puzzle from a pzprv3 file object."""
+    lines = iter(f)
+
+    def next_line():
+        for line in lines:
+            line = line.strip()
+            if line:
+                return line
+        raise PuzzleFormatError('truncated pzprv3 file')
+
+    if not next_line().startswith('pzprv3'):
+        raise PuzzleFormatError('not a pzprv3 file')
+    pid = next_line()
+    if pid not in PZPRV3_TYPES:
+        raise PuzzleFormatError('unsupported pzprv3 puzzle: {}'.format(pid))
+    height = int(next_line())
+    width = int(next_line())
+
+    givens = []
+    for _ in range(height):
+        tokens = next_line().split()
+        if len(tokens) < width:
+            raise PuzzleFormatError('short row in pzprv3 file')
+        givens.append(''.join(
+            ' ' if t == '.' else '?' if t == '-' else number_char(int(t))
+            for t in tokens[:width]))
+    return Puzzle(PZPRV3_TYPES[pid], [width, height], givens)
@@ -1,10 +1,13 @@
+import functools
+
 from more_itertools import chunked
 from six import print_
 from z3 import *
 
 from grid import Grid
+from puzzlefile import Puzzle
 from sprite import Dir, Sprite, north, east, south, west
-from z3utils import Switch, lift_to_solver
+from z3utils import LIFT_MODES, Switch, lift_to_solver
 
 
 def initial_laser_dir(firing):
@@ -18,25 +21,23 @@ class QuebecatCell(object):
                                      BoolSort())
 
 
-def solve_board(board, display=False):
+def build_board(board, lift_mode='memoize'):
     """
-    Solve a single page of Rage of the Quebecats.
+    Build the constraints for a single page of Rage of the Quebecats, with
+    the tick functions lifted into the solver as lift_mode says (see
+    z3utils.LIFT_MODES). Every mode but 'quantifier' leaves the problem
+    quantifier-free by the time z3 solves it.
 
     Returns:
-        A triple (laser, x, y), where laser is the distance traveled by the
-        laser, and x and y are the coordinates of an off-grid "cell" struck by
-        the laser.
-
-    Example:
-        >>> solve_board(boards[4])
-        solving board... solution found
-        (22, 2, -1)
+        A tuple (s, grid, laser, firing_ticks) of the solver, the board's
+        grid, the laser sprite and the ticks at which the laser fires.
     """
     grid = Grid(5, 5, cellgen=QuebecatCell)
     laser = Sprite('laser', grid)
     human = grid.cell_array[2, 2]
 
     s = Solver()
+    s.lift_mode = lift_mode
 
     s.add(Not(human.var.has_mirror))
 
@@ -169,6 +170,77 @@ def solve_board(board, display=False):
     for t in range(tick + 1, tick + 27):
         s.add(tick_epilogue(t))
 
+    return s, grid, laser, firing_ticks
+
+
+def final_tick(model, laser, firing_ticks):
+    """
+    Returns the first tick when the laser is off the grid in the final
+    firing.
+    """
+    t = firing_ticks[-1] + 1
+    while model.eval(laser.in_bounds(t)):
+        t += 1
+    return t
+
+
+def draw_board(board, grid, model, laser, firing_ticks, draw):
+    """
+    Draw a solved board. draw is a function with the same signature as
+    sprite_display.draw_grid_frames_and_sprites.
+    """
+    t = final_tick(model, laser, firing_ticks)
+
+    def cell_draw(ctx, i):
+        if not ctx.model.eval(ctx.cell.var.has_mirror):
+            return
+        color = (0, 0, 1, 1)
+        if ctx.model.eval(ctx.cell.var.mirror_state(ctx.t)):
+            ctx.line(0.2, 0.8, 0.8, 0.2, color=color)
+        else:
+            ctx.line(0.2, 0.2, 0.8, 0.8, color=color)
+
+    def edge_draw(ctx, i):
+        ctx.draw(width=3)
+
+    def sprite_draw(ctx, i):
+        color = (1, 0, 0, 1)
+        ctx.draw_rotated([(0.2, 0.8), (0.5, 0.2), (0.8, 0.8),
+                          (0.5, 0.5), (0.2, 0.8)],
+                         width=2, color=color)
+
+        ctx.draw_rotated([(0.5, 0.2), (0.5, -0.5)],
+                         width=1, color=color)
+        end_tick = firing_ticks[i + 1] if i < len(board) else t
+        ctx.path(ctx.t + 1, end_tick, color=color)
+        ctx.draw_rotated([(0.5, 0.5), (0.5, 0)], t=end_tick - 1,
+                         width=1, color=color)
+
+    return draw(grid, model, 32, list(chunked(firing_ticks, 4)), [laser],
+                cell_draw, edge_draw, edge_draw, None, sprite_draw)
+
+
+def solve_board(board, display=False):
+    """
+    Solve a single page of Rage of the Quebecats.
+
+    If display is true, the solution is shown in a window. display may also be
+    a function with the same signature as
+    sprite_display.draw_grid_frames_and_sprites (for instance
+    render_grid_frames_and_sprites_png) to draw the solution some other way.
+
+    Returns:
+        A triple (laser, x, y), where laser is the distance traveled by the
+        laser, and x and y are the coordinates of an off-grid "cell" struck by
+        the laser.
+
+    Example:
+        >>> solve_board(boards[4])
+        solving board... solution found
+        (22, 2, -1)
+    """
+    s, grid, laser, firing_ticks = build_board(board)
+
     print_("solving board... ", end='', flush=True)
 
     if s.check() == unsat:
@@ -179,45 +251,15 @@ def solve_board(board, display=False):
 
         # Determine the range of the final firing by finding the first tick
         # when the laser goes off the grid.
-        t = firing_ticks[-1] + 1
-        final_range = 0
-        while model.eval(laser.in_bounds(t)):
-            final_range += 1
-            t += 1
+        t = final_tick(model, laser, firing_ticks)
+        final_range = t - firing_ticks[-1] - 1
 
         if display:
-            from sprite_display import draw_grid_frames_and_sprites
-
-            def cell_draw(ctx, i):
-                if not ctx.model.eval(ctx.cell.var.has_mirror):
-                    return
-                color = (0, 0, 1, 1)
-                if ctx.model.eval(ctx.cell.var.mirror_state(ctx.t)):
-                    ctx.line(0.2, 0.8, 0.8, 0.2, color=color)
-                else:
-                    ctx.line(0.2, 0.2, 0.8, 0.8, color=color)
-
-            def edge_draw(ctx, i):
-                ctx.draw(width=3)
-
-            def sprite_draw(ctx, i):
-                color = (1, 0, 0, 1)
-                ctx.draw_rotated([(0.2, 0.8), (0.5, 0.2), (0.8, 0.8),
-                                  (0.5, 0.5), (0.2, 0.8)],
-                                 width=2, color=color)
-
-                ctx.draw_rotated([(0.5, 0.2), (0.5, -0.5)],
-                                 width=1, color=color)
-                end_tick = firing_ticks[i + 1] if i < len(board) else t
-                ctx.path(ctx.t + 1, end_tick, color=color)
-                ctx.draw_rotated([(0.5, 0.5), (0.5, 0)], t=end_tick - 1,
-                                 width=1, color=color)
-
-            draw_grid_frames_and_sprites(grid, model, 32,
-                                         list(chunked(firing_ticks, 4)),
-                                         [laser],
-                                         cell_draw, edge_draw, edge_draw, None,
-                                         sprite_draw)
+            if callable(display):
+                draw = display
+            else:
+                from sprite_display import draw_grid_frames_and_sprites as draw
+            draw_board(board, grid, model, laser, firing_ticks, draw)
 
         return (final_range,
                 model.eval(laser.x(t)).as_long(),
@@ -275,6 +317,43 @@ boards = [
 ]
 
 
+# In puzzle files, a board is a list of [range, wall, coordinate] firings
+# with the wall given by name.
+WALLS = {'north': north, 'east': east, 'south': south, 'west': west}
+
+example = Puzzle('quebecats', [5, 5], [
+    [dt, str(wall), coord] for dt, wall, coord in boards[4]
+])
+
+
+# Ways to encode the rules, by name: how the tick functions are lifted into
+# the solver (see bench.py quebecats)
+ENCODINGS = LIFT_MODES
+
+
+def build(puzzle, encoding='memoize'):
+    board = [(dt, WALLS[wall], coord) for dt, wall, coord in puzzle.givens]
+    s, grid, laser, firing_ticks = build_board(board, encoding)
+    # Keep what draw needs with the grid.
+    grid.board = board
+    grid.laser = laser
+    grid.firing_ticks = firing_ticks
+    return s, grid
+
+
+def solution_vars(grid):
+    # Where the mirrors are, and which way the ones that exist start out.
+    return ([c.var.has_mirror for c in grid.cells] +
+            [And(c.var.has_mirror, c.var.mirror_state(0))
+             for c in grid.cells])
+
+
+def draw(puzzle, grid, m, render='window', **kwargs):
+    from sprite_display import renderer
+    return draw_board(grid.board, grid, m, grid.laser, grid.firing_ticks,
+                      functools.partial(renderer(render), **kwargs))
+
+
 def solve_all():
     letters = {}
     for i, board in enumerate(boards):
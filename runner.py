@@ -0,0 +1,264 @@
+"""
+Solve the puzzles in a puzzle file (see puzzlefile) and report each result
+as a line of JSON.
+
+Usage:
+    python -m runner slitherlink puzzles.jsonl
+    python -m runner sudoku - --jobs 4 --timeout 10 < sudokus.jsonl.gz
+    python -m runner any puzzles/examples.jsonl --render png --output-dir out
+
+Each result holds the puzzle's index in the input (and its id, if it has
+one), its status (sat, unsat, timeout or error) and the build, solve and
+render times in seconds. With --count-solutions, it also has the number of
+solutions found, and whether the count is complete.
+
+With --backend dlx, the puzzle types that are exact cover problems (sudoku,
+shikaku and starbattle) are solved by the dlx module instead of z3.
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import contextlib
+import functools
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from z3 import Or
+
+from puzzlefile import read_puzzle_file
+from z3utils import SolverTimeout, check_model, set_deadline
+
+# Puzzle types, and the modules that solve them. Each module has
+#   build(puzzle) -> (solver, grid)
+#   draw(puzzle, grid, model, render='window', **kwargs)
+# and may have
+#   find_model(solver, grid) -> a model, or None if there is no solution
+#   solution_vars(grid) -> the expressions that tell solutions apart
+#   exact_cover(puzzle) -> (dlx.ExactCover, grid), for --backend dlx
+# which otherwise just check the solver and use the grid's cell variables.
+TYPES = {
+    'binario': 'binario',
+    'cave': 'cave',
+    'galaxies': 'galaxies',
+    'hexalgemy': 'hexalgemy',
+    'liar_slitherlink': 'liar_slitherlink',
+    'maysu': 'maysu',
+    'quebecats': 'quebecats',
+    'shikaku': 'shikaku',
+    'skyscrapers': 'skyscrapers',
+    'slitherlink': 'slitherlink',
+    'starbattle': 'starbattle',
+    'sudoku': 'sudoku',
+    'tapa': 'tapa',
+}
+
+
+def solver_module(type):
+    if type not in TYPES:
+        raise ValueError('unknown puzzle type: {}'.format(type))
+    return importlib.import_module(TYPES[type])
+
+
+def find_model_fn(module):
+    return getattr(module, 'find_model', lambda s, g: check_model(s))
+
+
+def solution_vars(module, grid):
+    if hasattr(module, 'solution_vars'):
+        return module.solution_vars(grid)
+    return [c.var for c in grid.cells]
+
+
+def count_solutions(module, s, grid, model, limit):
+    """
+    Counts the solutions of a solved puzzle (up to limit), by banning each
+    one in turn and solving again. Returns (count, complete).
+    """
+    find_model = find_model_fn(module)
+    variables = solution_vars(module, grid)
+    count = 1
+    while count < limit:
+        s.add(Or([v != model.eval(v, model_completion=True)
+                  for v in variables]))
+        try:
+            model = find_model(s, grid)
+        except SolverTimeout:
+            return count, False
+        if model is None:
+            return count, True
+        count += 1
+    return count, False
+
+
+def solve_exact_cover(module, puzzle, timeout, count, max_solutions,
+                      result):
+    """
+    The dlx backend's part of run_puzzle: builds and solves puzzle as an
+    exact cover problem, filling in result. Returns (grid, model).
+    """
+    if not hasattr(module, 'exact_cover'):
+        raise ValueError('no exact cover solver for {}'.format(puzzle.type))
+    start = time.perf_counter()
+    problem, grid = module.exact_cover(puzzle)
+    result['build_time'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if timeout:
+        problem.set_deadline(timeout)
+    model = next(problem.models(), None)
+    result['status'] = 'unsat' if model is None else 'sat'
+    if count:
+        result['solutions'], result['complete'] = (
+            problem.count(max_solutions) if model is not None else (0, True))
+    result['solve_time'] = time.perf_counter() - start
+    return grid, model
+
+
+def run_puzzle(index, puzzle, type='any', timeout=None, count=False,
+               max_solutions=1000, render='none', output_dir='.',
+               backend='z3'):
+    """
+    Builds, solves and optionally counts and renders one puzzle, returning a
+    dict describing the result.
+    """
+    result = collections.OrderedDict(index=index, type=puzzle.type)
+    if 'id' in puzzle.params:
+        result['id'] = puzzle.params['id']
+
+    phase = 'build_time'
+    start = time.perf_counter()
+    try:
+        if type != 'any' and puzzle.type != type:
+            raise ValueError('expected a {} puzzle'.format(type))
+        module = solver_module(puzzle.type)
+        # The solvers print progress; keep stdout for the results.
+        with contextlib.redirect_stdout(sys.stderr):
+            if backend == 'dlx':
+                phase = 'solve_time'
+                grid, model = solve_exact_cover(
+                    module, puzzle, timeout, count, max_solutions, result)
+            else:
+                s, grid = module.build(puzzle)
+                result['build_time'] = time.perf_counter() - start
+
+                phase = 'solve_time'
+                start = time.perf_counter()
+                if timeout:
+                    set_deadline(s, timeout)
+                model = find_model_fn(module)(s, grid)
+                result['status'] = 'unsat' if model is None else 'sat'
+                if count:
+                    result['solutions'], result['complete'] = (
+                        count_solutions(module, s, grid, model,
+                                        max_solutions)
+                        if model is not None else (0, True))
+                result['solve_time'] = time.perf_counter() - start
+
+            if render != 'none' and model is not None:
+                phase = 'render_time'
+                start = time.perf_counter()
+                target = os.path.join(output_dir, '{}.{}'.format(
+                    puzzle.params.get('id', index), render))
+                module.draw(puzzle, grid, model, render, target=target)
+                result['image'] = target
+                result['render_time'] = time.perf_counter() - start
+    except SolverTimeout:
+        result['status'] = 'timeout'
+        result[phase] = time.perf_counter() - start
+    except Exception as e:
+        # A puzzle that solved but failed to render keeps its status.
+        result.setdefault('status', 'error')
+        result['error'] = '{}: {}'.format(e.__class__.__name__, e)
+        result[phase] = time.perf_counter() - start
+    return result
+
+
+def _run_numbered(fn, item):
+    return fn(*item)
+
+
+def imap_bounded(pool, fn, items, window):
+    """
+    Like pool.imap, but with at most window items in flight, so that a huge
+    input is read only as fast as it is solved.
+    """
+    pending = collections.deque()
+    for item in items:
+        pending.append(pool.apply_async(fn, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m runner',
+        description='Solve puzzles from a puzzle file.')
+    parser.add_argument('type', choices=sorted(TYPES) + ['any'],
+                        help="the puzzle type ('any' takes each puzzle's "
+                             "own type from the file)")
+    parser.add_argument('input', nargs='?', default='-',
+                        help='puzzle file (.jsonl, optionally .gz); '
+                             'default stdin')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--timeout', type=float,
+                        help='seconds allowed to solve each puzzle')
+    parser.add_argument('--count-solutions', action='store_true',
+                        help='count the solutions instead of finding one')
+    parser.add_argument('--max-solutions', type=int, default=1000,
+                        help='stop counting after this many solutions')
+    parser.add_argument('--render', choices=('png', 'svg', 'none'),
+                        default='none',
+                        help='draw each solution to a file')
+    parser.add_argument('--output-dir', default='.',
+                        help='where to write rendered solutions')
+    parser.add_argument('--output', '-o', default='-',
+                        help='file to write results to; default stdout')
+    parser.add_argument('--backend', choices=('z3', 'dlx'), default='z3',
+                        help='solve with z3, or (for exact cover puzzles) '
+                             'with dancing links')
+    args = parser.parse_args(argv)
+
+    if args.render != 'none' and not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    fn = functools.partial(
+        run_puzzle, type=args.type, timeout=args.timeout,
+        count=args.count_solutions, max_solutions=args.max_solutions,
+        render=args.render, output_dir=args.output_dir,
+        backend=args.backend)
+    puzzles = enumerate(read_puzzle_file(
+        args.input, None if args.type == 'any' else args.type))
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        if args.jobs > 1:
+            pool = multiprocessing.Pool(args.jobs)
+            results = imap_bounded(pool, functools.partial(_run_numbered, fn),
+                                   puzzles, 4 * args.jobs)
+        else:
+            pool = None
+            results = (fn(*item) for item in puzzles)
+
+        for result in results:
+            out.write(json.dumps(result))
+            out.write('\n')
+            out.flush()
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,20 @@
+import collections
+
 from z3 import *
 
 from grid import Grid
-from display import draw_grid
-from adjacency_manager import solve
+from display import renderer
+from dlx import ExactCover
 from invalidobj import Invalid
-
-s = Solver()
-#g = Grid(5, 5)
-g = Grid(20, 20)
+from puzzlefile import Puzzle, char_number
+from z3utils import Exactly
 
 def factors(n):
     for i in range(1, n+1):
-        if i * (n/i) == n:
-            yield (i, n/i)
+        if n % i == 0:
+            yield (i, n // i)
 
-def possibilities(px, py, n):
+def possibilities(g, px, py, n):
     gw = g.width
     gh = g.height
 
@@ -29,15 +29,15 @@ def possibilities(px, py, n):
                     continue
                 yield (left, top, right, bottom)
 
-# givens = [
+# example = Puzzle('shikaku', [5, 5], [
 #     "   3 ",
 #     "2 3 5",
 #     " 2   ",
 #     " 24  ",
 #     " 2 2 ",
-# ]
+# ])
 
-givens = [
+example = Puzzle('shikaku', [20, 20], [
     "2      2 2 2 5   2  ",
     "                  4 ",
     " T         `        ",
@@ -58,40 +58,178 @@ givens = [
     "  6h              3 ",
     "                 3  ",
     "3    9    3    4  3 ",
-]
-
-count = 0
-for y in range(g.height):
-    for x in range(g.width):
-        c = givens[y][x]
-        if c == ' ':
-            continue
-        n = ord(c) - ord('0')
-
-        # Note: we don't need negative constraints, since the regions
-        # will always cover the entire grid. (If that weren't the case,
-        # we'd need to add constraints saying that cells that aren't
-        # part of this region have a value other than "count".)
-        s.add(Or([
-            And([
-                g.cell(cx, cy).var == count
-                for cx in range(l, r)
-                for cy in range(t, b)
-            ])
-            for l, t, r, b in possibilities(x, y, n)
-        ]))
-
-        count += 1
-
-s.check()
-m = s.model()
-
-
-def cell_draw(ctx):
-    ctx.fill(1, 0.5, 0.5, 1)
-    given = givens[ctx.gy][ctx.gx]
-    if given != ' ':
-        ctx.text(str(ord(given) - ord('0')), fontsize=24)
+])
+
+
+def clue_sizes(g, c):
+    # A '?' clue can be any size.
+    if c == '?':
+        return range(1, g.width * g.height + 1)
+    return [char_number(c)]
+
+
+def rectangle_cells(rect):
+    l, t, r, b = rect
+    return [(x, y) for x in range(l, r) for y in range(t, b)]
+
+
+def candidate_rectangles(g, givens):
+    """
+    Returns an OrderedDict from each clue's (x, y) position to the
+    rectangles (left, top, right, bottom) it could be, leaving out any that
+    would cover another clue.
+    """
+    clues = [(x, y) for y in range(g.height) for x in range(g.width)
+             if givens[y][x] != ' ']
+    clue_cells = set(clues)
+    candidates = collections.OrderedDict()
+    for x, y in clues:
+        candidates[x, y] = [
+            rect
+            for n in clue_sizes(g, givens[y][x])
+            for rect in possibilities(g, x, y, n)
+            if not any(cell in clue_cells and cell != (x, y)
+                       for cell in rectangle_cells(rect))
+        ]
+    return candidates
+
+
+def prune(candidates):
+    """
+    Drops candidate rectangles that can't be part of a solution, in place,
+    until nothing more can be dropped:
+      * a clue with just one rectangle left has to use it, so no other
+        clue's rectangle may overlap it;
+      * if every rectangle left that covers some cell belongs to one clue,
+        that clue has to cover the cell, so its other rectangles can go.
+    Returns the number of rectangles dropped.
+    """
+    dropped = 0
+    changed = True
+    while changed:
+        changed = False
+        forced = {}
+        covering = collections.defaultdict(set)
+        for clue, rects in candidates.items():
+            for rect in rects:
+                for cell in rectangle_cells(rect):
+                    covering[cell].add(clue)
+                    if len(rects) == 1:
+                        forced[cell] = clue
+        # The cells that only one clue can cover, by clue
+        needed = collections.defaultdict(set)
+        for cell, owners in covering.items():
+            if len(owners) == 1:
+                needed[next(iter(owners))].add(cell)
+
+        for clue, rects in candidates.items():
+            keep = []
+            for rect in rects:
+                cells = rectangle_cells(rect)
+                if any(forced.get(cell, clue) != clue for cell in cells):
+                    continue
+                if not needed[clue].issubset(cells):
+                    continue
+                keep.append(rect)
+            if len(keep) < len(rects):
+                dropped += len(rects) - len(keep)
+                candidates[clue] = keep
+                changed = True
+    return dropped
+
+
+def build_expanded(puzzle):
+    """
+    The original encoding: each clue is an Or over its rectangles of an And
+    over their cells. Kept for comparison (see bench.py shikaku).
+    """
+    givens = puzzle.givens
+    s = Solver()
+    g = Grid(puzzle.width, puzzle.height)
+
+    count = 0
+    for y in range(g.height):
+        for x in range(g.width):
+            c = givens[y][x]
+            if c == ' ':
+                continue
+
+            # Note: we don't need negative constraints, since the regions
+            # will always cover the entire grid. (If that weren't the case,
+            # we'd need to add constraints saying that cells that aren't
+            # part of this region have a value other than "count".)
+            s.add(Or([
+                And([
+                    g.cell(cx, cy).var == count
+                    for cx in range(l, r)
+                    for cy in range(t, b)
+                ])
+                for n in clue_sizes(g, c)
+                for l, t, r, b in possibilities(g, x, y, n)
+            ]))
+
+            count += 1
+
+    return s, g
+
+
+def build_rectangles(puzzle):
+    """
+    Each clue's candidate rectangles are found and pruned up front (see
+    candidate_rectangles and prune), and each one left gets a Bool saying
+    whether it's used. Every cell is covered by exactly one used rectangle.
+    Cells take the number of their clue, for drawing.
+    """
+    s = Solver()
+    g = Grid(puzzle.width, puzzle.height)
+
+    candidates = candidate_rectangles(g, puzzle.givens)
+    prune(candidates)
+
+    covering = collections.defaultdict(list)
+    for count, (clue, rects) in enumerate(candidates.items()):
+        for rect in rects:
+            used = Bool('rect_{},{}_{},{},{},{}'.format(*(clue + rect)))
+            for cx, cy in rectangle_cells(rect):
+                covering[cx, cy].append(used)
+                s.add(Implies(used, g.cell(cx, cy).var == count))
+
+    for c in g.cells:
+        s.add(Exactly(1, covering[c.x, c.y]))
+
+    return s, g
+
+
+def exact_cover(puzzle):
+    """
+    Builds the puzzle as a dlx.ExactCover: a row for each candidate
+    rectangle left after pruning, covering its cells.
+    """
+    g = Grid(puzzle.width, puzzle.height)
+    candidates = candidate_rectangles(g, puzzle.givens)
+    prune(candidates)
+
+    problem = ExactCover()
+    for c in g.cells:
+        problem.add_column((c.x, c.y))
+    for count, (clue, rects) in enumerate(candidates.items()):
+        for rect in rects:
+            cells = rectangle_cells(rect)
+            problem.add_row((clue, rect), cells, dict(
+                (g.cell(cx, cy).var, count) for cx, cy in cells))
+    return problem, g
+
+
+# Ways to encode the puzzle, by name (see bench.py shikaku)
+ENCODINGS = {
+    'expanded': build_expanded,
+    'rectangles': build_rectangles,
+}
+
+
+def build(puzzle, encoding='rectangles'):
+    return ENCODINGS[encoding](puzzle)
+
 
 def get_model(m, v):
     if isinstance(v, Invalid):
@@ -99,14 +237,31 @@ def get_model(m, v):
     else:
         return m[v].as_long()
 
-def vert_edge_draw(ctx):
-    left = get_model(ctx.model, ctx.edge.cell_left.var)
-    right = get_model(ctx.model, ctx.edge.cell_right.var)
-    ctx.draw(width=5 if left != right else 1)
+def draw(puzzle, g, m, render='window', **kwargs):
+    givens = puzzle.givens
+
+    def cell_draw(ctx):
+        ctx.fill(1, 0.5, 0.5, 1)
+        given = givens[ctx.gy][ctx.gx]
+        if given == '?':
+            ctx.text(given, fontsize=24)
+        elif given != ' ':
+            ctx.text(str(char_number(given)), fontsize=24)
+
+    def vert_edge_draw(ctx):
+        left = get_model(ctx.model, ctx.edge.cell_left.var)
+        right = get_model(ctx.model, ctx.edge.cell_right.var)
+        ctx.draw(width=5 if left != right else 1)
+
+    def horiz_edge_draw(ctx):
+        top = get_model(ctx.model, ctx.edge.cell_above.var)
+        bottom = get_model(ctx.model, ctx.edge.cell_below.var)
+        ctx.draw(width=5 if top != bottom else 1)
 
-def horiz_edge_draw(ctx):
-    top = get_model(ctx.model, ctx.edge.cell_above.var)
-    bottom = get_model(ctx.model, ctx.edge.cell_below.var)
-    ctx.draw(width=5 if top != bottom else 1)
+    return renderer(render)(g, m, 64, cell_draw, horiz_edge_draw,
+                            vert_edge_draw, **kwargs)
 
-draw_grid(g, m, 64, cell_draw, horiz_edge_draw, vert_edge_draw)
+if __name__ == '__main__':
+    s, g = build(example)
+    s.check()
+    draw(example, g, s.model())
@@ -1,74 +1,101 @@
 from z3 import *
 
 from grid import Grid
-from display import draw_grid
-
-# left_givens = [4, 4, 0, 0, 0]
-# top_givens = [0, 0, 2, 1, 0]
-# bottom_givens = [2, 0, 1, 0, 0]
-# right_givens = [0, 0, 5, 0, 0]
-
-left_givens = [2, 2, 1, 4, 3]
-right_givens = [3, 3, 2, 1, 2]
-top_givens = [2, 2, 1, 3, 4]
-bottom_givens = [3, 2, 3, 1, 2]
-
-
-w = len(left_givens)
-s = Solver()
-g = Grid(w, w)
-left = Grid(w, w, 'left')
-right = Grid(w, w, 'right')
-top = Grid(w, w, 'top')
-bottom = Grid(w, w, 'bottom')
-
-for i in range(w):
-    s.add(Distinct([g.cell(i, j).var for j in range(w)]))
-    s.add(Distinct([g.cell(j, i).var for j in range(w)]))
-
-for c in g.cells:
-    s.add(c.var >= 1)
-    s.add(c.var <= w)
-
-for grid in [left, right, top, bottom]:
-    for c in grid.cells:
-        s.add(c.var >= 0)
-        s.add(c.var <= 1)
-
-def constrain(building_vars, aux_vars):
-    for i, (bv, av) in enumerate(zip(building_vars, aux_vars)):
-        s.add((av == 1) == And([
-            building_vars[j] < bv
-            for j in range(i)
-        ]))
-
-for i in range(w):
-    constrain([g.cell(j, i).var for j in range(w)],
-              [left.cell(j, i).var for j in range(w)])
-    constrain([g.cell(i, j).var for j in range(w)],
-              [top.cell(i, j).var for j in range(w)])
-    constrain([g.cell(w - 1 - j, i).var for j in range(w)],
-              [right.cell(w - 1 - j, i).var for j in range(w)])
-    constrain([g.cell(i, w - 1 - j).var for j in range(w)],
-              [bottom.cell(i, w - 1 - j).var for j in range(w)])
-
-for i in range(w):
-    if left_givens[i] != 0:
-        s.add(Sum([left.cell(j, i).var for j in range(w)]) == left_givens[i])
-    if right_givens[i] != 0:
-        s.add(Sum([right.cell(j, i).var for j in range(w)]) == right_givens[i])
-    if top_givens[i] != 0:
-        s.add(Sum([top.cell(i, j).var for j in range(w)]) == top_givens[i])
-    if bottom_givens[i] != 0:
-        s.add(Sum([bottom.cell(i, j).var for j in range(w)]) == bottom_givens[i])
-
-s.check()
-m = s.model()
-
-def cell_draw(ctx):
-    ctx.text(ctx.val, fontsize=24)
-
-def edge_draw(ctx):
-    ctx.draw(width=1)
-
-draw_grid(g, m, 64, cell_draw, edge_draw, edge_draw)
+from latin import SIDES, LatinSquare, grid_line
+from display import renderer
+from puzzlefile import Puzzle
+
+# example = Puzzle('skyscrapers', [5, 5], {
+#     'left': [4, 4, 0, 0, 0],
+#     'top': [0, 0, 2, 1, 0],
+#     'bottom': [2, 0, 1, 0, 0],
+#     'right': [0, 0, 5, 0, 0],
+# })
+
+example = Puzzle('skyscrapers', [5, 5], {
+    'left': [2, 2, 1, 4, 3],
+    'right': [3, 3, 2, 1, 2],
+    'top': [2, 2, 1, 3, 4],
+    'bottom': [3, 2, 3, 1, 2],
+})
+
+
+def visible(cells, holds):
+    """
+    Bools for whether each of a line of buildings (nearest first) can be
+    seen past the ones in front of it: a building of height d is seen if
+    none before it is d or taller. holds(c, d) is the expression for cell c
+    holding d. Whether a building before is d or taller, for each d, is
+    built up as an expression along the line, so this needs no extra
+    variables.
+    """
+    heights = range(1, len(cells) + 1)
+    seen = [BoolVal(True)]
+    blocked = dict((d, cells[0].var >= d) for d in heights)
+    for c in cells[1:]:
+        seen.append(Or([And(holds(c, d), Not(blocked[d]))
+                        for d in heights]))
+        blocked = dict((d, Or(blocked[d], c.var >= d)) for d in heights)
+    return seen
+
+
+def clue_constraints(puzzle, g, latin=None):
+    """
+    Yields the constraint each clue adds, with its position: the side it's
+    on and its index along that side. Along with the count of buildings
+    seen, each clue of k bounds the heights it implies: with k buildings
+    seen, the one i away from the clue can't be taller than n - k + 1 + i.
+
+    If latin, the LatinSquare over g, is given, the buildings seen are
+    counted through its digit Bools; otherwise through the cell values.
+    """
+    n = g.width
+    if latin is not None:
+        holds = latin.holds
+    else:
+        holds = lambda c, d: c.var == d
+    for side in SIDES:
+        for i, k in enumerate(puzzle.givens[side]):
+            if k == 0:
+                continue
+            cells = grid_line(g, side, i)
+            bounds = [c.var <= n - k + 1 + j
+                      for j, c in enumerate(cells[:k - 1])]
+            yield (side, i), And(bounds + [
+                PbEq([(b, 1) for b in visible(cells, holds)], k)])
+
+
+def build_square(puzzle, encoding='channelled'):
+    """
+    The rules without the clues: returns (solver, grid, latin square).
+    """
+    w = len(puzzle.givens['left'])
+    s = Solver()
+    g = Grid(w, w)
+    latin = LatinSquare(s, g, encoding)
+    return s, g, latin
+
+
+def build(puzzle, clues=True, encoding='channelled'):
+    s, g, latin = build_square(puzzle, encoding)
+
+    if clues:
+        for _, constraint in clue_constraints(puzzle, g, latin):
+            s.add(constraint)
+
+    return s, g
+
+def draw(puzzle, g, m, render='window', **kwargs):
+    def cell_draw(ctx):
+        ctx.text(ctx.val, fontsize=24)
+
+    def edge_draw(ctx):
+        ctx.draw(width=1)
+
+    return renderer(render)(g, m, 64, cell_draw, edge_draw, edge_draw,
+                            **kwargs)
+
+if __name__ == '__main__':
+    s, g = build(example)
+    s.check()
+    draw(example, g, s.model())
@@ -1,22 +1,11 @@
 from z3 import *
 
 from grid import Grid
-from display import draw_grid
-from adjacency_manager import solve
+from display import StaticLayer, renderer
+from adjacency_manager import solve as solve_connected
+from puzzlefile import Puzzle, char_number
 
-s = Solver()
-g = Grid(10, 10)
-#g = Grid(6, 6)
-
-for e in g.edges:
-    s.add(e.var >= 0)
-    s.add(e.var <= 1)
-
-for p in g.points:
-    count = Sum([e.var for e in p.edges()])
-    s.add(Or([count == 0, count == 2]))
-
-givens = [
+example = Puzzle('slitherlink', [10, 10], [
     "   12 33  ",
     " 311302  2",
     " 3 1   22 ",
@@ -27,41 +16,82 @@ givens = [
     "2  21  31 ",
     " 3220313  ",
     " 22     1 ",
-]
+])
 
-# givens = [
+# example = Puzzle('slitherlink', [6, 6], [
 #     "    0 ",
 #     "33  1 ",
 #     "  12  ",
 #     "  20  ",
 #     " 1  11",
 #     " 2    ",
-# ]
+# ])
+
 
-for x in range(g.width):
+def clue_constraints(puzzle, g):
+    """
+    Yields the constraint each clue adds, with its (x, y) position.
+    """
+    givens = puzzle.givens
     for y in range(g.height):
-        if givens[y][x] != ' ':
-            s.add(Sum([
-                e.var for e in g.cell(x, y).edges()
-            ]) == ord(givens[y][x]) - ord('0'))
+        for x in range(g.width):
+            if givens[y][x] not in ' ?':
+                yield (x, y), Sum([
+                    e.var for e in g.cell(x, y).edges()
+                ]) == char_number(givens[y][x])
+
+
+def build(puzzle, clues=True):
+    s = Solver()
+    g = Grid(puzzle.width, puzzle.height)
+
+    for e in g.edges:
+        s.add(e.var >= 0)
+        s.add(e.var <= 1)
+
+    for p in g.points:
+        count = Sum([e.var for e in p.edges()])
+        s.add(Or([count == 0, count == 2]))
+
+    if clues:
+        for _, constraint in clue_constraints(puzzle, g):
+            s.add(constraint)
+
+    return s, g
 
 def adjacency_fn(grid, model):
     for point in grid.points:
         yield [edge.var for edge in point.edges()
                if model[edge.var].as_long() == 1]
 
-m = solve(s, g, adjacency_fn)
+def find_model(s, g):
+    return solve_connected(s, g, adjacency_fn)
+
+def solution_vars(g):
+    return [e.var for e in g.edges]
+
+def draw(puzzle, g, m, render='window', **kwargs):
+    givens = puzzle.givens
+
+    def cell_draw(ctx):
+        ctx.fill(0.9, 0.9, 1, 1)
+        given = givens[ctx.gy][ctx.gx]
+        ctx.text(str(given), fontsize=24)
 
-def cell_draw(ctx):
-    ctx.fill(0.9, 0.9, 1, 1)
-    given = givens[ctx.gy][ctx.gx]
-    ctx.text(str(given), fontsize=24)
+    def edge_draw(ctx):
+        if ctx.val == '1':
+            ctx.draw(width=2)
 
-def edge_draw(ctx):
-    if ctx.val == '1':
-        ctx.draw(width=2)
+    def point_draw(ctx):
+        ctx.draw_square(size=5)
 
-def point_draw(ctx):
-    ctx.draw_square(size=5)
+    # The clues and points don't depend on the model, so they're drawn once
+    # per puzzle and cached.
+    static = StaticLayer(('slitherlink',) + tuple(givens), cell_draw, None,
+                         None, point_draw)
+    return renderer(render)(g, m, 64, None, edge_draw, edge_draw,
+                            static=static, **kwargs)
 
-draw_grid(g, m, 64, cell_draw, edge_draw, edge_draw, point_draw)
+if __name__ == '__main__':
+    s, g = build(example)
+    draw(example, g, find_model(s, g))
@@ -26,6 +26,13 @@ class Sprite(object):
         self.y = Function('{}_y'.format(name), IntSort(), IntSort())
         self.dir = Function('{}_dir'.format(name), IntSort(), Dir)
 
+    def trajectory(self, model, start, end):
+        """
+        Evaluate this Sprite's position and direction in model for ticks
+        start (inclusive) to end (exclusive), returning a Trajectory.
+        """
+        return Trajectory(self, model, start, end)
+
     def in_bounds(self, t):
         """
         Constrain this Sprite to be in a valid Grid cell at time t.
@@ -60,3 +67,61 @@ class Sprite(object):
         x and y do not have to be valid Grid coordinates.
         """
         return And(self.x(t) == x, self.y(t) == y)
+
+
+class Trajectory(object):
+    """
+    The position and direction of a Sprite in a model over a range of ticks.
+
+    Each tick is evaluated in the model once, up front, and then read from
+    arrays, rather than evaluating .x(t), .y(t) and .dir(t) every time they
+    are needed. Asking for a tick outside the range evaluates the missing
+    ticks and grows the range to include it.
+    """
+    def __init__(self, sprite, model, start, end):
+        self.sprite = sprite
+        self.model = model
+        self.start = start
+        self.end = start
+        self.xs = []
+        self.ys = []
+        self.dirs = []
+        self.extend(start, end)
+
+    def _eval(self, ticks):
+        model = self.model
+        sprite = self.sprite
+        return ([model.eval(sprite.x(t)).as_long() for t in ticks],
+                [model.eval(sprite.y(t)).as_long() for t in ticks],
+                [str_to_dir[str(model.eval(sprite.dir(t)))] for t in ticks])
+
+    def extend(self, start, end):
+        """
+        Make sure ticks start (inclusive) to end (exclusive) are evaluated.
+        """
+        if start < self.start:
+            xs, ys, dirs = self._eval(range(start, self.start))
+            self.xs[:0] = xs
+            self.ys[:0] = ys
+            self.dirs[:0] = dirs
+            self.start = start
+        if end > self.end:
+            xs, ys, dirs = self._eval(range(self.end, end))
+            self.xs.extend(xs)
+            self.ys.extend(ys)
+            self.dirs.extend(dirs)
+            self.end = end
+
+    def _index(self, t):
+        if not self.start <= t < self.end:
+            self.extend(min(t, self.start), max(t + 1, self.end))
+        return t - self.start
+
+    def x(self, t):
+        return self.xs[self._index(t)]
+
+    def y(self, t):
+        return self.ys[self._index(t)]
+
+    def dir(self, t):
+        return self.dirs[self._index(t)]
@@ -1,9 +1,8 @@
-import cairo
-
-from display import (CellContext, HorizEdgeContext, PointContext,
-                     VertEdgeContext, get_surface, show_surface, transform_x,
-                     transform_y)
-from sprite import south, east, west, str_to_dir
+from display import (BatchedContext, CellContext, HorizEdgeContext,
+                     PointContext, VertEdgeContext, canvas_size,
+                     clear_surface, draw_part, get_surface, show_surface,
+                     transform_x, transform_y, write_png, write_svg)
+from sprite import south, east, west
 
 
 class FramedMixin(object):
@@ -17,62 +16,65 @@ class FramedMixin(object):
 
 
 class FramedCellContext(FramedMixin, CellContext):
-    def __init__(self, surface, cell, model, scale, offset_gx, offset_gy, t):
-        CellContext.__init__(self, surface, cell, model, scale)
+    def __init__(self, ctx, cell, model, scale, offset_gx, offset_gy, t):
+        CellContext.__init__(self, ctx, cell, model, scale)
         self.offset_gx = offset_gx
         self.offset_gy = offset_gy
         self.t = t
 
 
 class FramedHorizEdgeContext(FramedMixin, HorizEdgeContext):
-    def __init__(self, surface, edge, model, scale, offset_gx, offset_gy, t):
-        HorizEdgeContext.__init__(self, surface, edge, model, scale)
+    def __init__(self, ctx, edge, model, scale, offset_gx, offset_gy, t):
+        HorizEdgeContext.__init__(self, ctx, edge, model, scale)
         self.offset_gx = offset_gx
         self.offset_gy = offset_gy
         self.t = t
 
 
 class FramedVertEdgeContext(FramedMixin, VertEdgeContext):
-    def __init__(self, surface, edge, model, scale, offset_gx, offset_gy, t):
-        VertEdgeContext.__init__(self, surface, edge, model, scale)
+    def __init__(self, ctx, edge, model, scale, offset_gx, offset_gy, t):
+        VertEdgeContext.__init__(self, ctx, edge, model, scale)
         self.offset_gx = offset_gx
         self.offset_gy = offset_gy
         self.t = t
 
 
 class FramedPointContext(FramedMixin, PointContext):
-    def __init__(self, surface, point, model, scale, offset_gx, offset_gy, t):
-        PointContext.__init__(self, surface, point, model, scale)
+    def __init__(self, ctx, point, model, scale, offset_gx, offset_gy, t):
+        PointContext.__init__(self, ctx, point, model, scale)
         self.offset_gx = offset_gx
         self.offset_gy = offset_gy
         self.t = t
 
 
 class SpriteContext(object):
-    def __init__(self, surface, sprite, model, scale, offset_gx, offset_gy, t):
-        self.surface = surface
-        self.ctx = cairo.Context(surface)
+    def __init__(self, ctx, sprite, model, scale, offset_gx, offset_gy, t,
+                 trajectory=None):
+        self.ctx = ctx
         self.sprite = sprite
         self.model = model
         self.scale = scale
         self.offset_gx = offset_gx
         self.offset_gy = offset_gy
         self.t = t
+        if trajectory is None:
+            trajectory = sprite.trajectory(model, t, t + 1)
+        self.trajectory = trajectory
 
     def gx(self, t=None):
         if t is None:
             t = self.t
-        return self.model.eval(self.sprite.x(t)).as_long()
+        return self.trajectory.x(t)
 
     def gy(self, t=None):
         if t is None:
             t = self.t
-        return self.model.eval(self.sprite.y(t)).as_long()
+        return self.trajectory.y(t)
 
     def dir(self, t=None):
         if t is None:
             t = self.t
-        return str_to_dir[str(self.model.eval(self.sprite.dir(t)))]
+        return self.trajectory.dir(t)
 
     def x(self, t):
         return transform_x(self.gx(t) + self.offset_gx + 0.5, self.scale)
@@ -81,10 +83,8 @@ class SpriteContext(object):
         return transform_y(self.gy(t) + self.offset_gy + 0.5, self.scale)
 
     def draw_rotated(self, path, t=None, width=1, color=(0, 0, 0, 1)):
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.set_line_width(width)
-        self.ctx.set_line_join(cairo.LINE_JOIN_BEVEL)
+        import cairo
+        ctx = self.ctx.path(color, width=width, join=cairo.LINE_JOIN_BEVEL)
         d = self.dir(t)
         dx = self.gx(t) + self.offset_gx
         dy = self.gy(t) + self.offset_gy
@@ -99,66 +99,194 @@ class SpriteContext(object):
             x += dx
             y += dy
             if first:
-                self.ctx.move_to(transform_x(x, self.scale),
-                                 transform_y(y, self.scale))
+                ctx.move_to(transform_x(x, self.scale),
+                            transform_y(y, self.scale))
                 first = False
             else:
-                self.ctx.line_to(transform_x(x, self.scale),
-                                 transform_y(y, self.scale))
-        self.ctx.stroke()
+                ctx.line_to(transform_x(x, self.scale),
+                            transform_y(y, self.scale))
 
     def path(self, from_t, to_t, width=1, color=(0, 0, 0, 1)):
-        r, g, b, a = color
-        self.ctx.set_source_rgba(b, g, r, a)
-        self.ctx.set_line_width(width)
-        self.ctx.set_line_join(cairo.LINE_JOIN_BEVEL)
-        self.ctx.move_to(self.x(from_t), self.y(from_t))
+        import cairo
+        ctx = self.ctx.path(color, width=width, join=cairo.LINE_JOIN_BEVEL)
+        ctx.move_to(self.x(from_t), self.y(from_t))
         for t in range(from_t + 1, to_t):
-            self.ctx.line_to(self.x(t), self.y(t))
-        self.ctx.stroke()
+            ctx.line_to(self.x(t), self.y(t))
 
 
-def draw_grid_frames_and_sprites(grid, model, scale, frame_rows, sprites,
-                                 cell_fn=None, horiz_fn=None, vert_fn=None,
-                                 point_fn=None, sprite_fn=None):
+def draw_frame(ctx, batch, grid, model, scale, x, y, t, i, sprites,
+               trajectories, cell_fn=None, horiz_fn=None, vert_fn=None,
+               point_fn=None, sprite_fn=None):
+    """
+    Draw frame number i, showing tick t, with its top left corner at grid
+    coordinates (x, y).
+    """
+    if cell_fn:
+        for cell in grid.cells:
+            cell_ctx = FramedCellContext(batch, cell, model, scale, x, y, t)
+            draw_part(ctx, cell_fn, cell_ctx, i)
+    if horiz_fn:
+        for horiz in grid.horizs:
+            horiz_ctx = FramedHorizEdgeContext(batch, horiz, model,
+                                               scale, x, y, t)
+            draw_part(ctx, horiz_fn, horiz_ctx, i)
+    if vert_fn:
+        for vert in grid.verts:
+            vert_ctx = FramedVertEdgeContext(batch, vert, model,
+                                             scale, x, y, t)
+            draw_part(ctx, vert_fn, vert_ctx, i)
+    if point_fn:
+        for point in grid.points:
+            point_ctx = FramedPointContext(batch, point, model,
+                                           scale, x, y, t)
+            draw_part(ctx, point_fn, point_ctx, i)
+    if sprite_fn:
+        for sprite, trajectory in zip(sprites, trajectories):
+            sprite_ctx = SpriteContext(batch, sprite, model, scale,
+                                       x, y, t, trajectory)
+            draw_part(ctx, sprite_fn, sprite_ctx, i)
+
+
+def frames_canvas_size(grid, frame_rows, scale):
     frame_w = max(map(len, frame_rows))
     frame_h = len(frame_rows)
 
     canvas_w = ((grid.width + 1) * frame_w) * scale
     canvas_h = ((grid.height + 1) * frame_h) * scale
+    return canvas_w, canvas_h
+
 
-    surface = get_surface(canvas_w, canvas_h)
+def render_grid_frames_and_sprites(grid, model, scale, frame_rows, sprites,
+                                   cell_fn=None, horiz_fn=None, vert_fn=None,
+                                   point_fn=None, sprite_fn=None,
+                                   surface=None):
+    """
+    Draw one frame of the grid per tick in frame_rows, and return the surface
+    they were drawn on. A new image surface is created unless one is passed
+    in.
+    """
+    import cairo
+    if surface is None:
+        surface = get_surface(*frames_canvas_size(grid, frame_rows, scale))
+    ctx = cairo.Context(surface)
+    batch = BatchedContext(ctx)
+
+    # Evaluate each sprite's trajectory over the ticks shown just once; the
+    # sprite callbacks can look at other ticks too, which extends it.
+    frame_ticks = [t for row in frame_rows for t in row]
+    trajectories = [sprite.trajectory(model, min(frame_ticks),
+                                      max(frame_ticks) + 1)
+                    for sprite in sprites] if sprite_fn else []
 
     i = 0
     for y0, row in enumerate(frame_rows):
         for x0, t in enumerate(row):
-            x = x0 * (grid.width + 1)
-            y = y0 * (grid.height + 1)
-            if cell_fn:
-                for cell in grid.cells:
-                    cell_ctx = FramedCellContext(surface, cell, model, scale,
-                                                 x, y, t)
-                    cell_fn(cell_ctx, i)
-            if horiz_fn:
-                for horiz in grid.horizs:
-                    horiz_ctx = FramedHorizEdgeContext(surface, horiz, model,
-                                                       scale, x, y, t)
-                    horiz_fn(horiz_ctx, i)
-            if vert_fn:
-                for vert in grid.verts:
-                    vert_ctx = FramedVertEdgeContext(surface, vert, model,
-                                                     scale, x, y, t)
-                    vert_fn(vert_ctx, i)
-            if point_fn:
-                for point in grid.points:
-                    point_ctx = FramedPointContext(surface, point, model,
-                                                   scale, x, y, t)
-                    point_fn(point_ctx, i)
-            if sprite_fn:
-                for sprite in sprites:
-                    sprite_ctx = SpriteContext(surface, sprite, model, scale,
-                                               x, y, t)
-                    sprite_fn(sprite_ctx, i)
+            draw_frame(ctx, batch, grid, model, scale,
+                       x0 * (grid.width + 1), y0 * (grid.height + 1), t, i,
+                       sprites, trajectories, cell_fn, horiz_fn, vert_fn,
+                       point_fn, sprite_fn)
             i += 1
+    batch.flush()
+
+    return surface
+
+
+def draw_grid_frames_and_sprites(grid, model, scale, frame_rows, sprites,
+                                 cell_fn=None, horiz_fn=None, vert_fn=None,
+                                 point_fn=None, sprite_fn=None):
+    show_surface(render_grid_frames_and_sprites(
+        grid, model, scale, frame_rows, sprites,
+        cell_fn, horiz_fn, vert_fn, point_fn, sprite_fn))
+
+
+def render_grid_frames_and_sprites_png(grid, model, scale, frame_rows,
+                                       sprites, cell_fn=None, horiz_fn=None,
+                                       vert_fn=None, point_fn=None,
+                                       sprite_fn=None, target=None):
+    """
+    Like draw_grid_frames_and_sprites, but write the result as PNG to target
+    (a filename or file object). Returns the PNG bytes if target is None.
+    """
+    return write_png(render_grid_frames_and_sprites(
+        grid, model, scale, frame_rows, sprites,
+        cell_fn, horiz_fn, vert_fn, point_fn, sprite_fn), target)
+
+
+def render_grid_frames_and_sprites_svg(grid, model, scale, frame_rows,
+                                       sprites, cell_fn=None, horiz_fn=None,
+                                       vert_fn=None, point_fn=None,
+                                       sprite_fn=None, target=None):
+    """
+    Like draw_grid_frames_and_sprites, but write the result as SVG to target
+    (a filename or file object). Returns the SVG bytes if target is None.
+    """
+    canvas_w, canvas_h = frames_canvas_size(grid, frame_rows, scale)
+    return write_svg(canvas_w, canvas_h,
+                     lambda surface: render_grid_frames_and_sprites(
+                         grid, model, scale, frame_rows, sprites,
+                         cell_fn, horiz_fn, vert_fn, point_fn, sprite_fn,
+                         surface),
+                     target)
+
+
+def renderer(render):
+    """
+    Returns draw_grid_frames_and_sprites or its _png or _svg variant, by name
+    ('window', 'png' or 'svg').
+    """
+    return {'window': draw_grid_frames_and_sprites,
+            'png': render_grid_frames_and_sprites_png,
+            'svg': render_grid_frames_and_sprites_svg}[render]
+
+
+def iter_frames(grid, model, scale, ticks, sprites,
+                cell_fn=None, horiz_fn=None, vert_fn=None,
+                point_fn=None, sprite_fn=None):
+    """
+    Render one frame per tick in ticks (which may be any iterable, including
+    a generator), yielding (tick, surface) for each. The callbacks are the
+    same as for draw_grid_frames_and_sprites.
+
+    A single surface is cleared and reused for every frame, so memory use
+    doesn't grow with the number of ticks; write the surface out or copy it
+    before asking for the next frame.
+    """
+    import cairo
+    width, height = canvas_size(grid.width, grid.height, scale)
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    ctx = cairo.Context(surface)
+    batch = BatchedContext(ctx)
+    trajectories = None
+
+    for i, t in enumerate(ticks):
+        if trajectories is None:
+            # These start out covering just the first tick, and are extended
+            # as later ones are drawn.
+            trajectories = [sprite.trajectory(model, t, t + 1)
+                            for sprite in sprites] if sprite_fn else []
+        clear_surface(surface, width, height)
+        draw_frame(ctx, batch, grid, model, scale, 0, 0, t, i,
+                   sprites, trajectories, cell_fn, horiz_fn, vert_fn,
+                   point_fn, sprite_fn)
+        batch.flush()
+        surface.flush()
+        yield t, surface
+
 
-    show_surface(surface)
+def write_frames_png(grid, model, scale, ticks, sprites,
+                     cell_fn=None, horiz_fn=None, vert_fn=None,
+                     point_fn=None, sprite_fn=None,
+                     pattern='frame_{:05d}.png'):
+    """
+    Write one numbered PNG per tick in ticks, formatting pattern with the
+    frame number to get each file name. Frames are rendered and written one
+    at a time, as with iter_frames. Returns the list of file names written.
+    """
+    names = []
+    for i, (t, surface) in enumerate(iter_frames(
+            grid, model, scale, ticks, sprites,
+            cell_fn, horiz_fn, vert_fn, point_fn, sprite_fn)):
+        name = pattern.format(i)
+        surface.write_to_png(name)
+        names.append(name)
+    return names
@@ -1,10 +1,12 @@
 from collections import defaultdict
 
+from dlx import ExactCover
 from grid import Grid
+from puzzlefile import Puzzle
 import z3
 import display
 
-givens = [
+example = Puzzle('starbattle', [10, 10], [
     "aaabbbbccd",
     "aaabccbccd",
     "aaabcccccd",
@@ -15,46 +17,91 @@ givens = [
     "iihhgggggd",
     "ijjhhhhggd",
     "ijjjjhgggg",
-]
+], stars=2)
 
-board = Grid(len(givens[0]), len(givens), "grid", cellgen=z3.Int)
-s = z3.Solver()
 
-for cell in board.cells:
-    s.add(cell.var >= 0)
-    s.add(cell.var <= 1)
+def build(puzzle):
+    givens = puzzle.givens
+    stars = puzzle.params.get('stars', 2)
+    board = Grid(puzzle.width, puzzle.height, "grid", cellgen=z3.Int)
+    s = z3.Solver()
 
-# build regions
-regions = defaultdict(list)
-for y, row in enumerate(givens):
-    for x, cell in enumerate(row):
-        regions[cell].append(board.cell(x, y).var)
+    for cell in board.cells:
+        s.add(cell.var >= 0)
+        s.add(cell.var <= 1)
 
-for region in regions.values():
-    s.add(z3.Sum(region) == 2)
+    # build regions
+    regions = defaultdict(list)
+    for y, row in enumerate(givens):
+        for x, cell in enumerate(row):
+            regions[cell].append(board.cell(x, y).var)
 
-for y in range(board.height):
-    s.add(z3.Sum([board.cell(x, y).var for x in range(board.width)]) == 2)
+    for region in regions.values():
+        s.add(z3.Sum(region) == stars)
 
-for x in range(board.width):
-    s.add(z3.Sum([board.cell(x, y).var for y in range(board.height)]) == 2)
+    for y in range(board.height):
+        s.add(z3.Sum([board.cell(x, y).var for x in range(board.width)]) == stars)
 
-for e in board.edges:
-    s.add(z3.Sum([cell.var for cell in e.cells()]) < 2)
+    for x in range(board.width):
+        s.add(z3.Sum([board.cell(x, y).var for y in range(board.height)]) == stars)
 
-for p in board.points:
-    if p.is_outside: continue
-    s.add(z3.Sum(p.edge_left.cell_above.var, p.edge_right.cell_below.var) < 2)
-    s.add(z3.Sum(p.edge_left.cell_below.var, p.edge_right.cell_above.var) < 2)
+    for e in board.edges:
+        s.add(z3.Sum([cell.var for cell in e.cells()]) < 2)
 
-print(s.check())
-m = s.model()
+    for p in board.points:
+        if p.is_outside: continue
+        s.add(z3.Sum(p.edge_left.cell_above.var, p.edge_right.cell_below.var) < 2)
+        s.add(z3.Sum(p.edge_left.cell_below.var, p.edge_right.cell_above.var) < 2)
 
-def draw_edge(ctx:display.EdgeContext):
-    ctx.draw(width=5 if (ctx.edge.is_outside or len({givens[cell.y][cell.x] for cell in ctx.edge.cells()}) == 2) else 1)
+    return s, board
 
-def draw_cell(ctx:display.CellContext):
-    if ctx.val == "1":
-        ctx.circle(fill=True)
+def exact_cover(puzzle):
+    """
+    Builds the puzzle as a dlx.ExactCover: a row for each cell that could
+    hold a star, covering its row, column and region (each needing `stars`
+    of them) and, at most once each, the 2x2 blocks it's in, so no two stars
+    touch.
+    """
+    givens = puzzle.givens
+    stars = puzzle.params.get('stars', 2)
+    board = Grid(puzzle.width, puzzle.height, "grid", cellgen=z3.Int)
 
-display.draw_grid(board, m, 64, cell_fn=draw_cell, vert_fn=draw_edge, horiz_fn=draw_edge)
+    problem = ExactCover(defaults=dict((cell.var, 0) for cell in board.cells))
+    for y in range(board.height):
+        problem.add_column(('row', y), stars)
+    for x in range(board.width):
+        problem.add_column(('column', x), stars)
+    for region in set(''.join(givens)):
+        problem.add_column(('region', region), stars)
+    for y in range(board.height - 1):
+        for x in range(board.width - 1):
+            problem.add_column(('block', x, y), secondary=True)
+
+    for cell in board.cells:
+        x, y = cell.x, cell.y
+        blocks = [('block', bx, by)
+                  for bx in (x - 1, x) for by in (y - 1, y)
+                  if 0 <= bx < board.width - 1 and 0 <= by < board.height - 1]
+        problem.add_row((x, y), [('row', y), ('column', x),
+                                 ('region', givens[y][x])] + blocks,
+                        {cell.var: 1})
+    return problem, board
+
+def draw(puzzle, board, m, render='window', **kwargs):
+    givens = puzzle.givens
+
+    def draw_edge(ctx:display.EdgeContext):
+        ctx.draw(width=5 if (ctx.edge.is_outside or len({givens[cell.y][cell.x] for cell in ctx.edge.cells()}) == 2) else 1)
+
+    def draw_cell(ctx:display.CellContext):
+        if ctx.val == "1":
+            ctx.circle(fill=True)
+
+    return display.renderer(render)(board, m, 64, cell_fn=draw_cell,
+                                    vert_fn=draw_edge, horiz_fn=draw_edge,
+                                    **kwargs)
+
+if __name__ == '__main__':
+    s, board = build(example)
+    print(s.check())
+    draw(example, board, s.model())
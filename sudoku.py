@@ -1,55 +1,232 @@
 from z3 import *
 
 from grid import Grid
-from display import draw_grid
+from latin import LatinSquare
+from display import renderer
+from dlx import ExactCover
+from puzzlefile import Puzzle, char_number
 
-g = Grid(9, 9)
+example = Puzzle('sudoku', [9, 9], [
+    "53       ",
+    "     5   ",
+    " 98    6 ",
 
-s = Solver()
+    "8   6   3",
+    "4  8    1",
+    "    2   6",
 
-for i in range(9):
-    s.add(Distinct([g.cell(i, j).var for j in range(9)]))
-    s.add(Distinct([g.cell(j, i).var for j in range(9)]))
+    " 6    28 ",
+    "   419   ",
+    "       7 ",
+])
 
-for i in range(3):
-    for j in range(3):
-        s.add(Distinct([g.cell(3*i+di, 3*j+dj).var
-                        for di in range(3) for dj in range(3)]))
 
-for cell in g.cells:
-    s.add(cell.var >= 1)
-    s.add(cell.var <= 9)
+def box_size(n):
+    """The side of the boxes of an n x n sudoku."""
+    box = int(round(n ** 0.5))
+    if box * box != n:
+        raise ValueError('a sudoku must be a square of a square, not '
+                         '{0}x{0}'.format(n))
+    return box
 
-l = [[5,3,0, 0,0,0, 0,0,0],
-     [0,0,0, 0,0,5, 0,0,0],
-     [0,9,8, 0,0,0, 0,6,0],
 
-     [8,0,0, 0,6,0, 0,0,3],
-     [4,0,0, 8,0,0, 0,0,1],
-     [0,0,0, 0,2,0, 0,0,6],
+def clue_constraints(puzzle, g):
+    """
+    Yields the constraint each given number adds, with its (x, y) position.
+    """
+    givens = puzzle.givens
+    for y in range(g.height):
+        for x in range(g.width):
+            if givens[y][x] not in ' ?':
+                yield (x, y), g.cell(x, y).var == char_number(givens[y][x])
 
-     [0,6,0, 0,0,0, 2,8,0],
-     [0,0,0, 4,1,9, 0,0,0],
-     [0,0,0, 0,0,0, 0,7,0],
-    ]
 
-for y in range(9):
-    for x in range(9):
-        if l[y][x] != 0:
-            s.add(g.cell(x, y).var == l[y][x])
+_peers = {}
 
-s.check()
-m = s.model()
 
-def cell_draw(ctx):
-    ctx.fill(0.9, 0.9, 1, 1)
-    bold = l[ctx.gy][ctx.gx] != 0
-    ctx.text(ctx.val, fontsize=24, bold=bold)
+def peers(n):
+    """
+    The units (rows, columns and boxes) of an n x n sudoku, and the peers of
+    each cell (the other cells sharing a unit with it), as lists of cell
+    indexes y*n + x. Cached per size.
+    """
+    if n not in _peers:
+        box = box_size(n)
+        units = ([[y*n + x for x in range(n)] for y in range(n)] +
+                 [[y*n + x for y in range(n)] for x in range(n)] +
+                 [[(box*i + di)*n + box*j + dj
+                   for di in range(box) for dj in range(box)]
+                  for i in range(box) for j in range(box)])
+        cell_peers = [set() for _ in range(n * n)]
+        for unit in units:
+            for i in unit:
+                cell_peers[i].update(unit)
+        for i, p in enumerate(cell_peers):
+            p.discard(i)
+        _peers[n] = units, [sorted(p) for p in cell_peers]
+    return _peers[n]
 
-def horiz_edge_draw(ctx):
-    ctx.draw(width=5 if (ctx.gy % 3 == 0) else 1)
 
-def vert_edge_draw(ctx):
-    ctx.draw(width=5 if (ctx.gx % 3 == 0) else 1)
+def propagate(puzzle):
+    """
+    Works out what the givens force, with naked singles (a cell with one
+    digit left) and hidden singles (a digit with one place left in a unit),
+    keeping the digits each cell could still hold as a bitmask (bit d-1 for
+    digit d). Returns the list of masks, indexed by y*n + x, or None if the
+    givens contradict each other.
+    """
+    n = puzzle.width
+    units, cell_peers = peers(n)
+    full = (1 << n) - 1
+    masks = [full] * (n * n)
+    fixed = []
+    for y, row in enumerate(puzzle.givens):
+        for x, c in enumerate(row):
+            if c not in ' ?':
+                fixed.append((y*n + x, 1 << (char_number(c) - 1)))
 
-draw_grid(g, m, 64, cell_draw, horiz_edge_draw, vert_edge_draw)
+    while fixed:
+        # Naked singles: take each fixed digit out of the cell's peers.
+        while fixed:
+            i, bit = fixed.pop()
+            if not masks[i] & bit:
+                return None
+            masks[i] = bit
+            for j in cell_peers[i]:
+                if masks[j] & bit:
+                    masks[j] &= ~bit
+                    if not masks[j]:
+                        return None
+                    if masks[j] & (masks[j] - 1) == 0:
+                        fixed.append((j, masks[j]))
+
+        # Hidden singles: the digits that fit in just one cell of a unit.
+        for unit in units:
+            once = twice = 0
+            for i in unit:
+                twice |= once & masks[i]
+                once |= masks[i]
+            if once != full:
+                return None
+            singles = once & ~twice
+            if singles:
+                for i in unit:
+                    bit = masks[i] & singles
+                    if bit and masks[i] != bit:
+                        fixed.append((i, bit))
+        if fixed:
+            # Start again from the naked singles.
+            continue
+    return masks
+
+
+def mask_digits(mask):
+    return [d + 1 for d in range(mask.bit_length()) if mask >> d & 1]
+
+
+# Ways to encode the rules, by name: the latin.LatinSquare encoding, and
+# how to make the cell variables (see bench.py sudoku_nxn)
+ENCODINGS = {
+    'bitvec': ('distinct', lambda n: lambda name: BitVec(
+        name, n.bit_length())),
+    'channelled': ('channelled', lambda n: Int),
+    'int': ('distinct', lambda n: Int),
+    'onehot': ('permutation', lambda n: Int),
+}
+
+
+def boxes(g):
+    """The cells of each box of g."""
+    box = box_size(g.width)
+    return [[g.cell(box*i + di, box*j + dj)
+             for di in range(box) for dj in range(box)]
+            for i in range(box) for j in range(box)]
+
+
+def build(puzzle, clues=True, presolve=True, encoding='onehot'):
+    """
+    Builds the solver for an n x n puzzle, with the rules encoded as named
+    in ENCODINGS. Unless presolve is False or the givens are left out
+    (clues=False), the givens are propagated first, and the rules only
+    cover the cells left open. If propagation solves the puzzle, the solver
+    just gets the digits it found (and s.presolved is set): singles only
+    fix digits the givens force, so that is the only solution, and z3 has
+    nothing to search.
+    """
+    n = puzzle.width
+    box_size(n)
+    latin_encoding, cellgen = ENCODINGS[encoding]
+    g = Grid(n, n, cellgen=cellgen(n))
+    s = Solver()
+
+    presolve = presolve and clues
+    masks = propagate(puzzle) if presolve else [(1 << n) - 1] * (n * n)
+    if masks is None:
+        s.add(BoolVal(False))
+        return s, g
+    cells = [g.cell(i % n, i // n) for i in range(n * n)]
+    if presolve and all(mask & (mask - 1) == 0 for mask in masks):
+        s.add(And([c.var == mask.bit_length()
+                   for c, mask in zip(cells, masks)]))
+        s.presolved = True
+        return s, g
+
+    latin = LatinSquare(s, g, latin_encoding, dict(
+        ((c.x, c.y), mask_digits(mask)) for c, mask in zip(cells, masks)))
+    for box_cells in boxes(g):
+        latin.add_unit(box_cells)
+
+    if clues and not presolve:
+        for _, constraint in clue_constraints(puzzle, g):
+            s.add(constraint)
+
+    return s, g
+
+
+def exact_cover(puzzle):
+    """
+    Builds the puzzle as a dlx.ExactCover: a row for each digit that could
+    go in each cell, covering the cell and the digit in its row, column and
+    box. A given cell gets just the row for its digit.
+    """
+    givens = puzzle.givens
+    n = puzzle.width
+    box = box_size(n)
+    g = Grid(n, n)
+
+    problem = ExactCover()
+    for c in g.cells:
+        given = givens[c.y][c.x]
+        digits = (range(1, n + 1) if given in ' ?'
+                  else [char_number(given)])
+        b = (c.y // box) * box + c.x // box
+        for d in digits:
+            problem.add_row((c.x, c.y, d),
+                            [('cell', c.x, c.y), ('row', c.y, d),
+                             ('column', c.x, d), ('box', b, d)],
+                            {c.var: d})
+    return problem, g
+
+
+def draw(puzzle, g, m, render='window', **kwargs):
+    givens = puzzle.givens
+    box = box_size(puzzle.width)
+
+    def cell_draw(ctx):
+        ctx.fill(0.9, 0.9, 1, 1)
+        bold = givens[ctx.gy][ctx.gx] not in ' ?'
+        ctx.text(ctx.val, fontsize=24, bold=bold)
+
+    def horiz_edge_draw(ctx):
+        ctx.draw(width=5 if (ctx.gy % box == 0) else 1)
+
+    def vert_edge_draw(ctx):
+        ctx.draw(width=5 if (ctx.gx % box == 0) else 1)
+
+    return renderer(render)(g, m, 64, cell_draw, horiz_edge_draw,
+                            vert_edge_draw, **kwargs)
+
+if __name__ == '__main__':
+    s, g = build(example)
+    s.check()
+    draw(example, g, s.model())
@@ -1,8 +1,11 @@
+import itertools
+
 from z3 import *
 
-from display import draw_grid
+from display import renderer
 from grid import Grid
 from invalidobj import Invalid
+from puzzlefile import Puzzle
 
 
 def get_surrounding_cells(cell):
@@ -43,60 +46,146 @@ def do_groups_match_clues(groups, clues):
     return True
 
 
+def bit_groups(bits, num_bits):
+    """
+    Returns the sizes of the groups of consecutive set bits in bits, read as
+    a ring of num_bits bits, in no particular order.
+    """
+    bound = 1 << num_bits
+    high_bit = bound >> 1
+    mask = bound - 1
+    groups = []
+    if bits == mask:
+        groups.append(num_bits)
+    elif bits != 0:
+        # Rotate the bits until the high bit is clear so we don't have to
+        # worry about bit groups wrapping around (we are guaranteed that at
+        # least one bit is clear because we just handled the bits == mask
+        # case)
+        while bits & high_bit != 0:
+            bits = (bits << 1) & mask | 1
+
+        count = 0
+        while bits > 0:
+            if bits & 1 == 1:
+                count += 1
+            else:
+                if count > 0:
+                    groups.append(count)
+                count = 0
+            bits >>= 1
+        if count > 0:
+            groups.append(count)
+    return groups
+
+
 def iterate_bitmasks_for_clues(clues, num_bits):
     """
     Returns an iterator yielding the subset of integers in [0, 2^num_bits)
     which, when interpreted as a bitmask, would be valid as the fill state of
     cells surrounding a cell with the given clues.
     """
-    bound = 1 << num_bits
-    high_bit = bound >> 1
-    mask = bound - 1
-    for bits in range(bound):
-        orig_bits = bits
-        groups = []
-        if bits == mask:
-            groups.append(num_bits)
-        elif bits != 0:
-            # Rotate the bits until the high bit is clear so we don't have to
-            # worry about bit groups wrapping around (we are guaranteed that at
-            # least one bit is clear because we just handled the bits == mask
-            # case)
-            while bits & high_bit != 0:
-                bits = (bits << 1) & mask | 1
-
-            count = 0
-            while bits > 0:
-                if bits & 1 == 1:
-                    count += 1
-                else:
-                    if count > 0:
-                        groups.append(count)
-                    count = 0
-                bits >>= 1
-            if count > 0:
-                groups.append(count)
-        if do_groups_match_clues(groups, clues):
-            yield orig_bits
+    if list(clues) == ['0']:
+        # No filled neighbors at all: no groups, rather than a group of 0.
+        clues = []
+    for bits in range(1 << num_bits):
+        if do_groups_match_clues(bit_groups(bits, num_bits), clues):
+            yield bits
 
 
-def solve_tapa(puzzle):
-    lines = [
+def clue_mask_table(num_bits):
+    """
+    Returns a dict mapping every clue a cell with num_bits neighbors can
+    have (as a sorted tuple of clue characters, with any of them '?') to the
+    tuple of neighbor bitmasks valid for it.
+    """
+    table = {}
+    for bits in range(1 << num_bits):
+        groups = [str(n) for n in bit_groups(bits, num_bits)]
+        if not groups:
+            table[('0',)] = set([bits])
+            continue
+        # Every way of writing this clue, with any of its numbers hidden
+        for hidden in itertools.product((False, True), repeat=len(groups)):
+            clues = tuple(sorted('?' if h else n
+                                 for h, n in zip(hidden, groups)))
+            table.setdefault(clues, set()).add(bits)
+    return dict((clues, tuple(sorted(masks)))
+                for clues, masks in table.items())
+
+
+# The valid neighbor bitmasks of every clue, computed once
+CLUE_MASKS = clue_mask_table(8)
+
+
+def parse_clues(givens):
+    """
+    Splits the rows of a tapa puzzle into lists of clue characters per cell.
+    """
+    return [
         [
             [
                 char for char in cell if char != ' '
             ] for cell in line.split('|')
-        ] for line in puzzle.strip().split('\n') if line != ''
+        ] for line in givens if line.strip() != ''
     ]
 
+
+def neighbor_bits(surrounding_cells):
+    """
+    Returns an 8-bit BitVec of which of the given cells are filled, with bit
+    i for surrounding_cells[i]. Cells off the board are never filled.
+    """
+    return Concat([
+        BitVecVal(0, 1) if isinstance(c, Invalid) else
+        If(c.var >= 0, BitVecVal(1, 1), BitVecVal(0, 1))
+        for c in reversed(surrounding_cells)
+    ])
+
+
+# Ways to constrain a clued cell's surroundings:
+#   'bitvec': the neighbors' fill states as one BitVec, equal to one of the
+#             clue's valid masks
+#   'expanded': one conjunction of eight fill states per valid mask
+ENCODINGS = ('bitvec', 'expanded')
+
+
+def clue_constraint(cell, clues, encoding='bitvec'):
+    """
+    Returns the constraint that the surroundings of cell match its clues.
+    """
+    surrounding_cells = get_surrounding_cells(cell)
+    clues = tuple(sorted(clues))
+    # Masks that would fill a cell off the board can't happen.
+    border = sum(1 << i for i, c in enumerate(surrounding_cells)
+                 if isinstance(c, Invalid))
+    masks = [bits for bits in CLUE_MASKS.get(clues, ())
+             if bits & border == 0]
+    if encoding == 'bitvec':
+        bits_var = neighbor_bits(surrounding_cells)
+        return Or([bits_var == bits for bits in masks])
+    if encoding == 'expanded':
+        return Or([
+            And([
+                neighbor_is_filled(cell2) == (bits & (1 << i) != 0)
+                for i, cell2 in enumerate(surrounding_cells)
+            ]) for bits in masks
+        ])
+    raise ValueError('unknown tapa encoding: {}'.format(encoding))
+
+
+def neighbor_is_filled(c):
+    return not isinstance(c, Invalid) and c.var >= 0
+
+
+def build(puzzle, encoding='bitvec'):
+    lines = parse_clues(puzzle.givens)
+
     # Each cell in this grid will have an integer variable which is >= 0 if the
     # cell is filled and < 0 otherwise. (The specific values within those
     # ranges are only relevant for the one-contiguous-region constraints.)
     g = Grid(len(lines[0]), len(lines))
 
-    def neighbor_is_filled(c):
-        return not isinstance(c, Invalid) and c.var >= 0
-
     s = Solver()
 
     for cell in g.cells:
@@ -107,14 +196,7 @@ def solve_tapa(puzzle):
 
             if clues != ['*']:
                 # Constrain the surroundings of a cell by its clues
-                surrounding_cells = get_surrounding_cells(cell)
-                num_bits = len(surrounding_cells)
-                s.add(Or([
-                    And([
-                        neighbor_is_filled(cell2) == (bits & (1 << i) != 0)
-                        for i, cell2 in enumerate(surrounding_cells)
-                    ]) for bits in iterate_bitmasks_for_clues(clues, num_bits)
-                ]))
+                s.add(clue_constraint(cell, clues, encoding))
         else:
             # Filled cells must form one contiguous region (part 1)
             s.add(Or(cell.var <= 0, *(
@@ -133,8 +215,17 @@ def solve_tapa(puzzle):
                 g.cell(x,     y + 1).var >= 0,
                 g.cell(x + 1, y + 1).var >= 0)))
 
-    s.check()
-    m = s.model()
+    return s, g
+
+
+def solution_vars(g):
+    # Only whether each cell is filled matters; the values themselves are
+    # just there to prove the filled cells are connected.
+    return [c.var >= 0 for c in g.cells]
+
+
+def draw(puzzle, g, m, render='window', **kwargs):
+    lines = parse_clues(puzzle.givens)
 
     def cell_draw(ctx):
         if int(ctx.val) >= 0:
@@ -145,7 +236,19 @@ def solve_tapa(puzzle):
     def edge_draw(ctx):
         ctx.draw(1)
 
-    draw_grid(g, m, 48, cell_draw, edge_draw, edge_draw)
+    return renderer(render)(g, m, 48, cell_draw, edge_draw, edge_draw,
+                            **kwargs)
+
+
+def solve_tapa(puzzle):
+    """
+    Solve and show a tapa puzzle given as a string of '|'-separated rows.
+    """
+    puzzle = Puzzle('tapa', [0, 0], puzzle.strip().split('\n'))
+    s, g = build(puzzle)
+    puzzle.size = [g.width, g.height]
+    s.check()
+    draw(puzzle, g, s.model())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,82 @@
+import contextlib
+import io
+
+import pytest
+from z3 import Int, IntVal, Sum, is_or
+
+import cave
+import slitherlink
+from adjacency_manager import AdjacencyManager, solve, solve_grid
+from unionfind import UnionFind
+
+
+def test_largest():
+    am = AdjacencyManager()
+    assert am.largest() == []
+    am.add_all([[1, 2], [3, 4], [4, 5]])
+    assert sorted(am.largest()) == [3, 4, 5]
+    am.add([2, 6, 7, 8])
+    assert sorted(am.largest()) == [1, 2, 6, 7, 8]
+    am.add([5, 1])
+    assert sorted(am.largest()) == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_union_find_largest_matches_classes():
+    uf = UnionFind()
+    for a, b in [(0, 1), (2, 3), (3, 4), (5, 6), (6, 7), (7, 8), (1, 2)]:
+        uf.union(a, b)
+        assert len(uf.largest()) == max(len(c) for c in uf.classes())
+
+
+def test_boundary_needs_neighbors():
+    am = AdjacencyManager()
+    am.add([1, 2])
+    with pytest.raises(ValueError):
+        am.boundary([1, 2])
+
+
+def test_constraints_only_cover_component_and_boundary():
+    # A row of 100 variables with two components; each ban mentions only
+    # its component, its boundary and the count.
+    xs = [Int('x{}'.format(i)) for i in range(100)]
+    index = dict((x, i) for i, x in enumerate(xs))
+
+    def neighbors(x):
+        i = index[x]
+        return [xs[j] for j in (i - 1, i + 1) if 0 <= j < len(xs)]
+
+    model = dict((x, IntVal(0)) for x in xs)
+    model.update((xs[i], IntVal(1)) for i in (10, 11, 50))
+
+    am = AdjacencyManager(neighbors)
+    am.add([xs[10], xs[11]])
+    am.add([xs[50]])
+    count = Sum(xs)
+    for clause, cls in zip(am.constraints(model, count),
+                           am.classes()):
+        assert is_or(clause)
+        assert clause.num_args() == len(cls) + len(am.boundary(cls)) + 1
+
+
+def quietly(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def test_solve_slitherlink():
+    s, g = slitherlink.build(slitherlink.example)
+    m = quietly(solve, s, g, slitherlink.adjacency_fn)
+    am = AdjacencyManager()
+    am.add_all(slitherlink.adjacency_fn(g, m))
+    assert am.count() == 1
+
+
+def test_solve_grid_cave():
+    s, g = cave.build(cave.example)
+    m = quietly(solve_grid, s, g)
+    filled = [c for c in g.cells if m[c.var].as_long() == 1]
+    am = AdjacencyManager()
+    for c in filled:
+        am.add([c.var] + [n.var for n in c.neighbors()
+                          if m[n.var].as_long() == 1])
+    assert am.count() == 1
@@ -0,0 +1,38 @@
+import pytest
+from z3 import sat, unsat
+
+import galaxies
+from puzzlefile import Puzzle
+
+
+def solution(puzzle, encoding):
+    s, board = galaxies.build(puzzle, encoding)
+    if s.check() != sat:
+        return None
+    m = s.model()
+    return [m.eval(v, model_completion=True).sexpr()
+            for v in galaxies.solution_vars(board)]
+
+
+def test_encodings_agree_on_example():
+    assert (solution(galaxies.example, 'bool') ==
+            solution(galaxies.example, 'function'))
+
+
+@pytest.mark.parametrize('encoding', sorted(galaxies.ENCODINGS))
+@pytest.mark.parametrize('givens', [
+    # The right-hand cell can't be in the only galaxy: its mirror image
+    # would be off the board.
+    ["+-+-+",
+     "|*| |",
+     "+-+-+"],
+    # The middle cell touches both stars.
+    ["+-+-+-+",
+     "| * * |",
+     "+-+-+-+"],
+])
+def test_no_solution(encoding, givens):
+    puzzle = Puzzle('galaxies', [(len(givens[0]) - 1) // 2,
+                                 (len(givens) - 1) // 2], givens)
+    s, board = galaxies.build(puzzle, encoding)
+    assert s.check() == unsat
@@ -0,0 +1,34 @@
+import pytest
+from z3 import Solver, sat, unsat
+
+import latin
+from grid import Grid
+
+
+@pytest.mark.parametrize('encoding', latin.ENCODINGS)
+def test_fills_square(encoding):
+    s = Solver()
+    g = Grid(4, 4)
+    latin.LatinSquare(s, g, encoding)
+    assert s.check() == sat
+    m = s.model()
+    for i in range(4):
+        for line in (g.cell(i, y) for y in range(4)), (g.cell(x, i)
+                                                        for x in range(4)):
+            assert sorted(m[c.var].as_long() for c in line) == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize('encoding', latin.ENCODINGS)
+def test_no_room_for_a_digit(encoding):
+    # Nothing in the top row can hold a 3.
+    domains = dict(((x, 0), [1, 2]) for x in range(3))
+    s = Solver()
+    latin.LatinSquare(s, Grid(3, 3), encoding, domains)
+    assert s.check() == unsat
+
+
+@pytest.mark.parametrize('encoding', latin.ENCODINGS)
+def test_empty_domain(encoding):
+    s = Solver()
+    latin.LatinSquare(s, Grid(3, 3), encoding, {(1, 1): []})
+    assert s.check() == unsat
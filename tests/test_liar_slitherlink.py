@@ -0,0 +1,23 @@
+import pytest
+from z3 import sat, unsat
+
+import liar_slitherlink
+from puzzlefile import Puzzle
+
+
+@pytest.mark.parametrize('encoding', sorted(liar_slitherlink.ENCODINGS))
+def test_example(encoding):
+    s, g = liar_slitherlink.build(liar_slitherlink.example, encoding)
+    assert s.check() == sat
+
+
+@pytest.mark.parametrize('encoding', sorted(liar_slitherlink.ENCODINGS))
+def test_clue_free_line(encoding):
+    # The middle row has no clues, so it can't have exactly one lie.
+    puzzle = Puzzle('liar_slitherlink', [3, 3], [
+        "3 1",
+        "   ",
+        "1 3",
+    ])
+    s, g = liar_slitherlink.build(puzzle, encoding)
+    assert s.check() == unsat
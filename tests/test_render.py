@@ -0,0 +1,204 @@
+import io
+from collections import OrderedDict
+
+import pytest
+
+import display
+import hex_display
+import quebecats
+import sprite_display
+from bench import (hex_cell_draw, hex_edge_draw, hex_loop_grid,
+                   loop_background_draw, loop_cell_draw, loop_edge_draw,
+                   loop_grid, loop_point_draw)
+from sprite import Trajectory, str_to_dir
+
+
+class StateContext(object):
+    '''
+    Stands in for a cairo context, keeping just the line width and a
+    save/restore stack of it.
+    '''
+    def __init__(self):
+        self.width = 2
+        self.saved = []
+
+    def save(self):
+        self.saved.append(self.width)
+
+    def restore(self):
+        self.width = self.saved.pop()
+
+    def set_line_width(self, width):
+        self.width = width
+
+    def get_line_width(self):
+        return self.width
+
+
+class UnbatchedContext(display.BatchedContext):
+    '''
+    A BatchedContext that never merges anything: each path is drawn before
+    the next one starts, as it was before batching.
+    '''
+    def path(self, *args, **kwargs):
+        self.flush()
+        return super(UnbatchedContext, self).path(*args, **kwargs)
+
+
+def unbatched(monkeypatch, render_fn):
+    with monkeypatch.context() as m:
+        for module in (display, hex_display, sprite_display):
+            m.setattr(module, 'BatchedContext', UnbatchedContext)
+        return render_fn()
+
+
+def assert_same_image(png, expected_png):
+    '''
+    Compare two PNGs pixel by pixel, allowing for antialiasing differences
+    where merged strokes overlap.
+    '''
+    import cairo
+    a = cairo.ImageSurface.create_from_png(io.BytesIO(png))
+    b = cairo.ImageSurface.create_from_png(io.BytesIO(expected_png))
+    assert (a.get_width(), a.get_height()) == (b.get_width(), b.get_height())
+    diffs = [abs(x - y) for x, y in zip(bytes(a.get_data()),
+                                        bytes(b.get_data()))]
+    assert sum(diffs) / len(diffs) < 0.5
+    assert sum(1 for d in diffs if d > 64) < len(diffs) / 100
+
+
+def leaky_part(widths):
+    def draw(part):
+        widths.append(part.ctx.get_line_width())
+        part.ctx.set_line_width(7)
+    return draw
+
+
+def test_parts_do_not_leak_state():
+    grid, model = loop_grid(3)
+    ctx = StateContext()
+    widths = []
+    fn = leaky_part(widths)
+    display.draw_parts(ctx, grid, model, 16, fn, fn, fn, fn)
+    assert widths == [2] * (len(grid.cells) + len(grid.edges) +
+                            len(grid.points))
+    assert ctx.width == 2 and ctx.saved == []
+
+
+def test_hex_parts_do_not_leak_state():
+    grid, model = hex_loop_grid(3)
+    ctx = StateContext()
+    widths = []
+    fn = leaky_part(widths)
+    hex_display.draw_parts(ctx, grid, model, 16, fn, fn, fn)
+    assert widths == [2] * (len(grid.cells) + len(grid.edges) +
+                            len(grid.points))
+    assert ctx.width == 2 and ctx.saved == []
+
+
+def test_cached_layer_is_bounded():
+    cache = OrderedDict()
+    rendered = []
+
+    def render(key):
+        rendered.append(key)
+        return key
+
+    for key in [1, 2, 2, 3, 1]:
+        assert display.cached_layer(key, lambda: render(key), cache, 2) == key
+        assert len(cache) <= 2
+    assert rendered == [1, 2, 3, 1]
+
+
+def test_streamed_tiles_stay_out_of_static_cache(monkeypatch):
+    pytest.importorskip('cairo')
+    grid, model = loop_grid(60)
+    static = display.StaticLayer('streamed', loop_background_draw, None,
+                                 None, loop_point_draw)
+    strip_height = 32
+    canvas_w, canvas_h = display.canvas_size(grid.width, grid.height, 16)
+
+    sizes = []
+    get_surface = display.get_surface
+
+    def recording_get_surface(width, height):
+        sizes.append((width, height))
+        return get_surface(width, height)
+
+    monkeypatch.setattr(display, 'get_surface', recording_get_surface)
+    display._static_layers.clear()
+    display._static_tiles.clear()
+    png = display.render_grid_png_streamed(
+        grid, model, 16, None, loop_edge_draw, loop_edge_draw, None,
+        strip_height=strip_height, static=static)
+
+    assert png.startswith(b'\x89PNG')
+    assert len(display._static_tiles) <= 1
+    assert not any(key[0] == 'tile' for key in display._static_layers)
+    # Every surface made is a strip, or its static part; never the canvas.
+    assert len(sizes) >= canvas_h // strip_height
+    assert all(w * h <= canvas_w * strip_height for w, h in sizes)
+
+
+def test_shared_context_renders_like_separate_parts(monkeypatch):
+    pytest.importorskip('cairo')
+    grid, model = loop_grid(25)
+
+    def render():
+        return display.render_grid_png(grid, model, 16, loop_cell_draw,
+                                       loop_edge_draw, loop_edge_draw,
+                                       loop_point_draw)
+
+    assert_same_image(render(), unbatched(monkeypatch, render))
+
+
+def test_batched_hex_render_matches_unbatched(monkeypatch):
+    pytest.importorskip('cairo')
+    grid, model = hex_loop_grid(8)
+
+    def render():
+        return hex_display.render_grid_png(grid, model, 16, hex_cell_draw,
+                                           hex_edge_draw)
+
+    assert_same_image(render(), unbatched(monkeypatch, render))
+
+
+@pytest.fixture(scope='module')
+def quebecats_sheet():
+    '''The arguments quebecats.solve_board draws board 4's solution with.'''
+    calls = []
+    quebecats.solve_board(quebecats.boards[4],
+                          display=lambda *args: calls.append(args))
+    return calls[0]
+
+
+def test_trajectory_matches_model(quebecats_sheet):
+    model, sprites = quebecats_sheet[1], quebecats_sheet[4]
+    laser = sprites[0]
+    trajectory = Trajectory(laser, model, 5, 10)
+    # Ticks on either side of the range are evaluated when asked for.
+    for t in [7, 2, 15, 0, 9]:
+        assert trajectory.x(t) == model.eval(laser.x(t)).as_long()
+        assert trajectory.y(t) == model.eval(laser.y(t)).as_long()
+        assert trajectory.dir(t) == str_to_dir[str(model.eval(laser.dir(t)))]
+    assert (trajectory.start, trajectory.end) == (0, 16)
+
+
+class PerTickSpriteContext(sprite_display.SpriteContext):
+    '''A SpriteContext that evaluates its sprite anew, as it used to.'''
+    def __init__(self, *args):
+        super(PerTickSpriteContext, self).__init__(*args[:7])
+
+
+def test_precomputed_trajectories_render_the_same(monkeypatch,
+                                                  quebecats_sheet):
+    pytest.importorskip('cairo')
+
+    def render():
+        return sprite_display.render_grid_frames_and_sprites_png(
+            *quebecats_sheet)
+
+    with monkeypatch.context() as m:
+        m.setattr(sprite_display, 'SpriteContext', PerTickSpriteContext)
+        expected = unbatched(m, render)
+    assert_same_image(render(), expected)
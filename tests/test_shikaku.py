@@ -0,0 +1,30 @@
+import pytest
+from z3 import sat, unsat
+
+import shikaku
+from puzzlefile import Puzzle
+
+
+@pytest.mark.parametrize('encoding', sorted(shikaku.ENCODINGS))
+def test_example(encoding):
+    s, g = shikaku.build(shikaku.example, encoding)
+    assert s.check() == sat
+
+
+@pytest.mark.parametrize('encoding', sorted(shikaku.ENCODINGS))
+@pytest.mark.parametrize('givens', [
+    # No rectangle of 3 fits in a 2x2 board.
+    ["3 ", "  "],
+    # The two clues' only rectangles overlap in the middle cell.
+    ["2 2"],
+])
+def test_no_solution(encoding, givens):
+    puzzle = Puzzle('shikaku', [len(givens[0]), len(givens)], givens)
+    s, g = shikaku.build(puzzle, encoding)
+    assert s.check() == unsat
+
+
+def test_no_solution_exact_cover():
+    puzzle = Puzzle('shikaku', [3, 1], ["2 2"])
+    problem, g = shikaku.exact_cover(puzzle)
+    assert problem.count() == (0, True)
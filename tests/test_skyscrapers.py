@@ -0,0 +1,38 @@
+import pytest
+from z3 import sat
+
+import generate
+import skyscrapers
+
+
+def heights(m, g):
+    return [[m[g.cell(x, y).var].as_long() for x in range(g.width)]
+            for y in range(g.height)]
+
+
+@pytest.mark.parametrize('encoding', ['distinct', 'channelled', 'permutation'])
+def test_example(encoding):
+    s, g = skyscrapers.build(skyscrapers.example, encoding=encoding)
+    assert s.check() == sat
+    rows = heights(s.model(), g)
+    for y, row in enumerate(rows):
+        assert sorted(row) == list(range(1, 6))
+
+
+def test_clues_without_latin_square():
+    # The clues give the same solution whether they're counted through the
+    # latin square's Bools or the cell values (as generate.minimize does).
+    solutions = []
+    for use_latin in (True, False):
+        s, g, latin = skyscrapers.build_square(skyscrapers.example)
+        for _, constraint in skyscrapers.clue_constraints(
+                skyscrapers.example, g, latin if use_latin else None):
+            s.add(constraint)
+        assert s.check() == sat
+        solutions.append(heights(s.model(), g))
+    assert solutions[0] == solutions[1]
+
+
+def test_minimize():
+    import random
+    assert generate.minimize(skyscrapers.example, random.Random(0)) is not None
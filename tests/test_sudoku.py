@@ -0,0 +1,71 @@
+import pytest
+from z3 import Or, sat, unsat
+
+import generate
+import sudoku
+from puzzlefile import Puzzle
+from runner import count_solutions
+
+
+def digits(m, g):
+    return [[m.eval(g.cell(x, y).var).as_long() for x in range(g.width)]
+            for y in range(g.height)]
+
+
+def check_solution(puzzle, rows):
+    n = puzzle.width
+    box = sudoku.box_size(n)
+    units = ([row for row in rows] +
+             [[row[x] for row in rows] for x in range(n)] +
+             [[rows[by + j][bx + i] for i in range(box) for j in range(box)]
+              for bx in range(0, n, box) for by in range(0, n, box)])
+    for unit in units:
+        assert sorted(unit) == list(range(1, n + 1))
+    for y, line in enumerate(puzzle.givens):
+        for x, given in enumerate(line):
+            if given not in ' ?':
+                assert rows[y][x] == int(given)
+
+
+def presolved_puzzle():
+    # The first generated 9x9 puzzle that singles solve outright.
+    for seed in range(100):
+        puzzle = generate.generate('sudoku', 9, seed)
+        if getattr(sudoku.build(puzzle)[0], 'presolved', False):
+            return puzzle
+    pytest.skip('no generated puzzle is solved by singles')
+
+
+@pytest.mark.parametrize('encoding', sorted(sudoku.ENCODINGS))
+@pytest.mark.parametrize('presolve', [True, False])
+def test_example(encoding, presolve):
+    s, g = sudoku.build(sudoku.example, presolve=presolve, encoding=encoding)
+    assert s.check() == sat
+    check_solution(sudoku.example, digits(s.model(), g))
+
+
+def test_presolved_board_goes_through_z3():
+    puzzle = presolved_puzzle()
+    s, g = sudoku.build(puzzle)
+    assert s.presolved
+    assert s.check() == sat
+    m = s.model()
+    check_solution(puzzle, digits(m, g))
+
+    # Constraints added after build are respected: banning the solution
+    # leaves nothing, as it's unique.
+    s.add(Or([c.var != m.eval(c.var) for c in g.cells]))
+    assert s.check() == unsat
+
+
+def test_presolved_board_counts_one_solution():
+    puzzle = presolved_puzzle()
+    s, g = sudoku.build(puzzle)
+    assert s.check() == sat
+    assert count_solutions(sudoku, s, g, s.model(), 2) == (1, True)
+
+
+def test_contradiction():
+    puzzle = Puzzle('sudoku', [4, 4], ["11  ", "    ", "    ", "    "])
+    s, g = sudoku.build(puzzle)
+    assert s.check() == unsat
@@ -1,6 +1,3 @@
-from collections import defaultdict
-import six
-
 class UFNode(object):
     def __init__(self, data):
         self.data = data
@@ -23,20 +20,55 @@ class UFNode(object):
         return self.data
 
 class UnionFind(object):
+    '''
+    Union-find over arbitrary hashable items.
+
+    The members of each class are tracked on its root as unions happen, so
+    listing the classes doesn't need to re-run find() over every item, and
+    so is the root of the largest class.
+    '''
     def __init__(self):
         self.objs = {}
+        self.members = {}
+        self.largest_root = None
+
+    def add(self, item):
+        if item not in self.objs:
+            node = UFNode(item)
+            self.objs[item] = node
+            self.members[node] = [item]
+            if self.largest_root is None:
+                self.largest_root = node
+        return self.objs[item]
+
+    def find(self, item):
+        return self.objs[item].find()
 
     def union(self, item1, item2):
-        if item1 not in self.objs:
-            self.objs[item1] = UFNode(item1)
-        if item2 not in self.objs:
-            self.objs[item2] = UFNode(item2)
-        self.objs[item1].union(self.objs[item2])
+        c = self.add(item1).find()
+        o = self.add(item2).find()
+        if c is o:
+            return
+        # Union by size: hang the smaller class off the larger one, so the
+        # member lists are moved as little as possible.
+        if len(self.members[c]) > len(self.members[o]):
+            c, o = o, c
+        c.parent = o
+        self.members[o].extend(self.members.pop(c))
+        if (self.largest_root is c or
+                len(self.members[o]) > len(self.members[self.largest_root])):
+            self.largest_root = o
 
-    def classes(self):
-        classes = defaultdict(list)
-        for obj, val in six.iteritems(self.objs):
-            classes[val.find()].append(obj)
+    def count(self):
+        return len(self.members)
 
-        return classes.values()
+    def classes(self):
+        return list(self.members.values())
 
+    def largest(self):
+        '''
+        Returns the members of the largest class, or [] if there are none.
+        '''
+        if self.largest_root is None:
+            return []
+        return self.members[self.largest_root]
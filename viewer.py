@@ -0,0 +1,109 @@
+import multiprocessing
+
+from six.moves.queue import Empty
+
+# How long the viewer process waits for a new frame before checking for
+# window events again, in seconds.
+POLL_INTERVAL = 0.05
+
+
+class Viewer(object):
+    """
+    A window, run in its own process, that shows cairo image surfaces pushed
+    to it without blocking the code that pushes them. Useful for watching
+    refinement rounds or a stream of solutions while the solver keeps going.
+
+    Pushing a surface replaces whatever the window is showing. The window
+    can be closed at any point; later pushes are then ignored.
+
+    Example:
+        >>> viewer = Viewer()
+        >>> def show(m):
+        ...     viewer.show(render_grid(g, m, 64, cell_draw, edge_draw,
+        ...                             edge_draw, point_draw))
+        >>> m = solve(s, g, adjacency_fn, on_model=show)
+        >>> viewer.wait()
+    """
+    def __init__(self, title='z3 puzzle solvers'):
+        self.queue = multiprocessing.Queue()
+        # If the window is closed while frames are still on their way to it,
+        # nothing will ever read them; don't wait for them to be sent when
+        # this process exits.
+        self.queue.cancel_join_thread()
+        self.process = multiprocessing.Process(target=run_viewer,
+                                               args=(self.queue, title))
+        self.process.daemon = True
+        self.process.start()
+
+    def show(self, surface):
+        """
+        Show a cairo image surface in the window.
+        """
+        if not self.process.is_alive():
+            return
+        surface.flush()
+        self.queue.put((surface.get_width(), surface.get_height(),
+                        bytes(surface.get_data())))
+
+    def wait(self):
+        """
+        Block until the window is closed.
+        """
+        self.process.join()
+
+    def close(self):
+        """
+        Close the window.
+        """
+        if self.process.is_alive():
+            self.queue.put(None)
+        self.process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_viewer(queue, title):
+    """
+    The viewer process's event loop. It sleeps waiting on the queue (at most
+    POLL_INTERVAL at a time, so window events are still handled promptly)
+    rather than spinning, and only draws the newest of any frames waiting.
+    """
+    from display import import_pygame, input, pygame_image
+    pygame = import_pygame()
+
+    pygame.display.init()
+    pygame.display.set_caption(title)
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN])
+
+    size = None
+    running = True
+    while running:
+        items = []
+        try:
+            items.append(queue.get(timeout=POLL_INTERVAL))
+            while True:
+                items.append(queue.get_nowait())
+        except Empty:
+            pass
+
+        if None in items:
+            break
+        if items:
+            width, height, buf = items[-1]
+            if size != (width, height):
+                size = width, height
+                pygame.display.set_mode(size)
+            screen = pygame.display.get_surface()
+            screen.blit(pygame_image(pygame, buf, size), (0, 0))
+            pygame.display.flip()
+
+        for event in pygame.event.get():
+            if not input(event):
+                running = False
+
+    pygame.display.quit()
@@ -1,14 +1,72 @@
-from z3 import Const, ForAll, Function, If
+import functools
+import time
+
+from z3 import (Bool, BoolVal, Const, ForAll, Function, If, PbEq, sat,
+                unknown)
 
 _unique_id = 0
 
 
+class SolverTimeout(Exception):
+    pass
+
+
+def set_deadline(solver, seconds):
+    """
+    Give every later check_model call on solver, together, at most this many
+    seconds. Solvers that check repeatedly (adding constraints between
+    rounds) share the budget across all of the rounds.
+    """
+    solver.deadline = time.time() + seconds
+
+
+def check_model(solver):
+    """
+    Check the solver and return its model, or None if it's unsatisfiable.
+
+    Raises SolverTimeout if z3 gives up, which is usually because the deadline
+    set with set_deadline has passed. Counts the checks made on solver in
+    solver.rounds, so solvers that refine their constraints between checks
+    can be compared by how many rounds they take.
+
+    If solver.assumptions is set, every check assumes those literals, so the
+    same solver can be asked about different subsets of optional constraints
+    (each guarded by a literal) without being rebuilt.
+    """
+    deadline = getattr(solver, 'deadline', None)
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise SolverTimeout('timeout')
+        solver.set('timeout', max(1, int(remaining * 1000)))
+    solver.rounds = getattr(solver, 'rounds', 0) + 1
+    result = solver.check(*getattr(solver, 'assumptions', ()))
+    if result == unknown:
+        raise SolverTimeout(solver.reason_unknown())
+    return solver.model() if result == sat else None
+
+
+# How lift_to_solver defines a lifted function, set as solver.lift_mode:
+#   quantifier: with a ForAll axiom, left to z3's quantifier instantiation
+#   macro: with the same axiom, expanded away by z3's macro finder before
+#       solving
+#   inline: not at all; each call returns the function's body
+#   memoize: with one equation for each distinct ground call, so each body
+#       is added once however many times it's called
+LIFT_MODES = ('quantifier', 'macro', 'inline', 'memoize')
+
+
 def lift_to_solver(solver, *sorts):
     """
     Lift a Python function that accepts and returns Z3 expressions into the
     Z3 solver. This is useful if the function is called many times and
     repeating its body would add bloat to the problem.
 
+    How the function is defined depends on solver.lift_mode (one of
+    LIFT_MODES, 'quantifier' by default). Only the 'quantifier' and 'macro'
+    modes add quantifiers, and only 'quantifier' leaves them for z3 to
+    instantiate while solving.
+
     Args:
         solver: a z3.Solver instance
         *sorts: the sorts of the arguments and returned value
@@ -18,9 +76,35 @@ def lift_to_solver(solver, *sorts):
         ... def are_equal_mod_3(x, y):
         ...    return x % 3 == y % 3
     """
+    mode = getattr(solver, 'lift_mode', 'quantifier')
+    if mode not in LIFT_MODES:
+        raise ValueError('unknown lift mode: {}'.format(mode))
+
     def decorator(fn):
         global _unique_id
+        if mode == 'inline':
+            @functools.wraps(fn)
+            def inlined(*args):
+                return fn(*[s.cast(a) for s, a in zip(sorts, args)])
+            return inlined
+
         solver_fn = Function(fn.__name__, sorts)
+        if mode == 'memoize':
+            defined = {}
+
+            @functools.wraps(fn)
+            def memoized(*args):
+                args = [s.cast(a) for s, a in zip(sorts, args)]
+                key = tuple(a.get_id() for a in args)
+                if key not in defined:
+                    # Keep the arguments alive, so their ids stay theirs.
+                    defined[key] = args
+                    solver.add(solver_fn(*args) == fn(*args))
+                return solver_fn(*args)
+            return memoized
+
+        if mode == 'macro':
+            solver.set('smt.macro_finder', True)
         args = [Const('${}_{}'.format(i, _unique_id), s)
                 for i, s in enumerate(sorts[:-1])]
         solver.add(ForAll(args, solver_fn(*args) == fn(*args)))
@@ -29,6 +113,34 @@ def lift_to_solver(solver, *sorts):
     return decorator
 
 
+def reify(solver, constraint, name):
+    """
+    Return a Bool named name that solver ties to whether constraint holds.
+    Counting the Bool rather than the constraint keeps a constraint that is
+    counted several times (or in several counts) in the problem just once.
+    """
+    indicator = Bool(name)
+    solver.add(indicator == constraint)
+    return indicator
+
+
+def Exactly(k, conditions):
+    """
+    A pseudo-boolean constraint that exactly k of conditions hold. With no
+    conditions this is just whether k is 0 (z3's PbEq can't take an empty
+    list).
+
+    Example:
+        >>> truths = [reify(s, clue, 'clue_{}'.format(i))
+        ...           for i, clue in enumerate(clues)]
+        >>> s.add(Exactly(len(truths) - 1, truths))  # exactly one lie
+    """
+    conditions = list(conditions)
+    if not conditions:
+        return BoolVal(k == 0)
+    return PbEq([(c, 1) for c in conditions], k)
+
+
 def Switch(var, *branches):
     """
     Emulate a switch statement in Z3. Equivalent to a sequence of chained If